@@ -0,0 +1,95 @@
+"""ตรวจชุดข้อมูลร่วม (dataset_cache) และวัดการอ่านเทียบกับ st.cache_data
+
+st.cache_data คืน copy ทุกครั้ง (unpickle ทั้งตาราง + ดัชนี) ส่วน SharedDataset คืน reference เดิม
+ตรวจว่า session พร้อมกันหลายตัวทำให้สร้างชุดข้อมูลแค่ครั้งเดียว (single-flight) และระหว่างสร้าง version ใหม่
+ทุก session ยังได้ชุดเดิมทันที (stale-while-revalidate)
+รัน: python -m benchmarks.bench_dataset_cache [จำนวนแถว] [จำนวน session]
+"""
+import pickle
+import sys
+import threading
+import time
+
+from benchmarks.synthetic import make_health_sheet
+from dataset_cache import SharedDataset, build_dataset
+
+
+class FakeService:
+    # แทน SnapshotService: current() -> (frame, version)
+    def __init__(self, frame):
+        self.frame = frame
+        self.version = "v1"
+
+    def current(self):
+        return self.frame, self.version
+
+
+def concurrent_gets(shared, n_sessions):
+    results, errors = [None] * n_sessions, []
+
+    def session(i):
+        try:
+            start = time.perf_counter()
+            dataset = shared.get()
+            results[i] = (dataset.version, time.perf_counter() - start)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(n_sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors, errors
+    return results
+
+
+def main(n_rows=20_000, n_sessions=16):
+    frame = make_health_sheet(n_rows)
+    service = FakeService(frame)
+    builds = []
+
+    def counting_build(frame, version):
+        builds.append(version)
+        return build_dataset(frame, version)
+
+    shared = SharedDataset(service, build=counting_build)
+    start = time.perf_counter()
+    first = concurrent_gets(shared, n_sessions)
+    print(f"rows={n_rows:,} sessions={n_sessions}")
+    print(f"เริ่มระบบ: {n_sessions} session พร้อมกัน → build {len(builds)} ครั้ง ({time.perf_counter() - start:.2f} s)")
+    assert builds == ["v1"] and all(version == "v1" for version, _ in first), "สร้างซ้ำตอนเริ่มระบบ"
+
+    # snapshot เปลี่ยน version: session ทั้งหมดต้องได้ v1 ทันที ระหว่างที่ v2 สร้างอยู่เบื้องหลัง
+    service.version = "v2"
+    stale = concurrent_gets(shared, n_sessions)
+    worst = max(elapsed for _, elapsed in stale)
+    assert all(version == "v1" for version, _ in stale), "ไม่ได้ชุดเดิมระหว่างสร้างใหม่"
+    while shared.stats()["building"]:
+        time.sleep(0.01)
+    assert builds == ["v1", "v2"] and shared.get().version == "v2", "สร้าง v2 ไม่ใช่ครั้งเดียว"
+    print(f"เปลี่ยน version: ได้ชุดเดิมทันที (ช้าสุด {worst * 1000:.2f} ms) → build v2 ครั้งเดียว, stats {shared.stats()}")
+
+    dataset = shared.get()
+    try:
+        dataset.numeric_cache.matrix[0, 0] = 1
+        raise AssertionError("numeric cache ยังแก้ไขได้")
+    except ValueError:
+        print("numeric cache / รหัสปัสสาวะเป็น read-only: ok")
+
+    # เทียบกับ st.cache_data: ทุก rerun ต้อง unpickle ชุดข้อมูลทั้งหมด
+    payload = pickle.dumps((dataset.df, dataset.patient_index, dataset.fuzzy_index,
+                            dataset.numeric_cache, dataset.urine_codes))
+    start = time.perf_counter()
+    pickle.loads(payload)
+    copy_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    for _ in range(1000):
+        shared.get()
+    shared_ms = (time.perf_counter() - start) * 1000 / 1000  # ms ต่อครั้ง
+    print(f"อ่านต่อ rerun: st.cache_data (unpickle {len(payload) / 1e6:.1f} MB) {copy_ms:.1f} ms, "
+          f"SharedDataset {shared_ms:.4f} ms")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,143 @@
+"""ตรวจว่าผลแปลแบบ batch ตรงกับฟังก์ชันรายคน และวัด throughput
+
+รัน: python -m benchmarks.bench_interpret [จำนวนแถว]
+"""
+import sys
+import time
+
+import pandas as pd
+
+import interpret as scalar
+from benchmarks.synthetic import make_health_sheet
+from interpret_batch import interpret_cohort
+from schema import CURRENT_YEAR, column_for
+
+def make_lab_sheet(n_rows, year=CURRENT_YEAR, seed=0):
+    # ชีตสังเคราะห์เฉพาะคอลัมน์ของปีที่วัด (ค่าว่าง ค่า 0 "-" และคอมม่า ตามชีตจริง)
+    return make_health_sheet(n_rows, seed=seed, years=[year])
+
+
+def merge_advice_by_keyword(messages):
+    # สรุปคำแนะนำแบบเดิม: จัดหมวดจากคำในข้อความ (ใช้เป็นค่าอ้างอิงของการ lookup ด้วย message id)
+    groups = {
+        "FBS": [],
+        "ไต": [],
+        "ตับ": [],
+        "ยูริค": [],
+        "ไขมัน": [],
+        "CBC": [],
+    }
+
+    for msg in messages:
+        if "น้ำตาล" in msg:
+            groups["FBS"].append(msg)
+        elif "ไต" in msg:
+            groups["ไต"].append(msg)
+        elif "ตับ" in msg:
+            groups["ตับ"].append(msg)
+        elif "ยูริค" in msg or "พิวรีน" in msg:
+            groups["ยูริค"].append(msg)
+        elif "ไขมัน" in msg:
+            groups["ไขมัน"].append(msg)
+        else:
+            groups["CBC"].append(msg)
+
+    section_texts = []
+    for title, msgs in groups.items():
+        if msgs:
+            icon = {
+                "FBS": "🍬", "ไต": "💧", "ตับ": "🫀",
+                "ยูริค": "🦴", "ไขมัน": "🧈", "CBC": "🩸"
+            }.get(title, "📝")
+            merged_msgs = [m for m in msgs if m.strip() != "-"]
+            if not merged_msgs:
+                continue  # ข้ามหมวดนี้ไปเลย
+            merged = " ".join(dict.fromkeys(merged_msgs))
+            section = f"<b>{icon} {title}:</b> {merged}"
+            section_texts.append(section)
+
+    if not section_texts:
+        return "ไม่พบคำแนะนำเพิ่มเติมจากผลตรวจ"
+
+    return "<div style='margin-bottom: 0.75rem;'>" + "</div><div style='margin-bottom: 0.75rem;'>".join(section_texts) + "</div>"
+
+
+def interpret_row(row, year):
+    get = lambda test: str(row.get(column_for(test, year), "") or "").strip()
+    sex = row["เพศ"].strip()
+    try:
+        bmi = float(get("weight")) / ((float(get("height")) / 100) ** 2)
+    except Exception:
+        bmi = None
+    hb = scalar.interpret_hb(get("hb"), sex)
+    wbc = scalar.interpret_wbc(get("wbc"))
+    plt = scalar.interpret_plt(get("plt"))
+    liver = scalar.summarize_liver(get("alp"), get("sgot"), get("sgpt"))
+    kidney = scalar.kidney_summary_gfr_only(get("gfr"))
+    lipids = scalar.summarize_lipids(get("chol"), get("tgl"), get("ldl"))
+    # สรุปคำแนะนำแบบเดิม (จัดหมวดจากคำในข้อความ) ใช้เทียบกับการ lookup ด้วย message id
+    advices = [a for a in (
+        scalar.fbs_advice(get("fbs")), scalar.kidney_advice_from_summary(kidney), scalar.liver_advice(liver),
+        scalar.uric_acid_advice(get("uric")), scalar.lipids_advice(lipids),
+    ) if a]
+    cbc = scalar.cbc_advice(hb, wbc, plt)
+    if cbc and cbc != "-":
+        advices.append(cbc)
+    return {
+        "bmi": scalar.interpret_bmi(bmi),
+        "bp": scalar.interpret_bp(get("sbp"), get("dbp")),
+        "health_advice": scalar.combined_health_advice(bmi, get("sbp"), get("dbp")),
+        "hb": hb,
+        "wbc": wbc,
+        "plt": plt,
+        "cbc_advice": scalar.cbc_advice(hb, wbc, plt),
+        "liver": liver,
+        "liver_advice": scalar.liver_advice(liver),
+        "uric_advice": scalar.uric_acid_advice(get("uric")),
+        "kidney": kidney,
+        "kidney_advice": scalar.kidney_advice_from_summary(kidney),
+        "fbs_advice": scalar.fbs_advice(get("fbs")),
+        "lipids": lipids,
+        "lipids_advice": scalar.lipids_advice(lipids),
+        "advice_summary": merge_advice_by_keyword(advices),
+        "hep_b": scalar.hepatitis_b_advice(row["HbsAg"].strip(), row["HbsAb"].strip(), row["HBcAB"].strip()),
+        "urine_alb": scalar.interpret_alb(get("urine_alb")),
+        "urine_sugar": scalar.interpret_sugar(get("urine_sugar")),
+        "urine_rbc": scalar.interpret_rbc(get("urine_rbc")),
+        "urine_wbc": scalar.interpret_urine_wbc(get("urine_wbc")),
+        "urine_advice": scalar.advice_urine(
+            sex, get("urine_alb"), get("urine_sugar"), get("urine_rbc"), get("urine_wbc")
+        ),
+    }
+
+
+def check_parity(df, year):
+    batch = interpret_cohort(df, year).astype(str)
+    expected = pd.DataFrame([interpret_row(row, year) for _, row in df.iterrows()], index=df.index)
+    mismatched = (batch[expected.columns] != expected).any()
+    assert not mismatched.any(), f"batch/scalar mismatch: {list(mismatched[mismatched].index)}"
+
+
+def main(n_rows=100_000):
+    df = make_lab_sheet(n_rows)
+    checked = df.head(20_000)
+    check_parity(checked, CURRENT_YEAR)
+    print(f"parity: ok ({len(checked):,} rows)")
+
+    start = time.perf_counter()
+    interpret_cohort(df, CURRENT_YEAR)
+    batch_s = time.perf_counter() - start
+
+    sample = df.head(5_000)
+    start = time.perf_counter()
+    for _, row in sample.iterrows():
+        interpret_row(row, CURRENT_YEAR)
+    scalar_s = (time.perf_counter() - start) * n_rows / len(sample)
+
+    print(f"rows={n_rows:,}")
+    print(f"batch : {batch_s:.3f} s ({n_rows / batch_s:,.0f} rows/s)")
+    print(f"scalar: {scalar_s:.3f} s ({n_rows / scalar_s:,.0f} rows/s, ประมาณจาก {len(sample):,} แถว)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,68 @@
+"""วัดการแปลผลลงที่เก็บผล: รอบแรกแปลทั้งหมด เทียบกับรอบที่แปลใหม่เฉพาะแถวที่เปลี่ยน
+
+จำลองชีตรอบถัดไป: แก้ค่าแล็บบางแถว ลบบางแถว เพิ่มแถวใหม่ และสลับลำดับแถว
+แล้วตรวจว่าผลแบบ incremental ตรงกับการแปลใหม่ทั้งหมดทุกเซลล์
+รัน: python -m benchmarks.bench_interpret_store [จำนวนแถว] [สัดส่วนแถวที่เปลี่ยน]
+"""
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_health_sheet
+from interpret_store import InterpretationStore, update_interpretations
+from schema import CURRENT_YEAR, column_for
+from snapshot import row_hashes
+
+
+def next_revision(df, fraction, seed=1):
+    rng = np.random.default_rng(seed)
+    df = df.copy()
+    n_changed = int(len(df) * fraction)
+    edited = rng.choice(len(df), n_changed, replace=False)
+    fbs = column_for("fbs", CURRENT_YEAR)
+    df.loc[df.index[edited], fbs] = rng.integers(70, 200, n_changed).astype(str)
+    added = make_health_sheet(n_changed // 2 + 1, seed=seed + 1)
+    added["HN"] = "NEW" + added["HN"]
+    kept = np.setdiff1d(np.arange(len(df)), rng.choice(len(df), n_changed // 2, replace=False))
+    df = pd.concat([df.iloc[kept], added], ignore_index=True)
+    return df.iloc[rng.permutation(len(df))].reset_index(drop=True)
+
+
+def run(df, store):
+    # hash ของแถวมาจาก snapshot (คำนวณไว้ตอนรีเฟรชชีตแล้ว) จึงไม่นับรวมในเวลาแปลผล
+    start = time.perf_counter()
+    hashes = row_hashes(df)
+    hash_s = time.perf_counter() - start
+    start = time.perf_counter()
+    table, stats = update_interpretations(df, hashes, store)
+    return table, stats, time.perf_counter() - start, hash_s
+
+
+def main(n_rows=100_000, fraction=0.01):
+    directory = tempfile.mkdtemp(prefix="health-interpret-")
+    try:
+        df = make_health_sheet(n_rows)
+        incremental = InterpretationStore(f"{directory}/incremental")
+        _, stats, full_s, hash_s = run(df, incremental)
+        print(f"rows={n_rows:,} · รอบแรก {full_s:.2f} s ({stats['rows']:,} แถว ผู้ป่วย×ปี) · "
+              f"hash ของ snapshot {hash_s:.2f} s")
+
+        revised = next_revision(df, fraction)
+        table, stats, incremental_s, _ = run(revised, incremental)
+        print(f"รอบถัดไป (เปลี่ยน {fraction:.0%}): {incremental_s:.2f} s · แปลใหม่ {stats['recomputed']:,} "
+              f"ใช้ผลเดิม {stats['reused']:,} ลบ {stats['removed']:,}")
+        assert stats["removed"] == int(n_rows * fraction) // 2, stats["removed"]
+
+        expected, _, rebuild_s, _ = run(revised, InterpretationStore(f"{directory}/full"))
+        pd.testing.assert_frame_equal(table, expected)
+        print(f"แปลใหม่ทั้งหมด {rebuild_s:.2f} s · ผล incremental ตรงกันทุกเซลล์: ok ({rebuild_s / incremental_s:.1f}x)")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000, float(sys.argv[2]) if len(sys.argv) > 2 else 0.01)
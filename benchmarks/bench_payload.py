@@ -0,0 +1,68 @@
+"""วัดขนาด HTML ที่ส่งไปเบราว์เซอร์และเวลาสร้างต่อรายงาน
+
+payload ต่อ rerun = ทุกส่วนที่ app.py ส่งผ่าน st.markdown (หัวรายงาน, ตาราง, คำแนะนำ, ผลอื่น ๆ, แพทย์)
+แสดงทั้งขนาดดิบและขนาดหลังบีบอัด (gzip ใกล้เคียง permessage-deflate ของ websocket) และไฟล์ส่งออกหนึ่งฉบับ
+รัน: python -m benchmarks.bench_payload [จำนวนผู้ป่วย]
+"""
+import gzip
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_health_sheet
+from numeric_cache import build_numeric_cache
+from report_html import (
+    PAGE_STYLE, advice_section_html, blood_section_html, cbc_section_html, cxr_section_html,
+    doctor_section_html, ekg_section_html, header_html, hepatitis_a_section_html, hepatitis_b_section_html,
+    render_report_document, stool_section_html, urine_section_html,
+)
+from schema import CURRENT_YEAR
+from urinalysis import build_urine_codes
+
+
+def page_sections(person, year, numbers, urine):
+    # ลำดับเดียวกับ render_report_body ใน app.py
+    return [
+        header_html(person, year),
+        cbc_section_html(person, year, numbers),
+        blood_section_html(person, year, numbers),
+        advice_section_html(person, year),
+        urine_section_html(person, year, urine),
+        stool_section_html(person, year),
+        cxr_section_html(person, year),
+        ekg_section_html(person, year),
+        hepatitis_a_section_html(person, year),
+        hepatitis_b_section_html(person, year),
+        doctor_section_html(),
+    ]
+
+
+def measure(df, year):
+    numbers, urine = build_numeric_cache(df), build_urine_codes(df)
+    records = df.to_dict("records")
+    raw, packed, doc_raw, doc_packed, render_ms = [], [], [], [], []
+    for pos, person in enumerate(records):
+        start = time.perf_counter()
+        sections = page_sections(person, year, numbers.row(pos), urine.row(pos))
+        render_ms.append((time.perf_counter() - start) * 1000)
+        payload = "".join(sections).encode("utf-8")
+        raw.append(len(payload))
+        packed.append(len(gzip.compress(payload)))
+        document = render_report_document(person, year, numbers.row(pos), urine.row(pos)).encode("utf-8")
+        doc_raw.append(len(document))
+        doc_packed.append(len(gzip.compress(document)))
+    print(f"ปี {year}: หน้าเว็บ {np.mean(raw) / 1024:.1f} KB ต่อรายงาน (gzip {np.mean(packed) / 1024:.1f} KB), "
+          f"ไฟล์ส่งออก {np.mean(doc_raw) / 1024:.1f} KB (gzip {np.mean(doc_packed) / 1024:.1f} KB), "
+          f"สร้าง HTML {np.median(render_ms):.2f} ms median / {np.percentile(render_ms, 95):.2f} ms p95")
+
+
+def main(n_patients=300):
+    df = make_health_sheet(n_patients)
+    print(f"patients={n_patients:,} · stylesheet ที่ส่งครั้งเดียวต่อหน้า {len(PAGE_STYLE.encode('utf-8')) / 1024:.1f} KB")
+    for year in (CURRENT_YEAR, CURRENT_YEAR - 4):
+        measure(df, year)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
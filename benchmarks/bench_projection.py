@@ -0,0 +1,109 @@
+"""เทียบการโหลดทุกคอลัมน์กับการโหลดเฉพาะคอลัมน์ของปีที่ใช้ (column projection)
+
+ตรวจว่ารายงานที่ได้จากชีตที่ตัดคอลัมน์ตรงกับชีตเต็มทุกตัวอักษร, การเติมปีอื่นทีหลังได้ผลเท่ากับโหลดพร้อมกัน
+และวัดเวลา parse CSV / จำนวน cell ที่ต้องส่งจาก Google Sheet (แผ่นปลอมที่ทำตัวแบบ API)
+รัน: python -m benchmarks.bench_projection [จำนวนแถว]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from gspread.utils import numericise_all
+
+from benchmarks.synthetic import make_health_sheet
+from numeric_cache import build_numeric_cache
+from report_html import render_report_document
+from schema import CURRENT_YEAR, projected_columns
+from sheet_source import LocalFileSource, ProjectedSheet, clean_sheet, worksheet_frame
+from urinalysis import build_urine_codes
+
+
+class FakeWorksheet:
+    # แผ่นงานในหน่วยความจำ: get_all_records / row_values / batch_get แบบเดียวกับ gspread
+    # (batch_get ตัดช่องว่างท้ายคอลัมน์) และนับจำนวน cell ที่ "ส่ง" กลับมา
+    def __init__(self, df):
+        self.header = list(df.columns)
+        self.columns = [df[col].tolist() for col in df.columns]
+        self.cells_sent = 0
+
+    def get_all_records(self):
+        self.cells_sent += len(self.header) * (len(self.columns[0]) + 1)
+        rows = zip(*self.columns)
+        return [dict(zip(self.header, numericise_all(list(row), default_blank=""))) for row in rows]
+
+    def row_values(self, row):
+        self.cells_sent += len(self.header)
+        return list(self.header)
+
+    def batch_get(self, ranges, major_dimension="COLUMNS"):
+        blocks = []
+        for a1 in ranges:
+            start, end = (self._index(part) for part in a1.split(":"))
+            block = []
+            for pos in range(start, end + 1):
+                column = [self.header[pos]] + self.columns[pos]
+                while column and column[-1] == "":
+                    column.pop()
+                block.append(column)
+                self.cells_sent += len(column)
+            while block and not block[-1]:
+                block.pop()
+            blocks.append(block)
+        return blocks
+
+    @staticmethod
+    def _index(letters):
+        index = 0
+        for ch in letters:
+            index = index * 26 + ord(ch) - ord("A") + 1
+        return index - 1
+
+
+def render_all(df, year, n=100):
+    numbers, urine = build_numeric_cache(df), build_urine_codes(df)
+    records = df.head(n).to_dict("records")
+    return [render_report_document(r, year, numbers.row(i), urine.row(i)) for i, r in enumerate(records)]
+
+
+def main(n_rows=20_000):
+    df = make_health_sheet(n_rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sheet.csv")
+        df.to_csv(path, index=False)
+        source = LocalFileSource(path)
+
+        start = time.perf_counter()
+        full = clean_sheet(source.fetch())
+        full_s = time.perf_counter() - start
+        start = time.perf_counter()
+        projected = ProjectedSheet(source)
+        current = clean_sheet(projected.load([CURRENT_YEAR]))
+        projected_s = time.perf_counter() - start
+        print(f"rows={n_rows:,}")
+        print(f"CSV ทุกคอลัมน์: {full.shape[1]} คอลัมน์ {full_s:.2f} s")
+        print(f"CSV เฉพาะปี {CURRENT_YEAR}: {current.shape[1]} คอลัมน์ {projected_s:.2f} s ({full_s / projected_s:.1f}x)")
+
+        for year in (CURRENT_YEAR, 64):
+            frame = current if year == CURRENT_YEAR else clean_sheet(ProjectedSheet(source).load([year]))
+            assert render_all(frame, year) == render_all(full, year), f"รายงานปี {year} ไม่ตรงกับชีตเต็ม"
+        print("รายงานจากชีตที่ตัดคอลัมน์ตรงกับชีตเต็ม: ok (ปี 68, 64)")
+
+        start = time.perf_counter()
+        filled = projected.require([64, 65])
+        fill_s = time.perf_counter() - start
+        expected = source.fetch(columns=projected_columns([CURRENT_YEAR, 64, 65]))
+        assert filled[expected.columns].equals(expected), "เติมปีทีหลังไม่ตรงกับโหลดพร้อมกัน"
+        print(f"เติมปี 64-65 ทีหลัง: ok ({fill_s:.2f} s, รวม {filled.shape[1]} คอลัมน์)")
+
+    sheet = FakeWorksheet(df.head(2_000))
+    whole = worksheet_frame(sheet)
+    whole_cells, sheet.cells_sent = sheet.cells_sent, 0
+    part = worksheet_frame(sheet, projected_columns([CURRENT_YEAR]))
+    assert part.equals(whole[part.columns]), "batch_get ให้ค่าไม่ตรงกับ get_all_records"
+    print(f"Google Sheet (2,000 แถว): ทั้งแผ่น {whole_cells:,} cells, เฉพาะปี {CURRENT_YEAR} {sheet.cells_sent:,} cells "
+          f"({whole_cells / sheet.cells_sent:.1f}x น้อยลง)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
@@ -0,0 +1,154 @@
+"""ตรวจผลคัดกรองแบบ vectorized เทียบกับการประเมินทีละแถว (ช่องว่าง/NaN ต้องไม่ผ่านเงื่อนไข รวมถึงใต้ not และ !=)
+
+รัน: python -m benchmarks.bench_screening [จำนวนแถว]
+"""
+import ast
+import math
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_health_sheet
+from numeric_cache import build_numeric_cache
+from schema import CURRENT_YEAR, YEARS, column_for
+from screening import QueryError, screen
+
+EXPRESSIONS = [
+    "fbs >= 126",
+    "not fbs >= 126",
+    "not (fbs < 126)",
+    "fbs != 90",
+    "fbs[68] != fbs[67]",
+    "not (fbs >= 126 or ldl >= 160)",
+    "not (fbs >= 126 and ldl >= 160)",
+    "100 <= fbs < 126 or not bmi < 30",
+    "not any(gfr < 60) and sbp != 120",
+    "count(sbp != 120) >= 2",
+    "not rising(fbs, 66)",
+]
+
+# นิพจน์ที่ไม่ใช่เงื่อนไข ต้องถูกปฏิเสธด้วย QueryError ตั้งแต่ตอน compile (ไม่ใช่ error อื่นระหว่างประเมิน)
+INVALID = [
+    "5",
+    "fbs",
+    "any(fbs)",
+    "any(1)",
+    "all(ldl)",
+    "count(sbp)",
+    "fbs and ldl",
+    "not fbs",
+    "fbs >= 126 or 1",
+    "(fbs >= 126) + 1 > 0",
+    "-(fbs < 100) < 0",
+    "count(sbp >= 140)",
+]
+
+
+def _value(row, test, year):
+    if test == "bmi":
+        weight, height = _value(row, "weight", year), _value(row, "height", year)
+        return weight / (height / 100) ** 2 if height else math.nan
+    col = column_for(test, year)
+    return float(row[col]) if col in row.index else math.nan
+
+
+def _present(row, node, year):
+    # อ่านตรงตามกติกาใน screening: ทุกรายการที่นิพจน์ย่อยอ้างถึงตรงๆ ต้องมีค่า
+    if isinstance(node, ast.Name):
+        return not math.isnan(_value(row, node.id.lower(), year))
+    if isinstance(node, ast.Subscript):
+        return not math.isnan(_value(row, node.value.id.lower(), node.slice.value % 2500))
+    if isinstance(node, (ast.Constant, ast.Call)):
+        return True
+    return all(_present(row, child, year) for child in ast.iter_child_nodes(node) if isinstance(child, ast.expr))
+
+
+def evaluate_row(row, node, year=CURRENT_YEAR):
+    # ตัวประเมินอ้างอิงแบบตรงไปตรงมา ทีละแถว (ไม่ใช้ numpy)
+    if isinstance(node, ast.Expression):
+        return evaluate_row(row, node.body, year)
+    if isinstance(node, ast.BoolOp):
+        values = [evaluate_row(row, v, year) for v in node.values]
+        return all(values) if isinstance(node.op, ast.And) else any(values)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        return (not evaluate_row(row, node.operand, year)) and _present(row, node.operand, year)
+    if isinstance(node, ast.Compare):
+        values = [evaluate_row(row, v, year) for v in [node.left] + node.comparators]
+        ops = {ast.Lt: "<", ast.LtE: "<=", ast.Gt: ">", ast.GtE: ">=", ast.Eq: "==", ast.NotEq: "!="}
+        result = all(eval(f"a {ops[type(op)]} b", {"a": a, "b": b}) for op, a, b in zip(node.ops, values, values[1:]))
+        if any(isinstance(op, ast.NotEq) for op in node.ops):
+            result = result and _present(row, node, year)
+        return result
+    if isinstance(node, ast.Constant):
+        return float(node.value)
+    if isinstance(node, ast.Name):
+        return _value(row, node.id.lower(), year)
+    if isinstance(node, ast.Subscript):
+        return _value(row, node.value.id.lower(), node.slice.value % 2500)
+    if isinstance(node, ast.Call):
+        name = node.func.id
+        if name in ("any", "count"):
+            tests = {n.id.lower() for n in ast.walk(node.args[0]) if isinstance(n, ast.Name)}
+            hits = sum(
+                bool(evaluate_row(row, node.args[0], y))
+                for y in YEARS
+                if all(not math.isnan(_value(row, t, y)) for t in tests)
+            )
+            return hits > 0 if name == "any" else float(hits)
+        if name == "rising":
+            test, since = node.args[0].id.lower(), node.args[1].value
+            points = [_value(row, test, y) for y in YEARS if y >= since]
+            points = [p for p in points if not math.isnan(p)]
+            return len(points) >= 2 and all(b >= a for a, b in zip(points, points[1:])) and points[-1] > points[0]
+    raise ValueError(ast.unparse(node))
+
+
+def check_missing_example():
+    # FBS68 = [130, 90, ว่าง]: คนที่ไม่มีผลต้องไม่ผ่านทุกเงื่อนไข
+    col = column_for("fbs", CURRENT_YEAR)
+    df = pd.DataFrame({"HN": ["1", "2", "3"], col: pd.array(["130", "90", ""], dtype="str")})
+    numbers = build_numeric_cache(df)
+    expected = {
+        "not fbs >= 126": [1],
+        "not (fbs < 126)": [0],
+        "fbs != 90": [0],
+        "fbs >= 126 or not fbs >= 126": [0, 1],
+    }
+    for expression, rows in expected.items():
+        got = screen(df, numbers, expression).positions.tolist()
+        assert got == rows, (expression, got, rows)
+
+
+def check_invalid(df, numbers):
+    for expression in INVALID:
+        try:
+            screen(df, numbers, expression)
+        except QueryError:
+            continue
+        raise AssertionError(f"{expression!r} ควรถูกปฏิเสธ")
+
+
+def main(n_rows=2_000, samples=300):
+    check_missing_example()
+    df = make_health_sheet(n_rows)
+    numbers = build_numeric_cache(df)
+    check_invalid(df, numbers)
+    sample = np.random.default_rng(0).choice(n_rows, size=min(samples, n_rows), replace=False)
+
+    for expression in EXPRESSIONS:
+        start = time.perf_counter()
+        result = screen(df, numbers, expression)
+        elapsed = time.perf_counter() - start
+        tree = ast.parse(expression, mode="eval")
+        got = np.zeros(n_rows, dtype=bool)
+        got[result.positions] = True
+        for pos in sample:
+            assert got[pos] == bool(evaluate_row(numbers.values.iloc[pos], tree)), (expression, pos)
+        print(f"{expression}: {len(result):,} แถว · {elapsed * 1000:.1f} ms")
+    print(f"parity: ok · ปฏิเสธนิพจน์ที่ไม่ใช่เงื่อนไข {len(INVALID)} แบบ")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2_000)
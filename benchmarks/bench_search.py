@@ -0,0 +1,82 @@
+"""เปรียบเทียบการค้นหาผู้ป่วยแบบเดิม (copy + boolean mask) กับดัชนีค้นหา
+
+รัน: python -m benchmarks.bench_search [จำนวนแถว]
+"""
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_roster
+from search_index import build_fuzzy_index, build_patient_index, lookup_patients
+
+
+def search_scan(df, id_card, hn, full_name):
+    # เส้นทางเดิมใน app.py
+    query = df.copy()
+    if id_card.strip():
+        query = query[query["เลขบัตรประชาชน"] == id_card.strip()]
+    if hn.strip():
+        query = query[query["HN"] == hn.strip()]
+    if full_name.strip():
+        query = query[query["ชื่อ-สกุล"].str.strip() == full_name.strip()]
+    return query
+
+
+def timeit(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main(n_rows=200_000, repeat=20):
+    df = make_roster(n_rows)
+    rng = np.random.default_rng(1)
+    targets = df.iloc[rng.integers(0, n_rows, size=repeat)]
+
+    start = time.perf_counter()
+    index = build_patient_index(df)
+    build_s = time.perf_counter() - start
+
+    for _, row in targets.iterrows():
+        expected = search_scan(df, "", row["HN"], row["ชื่อ-สกุล"])
+        got = df.iloc[lookup_patients(index, "", row["HN"], row["ชื่อ-สกุล"])]
+        assert expected.index.equals(got.index)
+
+    row = targets.iloc[0]
+    scan_s = timeit(lambda: search_scan(df, row["เลขบัตรประชาชน"], row["HN"], row["ชื่อ-สกุล"]), repeat)
+    index_s = timeit(lambda: df.iloc[lookup_patients(index, row["เลขบัตรประชาชน"], row["HN"], row["ชื่อ-สกุล"])], repeat)
+
+    start = time.perf_counter()
+    fuzzy = build_fuzzy_index(df)
+    fuzzy_build_s = time.perf_counter() - start
+
+    # คำค้นแบบที่เจ้าหน้าที่พิมพ์จริง: ไม่มีคำนำหน้า, ช่องว่างเกิน, พิมพ์ต้นชื่อ, พิมพ์ผิด 1 ตัว, HN บางส่วน
+    names = targets["ชื่อ-สกุล"].str.split(" ", n=1).str[1]
+    queries = {
+        "full name, no title": names.tolist(),
+        "extra spaces": names.str.replace(" ", "   ").tolist(),
+        "first name + surname prefix": (names.str.split(" ").str[0] + " " + names.str.split(" ").str[1].str[:2]).tolist(),
+        "one typo": (names.str[:2] + "ก" + names.str[3:]).tolist(),
+        "HN, lower case": targets["HN"].str.lower().tolist(),
+    }
+    fuzzy_results = {}
+    for label, batch in queries.items():
+        start = time.perf_counter()
+        found = [fuzzy.search(q, k=10)[0] for q in batch]
+        elapsed = (time.perf_counter() - start) / len(batch)
+        hit_rate = np.mean([pos in rows for pos, rows in zip(targets.index, found)])
+        fuzzy_results[label] = (elapsed, hit_rate)
+
+    print(f"rows={n_rows:,}")
+    print(f"build index: {build_s * 1000:.1f} ms (ครั้งเดียวต่อการโหลดชีต)")
+    print(f"scan search: {scan_s * 1000:.3f} ms/ครั้ง")
+    print(f"index search: {index_s * 1000:.3f} ms/ครั้ง ({scan_s / index_s:.0f}x)")
+    print(f"build fuzzy index: {fuzzy_build_s * 1000:.1f} ms")
+    for label, (elapsed, hit_rate) in fuzzy_results.items():
+        print(f"fuzzy {label}: {elapsed * 1000:.2f} ms/ครั้ง, อยู่ใน top-10 {hit_rate:.0%}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,95 @@
+"""วัดหน่วยความจำของโหมดหลาย process: ทุก worker สร้างชุดข้อมูลเอง เทียบกับ map ชุดที่ publisher เผยแพร่ไว้
+
+แต่ละ worker ทำงานแบบแอปจริง (ค้นหา + render รายงาน + ดูปีย้อนหลัง) แล้วรายงาน RssAnon (หน่วยความจำส่วนตัว)
+กับ RssFile/RssShmem (หน้า page cache ของไฟล์ที่ใช้ร่วมกัน) และตรวจว่ารายงานจากชุดที่ map ตรงกับชุดที่สร้างเอง
+รัน: python -m benchmarks.bench_shared_dataset [จำนวนแถว] [จำนวน worker]
+"""
+import multiprocessing
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import make_health_sheet
+from dataset_cache import build_dataset
+from report_html import render_report_document
+from shared_dataset import attach_dataset, publish_dataset
+
+SAMPLE = 200
+
+
+def memory_kb():
+    fields = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("RssAnon", "RssFile", "RssShmem"):
+                fields[key] = int(value.split()[0])
+    return fields
+
+
+def serve(dataset):
+    # ทำงานแบบ session: ค้นหา HN แล้ว render รายงานปีล่าสุดและปีที่ผู้ป่วยมีผล
+    rendered = []
+    step = max(1, len(dataset.df) // SAMPLE)
+    for pos in range(0, len(dataset.df), step):
+        dataset.fuzzy_index.search(dataset.df["HN"].iloc[pos], k=5)
+        person = dataset.df.iloc[pos]
+        for year in dataset.numeric_cache.available_years(pos)[-2:]:
+            rendered.append(render_report_document(
+                person, year, dataset.numeric_cache.row(pos), dataset.urine_codes.row(pos)))
+    return rendered
+
+
+def worker(mode, arg, queue):
+    start = time.perf_counter()
+    if mode == "build":
+        dataset = build_dataset(make_health_sheet(arg), "local")
+    else:
+        dataset = attach_dataset(arg, "shared")
+    ready = time.perf_counter() - start
+    rendered = serve(dataset)
+    queue.put((mode, ready, memory_kb(), rendered))
+
+
+def run_workers(mode, arg, n_workers):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(mode, arg, queue)) for _ in range(n_workers)]
+    for proc in procs:
+        proc.start()
+    results = [queue.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    return results
+
+
+def summarize(label, results):
+    anon = sum(r[2]["RssAnon"] for r in results) / 1024
+    shared = max(r[2]["RssFile"] + r[2].get("RssShmem", 0) for r in results) / 1024
+    ready = max(r[1] for r in results)
+    print(f"{label:<8} พร้อมใช้ {ready:6.2f} s · หน่วยความจำส่วนตัวรวม {anon:8.1f} MB "
+          f"({anon / len(results):.1f} MB/worker) · ไฟล์ที่ map ร่วม ~{shared:.1f} MB")
+    return anon
+
+
+def main(n_rows=20_000, n_workers=4):
+    directory = tempfile.mkdtemp(prefix="health-shared-", dir="/dev/shm")
+    try:
+        start = time.perf_counter()
+        path = publish_dataset(build_dataset(make_health_sheet(n_rows), "shared"), directory)
+        print(f"rows={n_rows:,} workers={n_workers} · publish {time.perf_counter() - start:.2f} s → {path}")
+
+        built = run_workers("build", n_rows, n_workers)
+        attached = run_workers("attach", path, n_workers)
+        assert all(r[3] == built[0][3] for r in built + attached), "รายงานจากชุดที่ map ไม่ตรงกับชุดที่สร้างเอง"
+        print(f"รายงาน {len(built[0][3])} ฉบับต่อ worker ตรงกันทุก worker: ok")
+        own = summarize("build", built)
+        shared = summarize("attach", attached)
+        print(f"หน่วยความจำส่วนตัวลดลง {own / shared:.1f}x")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
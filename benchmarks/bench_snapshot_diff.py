@@ -0,0 +1,75 @@
+"""ตรวจความถูกต้องและการโตของเวลาในการเทียบ snapshot สองรุ่น
+
+สร้างรุ่นถัดไปจากชีตสังเคราะห์: แก้เซลล์สุ่ม ลบ/เพิ่มผู้ป่วย สลับลำดับแถว แล้วเทียบผล diff กับสิ่งที่แก้จริง
+เวลาต่อแถวควรคงที่เมื่อจำนวนแถวเพิ่ม (เชิงเส้น)
+รัน: python -m benchmarks.bench_snapshot_diff [จำนวนแถว ...]
+"""
+import json
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_health_sheet
+from snapshot import row_hashes
+from snapshot_diff import diff_snapshots
+
+CHANGE_RATE = 0.01
+
+
+def next_revision(df, seed=1):
+    rng = np.random.default_rng(seed)
+    df = df.copy()
+    n_changes = max(1, int(len(df) * CHANGE_RATE))
+    columns = [c for c in df.columns if c != "HN"]
+    edits = {}
+    for row, col in zip(rng.choice(len(df), n_changes), rng.choice(len(columns), n_changes)):
+        column = columns[col]
+        old = df.iat[row, df.columns.get_loc(column)]
+        df.iat[row, df.columns.get_loc(column)] = old + "1"
+        edits[df["HN"].iat[row], column] = (edits.get((df["HN"].iat[row], column), (old,))[0], old + "1")
+    deleted = rng.choice(len(df), n_changes, replace=False)
+    added = make_health_sheet(n_changes, seed=seed + 1)
+    added["HN"] = "NEW" + added["HN"]
+    kept = np.setdiff1d(np.arange(len(df)), deleted)
+    expected = {
+        "deleted": set(df["HN"].iloc[deleted]),
+        "inserted": set(added["HN"]),
+        "cells": {key: value for key, value in edits.items() if key[0] not in set(df["HN"].iloc[deleted])},
+    }
+    revised = pd.concat([df.iloc[kept], added], ignore_index=True)
+    return revised.iloc[rng.permutation(len(revised))].reset_index(drop=True), expected
+
+
+def check(diff, expected):
+    assert set(diff.deleted_keys) == expected["deleted"], "แถวที่ลบไม่ตรง"
+    assert set(diff.inserted_keys) == expected["inserted"], "แถวที่เพิ่มไม่ตรง"
+    cells = {(key, column): (old, new) for key, column, old, new in diff.cells.itertuples(index=False)}
+    assert cells == expected["cells"], "เซลล์ที่เปลี่ยนไม่ตรง"
+    assert set(diff.updated_keys) == {key for key, _ in expected["cells"]}, "แถวที่แก้ไม่ตรง"
+
+
+def measure(n_rows):
+    old = make_health_sheet(n_rows)
+    new, expected = next_revision(old)
+    old_hashes, new_hashes = row_hashes(old), row_hashes(new)
+    start = time.perf_counter()
+    diff = diff_snapshots(old, old_hashes, new, new_hashes, "old", "new")
+    elapsed = time.perf_counter() - start
+    check(diff, expected)
+    record = diff.to_record()
+    size = len(json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    summary = diff.summary()
+    print(f"rows={n_rows:>8,} · diff {elapsed * 1000:8.1f} ms ({elapsed / n_rows * 1e6:.2f} µs/แถว) · "
+          f"เพิ่ม {summary['inserted']:,} แก้ {summary['updated']:,} ({summary['cells']:,} เซลล์) "
+          f"ลบ {summary['deleted']:,} · changelog {size / 1024:.1f} KB · ตรงกับที่แก้จริง: ok")
+
+
+def main(sizes=(25_000, 50_000, 100_000, 200_000)):
+    for n_rows in sizes:
+        measure(n_rows)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or (25_000, 50_000, 100_000, 200_000))
@@ -0,0 +1,106 @@
+"""ตรวจการรวมหลายแผ่นงาน (แยกตามรอบตรวจ / ตามบริษัท) และวัดการดึงพร้อมกันเทียบกับทีละแผ่น
+
+ใช้โฟลเดอร์ CSV แทน Google Sheet (หนึ่งไฟล์ต่อแผ่น) และแผ่นปลอมที่หน่วงเวลา/ตอบ 429 แทน API จริง
+รัน: python -m benchmarks.bench_worksheets [จำนวนแถว] [จำนวนแผ่น]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_health_sheet
+from schema import IDENTITY_COLUMNS, TESTS, YEARS, column_for
+from sheet_source import LocalFileSource, fetch_concurrently
+
+LATENCY = 0.2  # วินาทีต่อแผ่น ประมาณเวลาตอบของ get_all_records
+
+
+class RateLimited(Exception):
+    # หน้าตาเหมือน gspread APIError: มี response.status_code
+    class response:
+        status_code = 429
+
+
+def write_worksheets(frames, directory):
+    for title, df in frames.items():
+        df.to_csv(os.path.join(directory, f"{title}.csv"), index=False)
+
+
+def same_table(expected, got):
+    expected = expected.sort_values("HN").reset_index(drop=True).astype(object)
+    got = got.sort_values("HN").reset_index(drop=True)[expected.columns].astype(object)
+    return expected.equals(got)
+
+
+def check_rounds(df):
+    # หนึ่งแผ่นต่อปีตรวจ (คอลัมน์ปีนั้น + ข้อมูลระบุตัวตน) คนเดิมอยู่หลายแผ่น → ต้องรวมกลับเป็นแถวเดียว
+    frames = {}
+    for year in YEARS:
+        cols = [column_for(test, year) for test in TESTS if column_for(test, year) is not None]
+        frames[f"รอบ{year}"] = df[IDENTITY_COLUMNS + cols]
+    # ชื่อคอลัมน์ไม่ตรงกันระหว่างแผ่น: ช่องว่างเกิน, ตัวพิมพ์เล็ก, ปี 68 แบบมีเลขปี
+    frames["รอบ68"] = frames["รอบ68"].rename(columns={"HN": " HN ", "FBS68": "fbs68", "น้ำหนัก": "น้ำหนัก68"})
+    with tempfile.TemporaryDirectory() as tmp:
+        write_worksheets(frames, tmp)
+        source = LocalFileSource(tmp)
+        merged = source.fetch()
+    assert same_table(df, merged), "รวมแผ่นตามรอบตรวจแล้วไม่ตรงกับชีตเดิม"
+    renamed = source.last_report["worksheets"]["รอบ68"]["renamed"]
+    print(f"rounds: ok ({len(frames)} แผ่น → {len(merged):,} แถว, ปรับชื่อคอลัมน์ {renamed})")
+
+
+def check_companies(df, n_sheets):
+    # หนึ่งแผ่นต่อบริษัท: แถวไม่ซ้ำกัน ลำดับคอลัมน์สลับกันได้
+    parts = np.array_split(np.arange(len(df)), n_sheets)
+    frames = {f"บริษัท{i}": df.iloc[rows][df.columns[::-1] if i % 2 else df.columns] for i, rows in enumerate(parts)}
+    with tempfile.TemporaryDirectory() as tmp:
+        write_worksheets(frames, tmp)
+        merged = LocalFileSource(tmp).fetch()
+    assert same_table(df, merged), "รวมแผ่นตามบริษัทแล้วไม่ตรงกับชีตเดิม"
+    print(f"companies: ok ({n_sheets} แผ่น → {len(merged):,} แถว)")
+
+
+def bench_concurrency(df, n_sheets):
+    parts = dict(zip([f"แผ่น{i}" for i in range(n_sheets)], np.array_split(df, n_sheets)))
+    failures = {}
+
+    def slow_fetch(title):
+        def fetch():
+            time.sleep(LATENCY)
+            # ครั้งแรกของทุกแผ่นที่สามโดน rate limit
+            if int(title[4:]) % 3 == 0 and not failures.get(title):
+                failures[title] = True
+                raise RateLimited()
+            return parts[title]
+        return fetch
+
+    results = {}
+    for workers in (1, n_sheets):
+        failures.clear()
+        fetchers = {title: slow_fetch(title) for title in parts}
+        start = time.perf_counter()
+        frames = fetch_concurrently(fetchers, workers, base_delay=0.05)
+        results[workers] = time.perf_counter() - start
+        assert sum(len(f) for f in frames.values()) == len(df)
+    print(f"sequential ({n_sheets} แผ่น, หน่วง {LATENCY}s/แผ่น, 429 บางแผ่น): {results[1]:.2f} s")
+    print(f"concurrent ({n_sheets} workers): {results[n_sheets]:.2f} s ({results[1] / results[n_sheets]:.1f}x)")
+
+
+def main(n_rows=5_000, n_sheets=8):
+    df = make_health_sheet(n_rows)
+    check_rounds(df)
+    check_companies(df, n_sheets)
+    bench_concurrency(df, n_sheets)
+
+    frames = {f"รอบ{y}": df[IDENTITY_COLUMNS + [column_for(t, y) for t in TESTS if column_for(t, y)]] for y in YEARS}
+    with tempfile.TemporaryDirectory() as tmp:
+        write_worksheets(frames, tmp)
+        start = time.perf_counter()
+        LocalFileSource(tmp).fetch()
+    print(f"merge {len(frames)} แผ่นตามรอบ ({n_rows:,} คน): {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
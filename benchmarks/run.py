@@ -0,0 +1,226 @@
+"""ชุดวัดประสิทธิภาพหลัก (โหลดชีต, ค้นหา, รายงานรายคน, แปลผลทั้ง cohort, คัดกรองความเสี่ยง) บนชีตสังเคราะห์
+
+รัน: python -m benchmarks.run [--sizes 1k,50k,500k] [--only load,search] [--out ผลลัพธ์.json]
+     python -m benchmarks.run --sizes 50k --compare .bench/ก่อนแก้.json
+
+ผลลัพธ์เป็น JSON หนึ่งไฟล์ต่อการรัน (ค่าเริ่มต้น .bench/<เวลา>.json): ข้อมูลเครื่อง/เวอร์ชัน
+และรายการ {"size", "name", "unit", "value", ...} ใช้เทียบกับผลรอบก่อนด้วย --compare
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import SIZES, make_health_sheet
+from cohort import build_cohort_aggregates
+from interpret_batch import interpret_all_years, interpret_cohort
+from numeric_cache import build_numeric_cache
+from report_html import render_report_document
+from schema import CURRENT_YEAR
+from screening import EXAMPLES, screen
+from search_index import build_fuzzy_index, build_patient_index, lookup_patients
+from sheet_source import LocalFileSource, clean_sheet
+from snapshot import SnapshotStore, row_hashes
+from urinalysis import build_urine_codes
+
+SUITES = ["load", "search", "render", "cohort", "screening"]
+SAMPLES = 50           # จำนวนผู้ป่วย/คำค้นที่สุ่มมาวัดต่อขนาด
+REGRESSION = 1.2       # --compare: ช้ากว่าเดิมเกิน 20% = regression
+
+
+def once(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def per_call_ms(fn, args_list):
+    times = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        times.append((time.perf_counter() - start) * 1000)
+    return {"median": float(np.median(times)), "p95": float(np.percentile(times, 95)), "calls": len(times)}
+
+
+class Results:
+    def __init__(self):
+        self.items = []
+
+    def seconds(self, size, name, seconds, rows=None):
+        item = {"size": size, "name": name, "unit": "s", "value": round(seconds, 6)}
+        if rows:
+            item["rows_per_s"] = round(rows / seconds)
+        self.items.append(item)
+        print(f"  {name:<28} {seconds * 1000:10.1f} ms" + (f"  ({item['rows_per_s']:,} rows/s)" if rows else ""))
+
+    def latency(self, size, name, stats):
+        self.items.append({"size": size, "name": name, "unit": "ms", "value": round(stats["median"], 4),
+                           "p95": round(stats["p95"], 4), "calls": stats["calls"]})
+        print(f"  {name:<28} {stats['median']:10.3f} ms median, p95 {stats['p95']:.3f} ms")
+
+
+def bench_load(results, size, df):
+    # เส้นทางเดียวกับ dataset_cache.build_dataset: อ่านชีต → clean → snapshot → ดัชนีและ cache
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sheet.csv")
+        df.to_csv(path, index=False)
+        raw, elapsed = once(LocalFileSource(path).fetch)
+        results.seconds(size, "load.read_csv", elapsed, len(df))
+        cleaned, elapsed = once(lambda: clean_sheet(raw))
+        results.seconds(size, "load.clean_sheet", elapsed, len(df))
+
+        store = SnapshotStore(os.path.join(tmp, "snapshot"))
+        hashes, elapsed = once(lambda: row_hashes(cleaned))
+        results.seconds(size, "load.row_hashes", elapsed, len(df))
+        _, elapsed = once(lambda: store.write(cleaned, hashes, {}))
+        results.seconds(size, "load.snapshot_write", elapsed, len(df))
+        _, elapsed = once(store.read)
+        results.seconds(size, "load.snapshot_read", elapsed, len(df))
+
+    for name, build in [
+        ("load.patient_index", build_patient_index),
+        ("load.fuzzy_index", build_fuzzy_index),
+        ("load.numeric_cache", build_numeric_cache),
+        ("load.urine_codes", build_urine_codes),
+    ]:
+        _, elapsed = once(lambda: build(cleaned))
+        results.seconds(size, name, elapsed, len(df))
+
+
+def bench_search(results, size, df, rng):
+    index, _ = once(lambda: build_patient_index(df))
+    fuzzy, _ = once(lambda: build_fuzzy_index(df))
+    targets = df.iloc[rng.integers(0, len(df), size=SAMPLES)]
+    hns = [("", hn, "") for hn in targets["HN"]]
+    names = [("", "", name) for name in targets["ชื่อ-สกุล"]]
+    results.latency(size, "search.exact_hn", per_call_ms(lambda *q: lookup_patients(index, *q), hns))
+    results.latency(size, "search.exact_name", per_call_ms(lambda *q: lookup_patients(index, *q), names))
+    # ไม่มีคำนำหน้าและพิมพ์แค่ต้นนามสกุล
+    partial = [(f"{first} {last[:2]}",) for first, last in targets["ชื่อ-สกุล"].str.split(" ").str[1:3]]
+    results.latency(size, "search.fuzzy_name", per_call_ms(lambda q: fuzzy.search(q, k=10), partial))
+
+
+def bench_render(results, size, df, rng):
+    numbers = build_numeric_cache(df)
+    urine = build_urine_codes(df)
+    positions = rng.integers(0, len(df), size=SAMPLES)
+    records = df.iloc[positions].to_dict("records")
+    for year in (CURRENT_YEAR, CURRENT_YEAR - 3):
+        jobs = [(record, year, numbers.row(pos), urine.row(pos)) for record, pos in zip(records, positions)]
+        results.latency(size, f"render.report_{year}", per_call_ms(render_report_document, jobs))
+
+
+def bench_cohort(results, size, df):
+    _, elapsed = once(lambda: interpret_cohort(df, CURRENT_YEAR))
+    results.seconds(size, "cohort.interpret_current_year", elapsed, len(df))
+    _, elapsed = once(lambda: interpret_all_years(df))
+    results.seconds(size, "cohort.interpret_all_years", elapsed, len(df))
+    _, elapsed = once(lambda: build_cohort_aggregates(df))
+    results.seconds(size, "cohort.aggregates", elapsed, len(df))
+
+
+def bench_screening(results, size, df):
+    numbers = build_numeric_cache(df)
+    for i, expression in enumerate(EXAMPLES):
+        hits, elapsed = once(lambda: screen(df, numbers, expression))
+        results.seconds(size, f"screening.query_{i}", elapsed, len(df))
+    department = df["หน่วยงาน"].iloc[0]
+    _, elapsed = once(lambda: screen(df, numbers, EXAMPLES[1], department))
+    results.seconds(size, "screening.query_department", elapsed, len(df))
+    _, elapsed = once(lambda: hits.page(df, 1))
+    results.seconds(size, "screening.page", elapsed)
+    _, elapsed = once(lambda: hits.by_department(df))
+    results.seconds(size, "screening.by_department", elapsed, len(df))
+    _, elapsed = once(lambda: hits.to_csv(df))
+    results.seconds(size, "screening.csv", elapsed, len(hits))
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(current, baseline_path):
+    # เทียบค่า median/เวลา กับผลรอบก่อน: คืนรายการที่ช้าลงเกินเกณฑ์
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(item["size"], item["name"]): item["value"] for item in json.load(f)["results"]}
+    regressions = []
+    print(f"\nเทียบกับ {baseline_path}")
+    for item in current:
+        before = baseline.get((item["size"], item["name"]))
+        if not before:
+            continue
+        ratio = item["value"] / before
+        marker = "  << ช้าลง" if ratio > REGRESSION else ""
+        print(f"  {item['size']:>5} {item['name']:<28} x{ratio:5.2f}{marker}")
+        if marker:
+            regressions.append(item)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1k,50k", help=f"คั่นด้วยคอมม่า จาก {', '.join(SIZES)} หรือจำนวนแถว")
+    parser.add_argument("--only", default=",".join(SUITES), help=f"คั่นด้วยคอมม่า จาก {', '.join(SUITES)}")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="ไฟล์ผลลัพธ์ JSON (ค่าเริ่มต้น .bench/<เวลา>.json)")
+    parser.add_argument("--compare", default=None, help="ไฟล์ผลลัพธ์รอบก่อน; exit 1 ถ้ามีรายการช้าลงเกิน 20%%")
+    args = parser.parse_args(argv)
+
+    suites = [s for s in args.only.split(",") if s]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"ไม่รู้จัก suite: {', '.join(sorted(unknown))}")
+
+    results = Results()
+    for size in args.sizes.split(","):
+        n_rows = SIZES.get(size) or int(size)
+        df, elapsed = once(lambda: make_health_sheet(n_rows, seed=args.seed))
+        print(f"[{size}] {n_rows:,} แถว x {df.shape[1]} คอลัมน์ (สร้างชีต {elapsed:.1f} s)")
+        rng = np.random.default_rng(args.seed + 1)
+        if "load" in suites:
+            bench_load(results, size, df)
+        if "search" in suites:
+            bench_search(results, size, df, rng)
+        if "render" in suites:
+            bench_render(results, size, df, rng)
+        if "cohort" in suites:
+            bench_cohort(results, size, df)
+        if "screening" in suites:
+            bench_screening(results, size, df)
+        del df
+
+    report = {"environment": environment(), "seed": args.seed, "results": results.items}
+    out = args.out or os.path.join(".bench", datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"\nบันทึกผลที่ {out}")
+
+    if args.compare and compare(results.items, args.compare):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""ชีตผลตรวจสังเคราะห์ที่มีคอลัมน์ครบตาม schema.py (ปี 61-68 + ชื่อคอลัมน์พิเศษของปี 68)
+
+ใช้แทนข้อมูลผู้ป่วยจริงในการวัดประสิทธิภาพ: ค่าว่าง ค่า 0 "-" "N/A" และตัวเลขมีคอมม่า
+ปรากฏในสัดส่วนใกล้เคียงชีตจริง, ปีที่ไม่ได้มาตรวจเป็นช่องว่างทั้งปี, ผลรายปีของคนเดียวกันใกล้เคียงกัน
+สุ่มด้วย seed เดียวกันได้ชีตเดิมทุกครั้ง
+
+    from benchmarks.synthetic import make_health_sheet
+    df = make_health_sheet(50_000)
+"""
+import numpy as np
+import pandas as pd
+
+from schema import CURRENT_YEAR, IDENTITY_COLUMNS, TESTS, YEARS, column_for
+
+SIZES = {"1k": 1_000, "50k": 50_000, "500k": 500_000}
+
+# รายการตัวเลข: (ค่าต่ำ, ค่าสูง, ทศนิยม) ค่าของแต่ละคนสุ่มรอบค่าประจำตัวให้ผลรายปีต่อเนื่องกัน
+NUMERIC_TESTS = {
+    "weight": (35, 120, 1), "height": (140, 190, 1), "waist": (60, 120, 0),
+    "sbp": (90, 190, 0), "dbp": (55, 115, 0), "pulse": (50, 110, 0),
+    "fbs": (70, 180, 0), "uric": (2, 10, 1), "alp": (20, 160, 0), "sgot": (10, 60, 0), "sgpt": (10, 70, 0),
+    "chol": (120, 300, 0), "tgl": (40, 320, 0), "hdl": (25, 90, 0), "ldl": (50, 220, 0),
+    "bun": (5, 30, 1), "cr": (0.4, 1.8, 2), "gfr": (30, 120, 1),
+    "hb": (9, 17, 1), "hct": (28, 52, 1), "wbc": (2500, 15000, 0), "plt": (80000, 650000, 0),
+    "ne": (35, 80, 1), "ly": (15, 50, 1), "eo": (0, 12, 1), "mo": (1, 12, 1), "ba": (0, 2, 1),
+    "rbc": (3.5, 6.5, 2), "mcv": (60, 100, 1), "mch": (20, 34, 1), "mchc": (30, 36, 1),
+}
+# ค่าพันขึ้นไปในชีตจริงพิมพ์มีคอมม่าบ่อย (7,500 / 250,000)
+COMMA_TESTS = {"wbc", "plt"}
+
+# รายการข้อความ: (ตัวเลือก, ความน่าจะเป็น)
+TEXT_TESTS = {
+    "cxr": (["ปกติ", "Normal", "ผิดปกติ เงาหัวใจโต", "ไม่ได้ตรวจ"], [0.6, 0.25, 0.1, 0.05]),
+    "ekg": (["ปกติ", "Normal sinus rhythm", "ผิดปกติ Sinus bradycardia"], [0.6, 0.3, 0.1]),
+    "hep_a": (["Negative", "Positive", "ไม่ได้ตรวจ"], [0.6, 0.3, 0.1]),
+    "hep_b": (["Negative", "Positive"], [0.9, 0.1]),
+    "stool_exam": (["ปกติ", "พบเม็ดเลือดแดง", "พบเม็ดเลือดขาว", "Normal"], [0.8, 0.05, 0.05, 0.1]),
+    "stool_cs": (["ไม่พบเชื้อ", "ปกติ", "พบเชื้อ Salmonella"], [0.7, 0.25, 0.05]),
+    "urine_summary": (["ปกติ", "ผิดปกติเล็กน้อย ควรตรวจซ้ำ", "พบเม็ดเลือดแดงในปัสสาวะ"], [0.8, 0.15, 0.05]),
+    "urine_color": (["Yellow", "Pale Yellow", "Dark Yellow", "Amber", "red"], [0.5, 0.35, 0.1, 0.04, 0.01]),
+    "urine_sugar": (["negative", "trace", "1+", "2+", "3+"], [0.85, 0.05, 0.04, 0.03, 0.03]),
+    "urine_alb": (["negative", "trace", "1+", "2+", "3+"], [0.8, 0.08, 0.06, 0.04, 0.02]),
+    "urine_ph": (["5.0", "5.5", "6.0", "6.5", "7.0", "7.5", "8.0", "8.5"], [0.1, 0.15, 0.25, 0.2, 0.15, 0.1, 0.04, 0.01]),
+    "urine_spgr": (["1.005", "1.010", "1.015", "1.020", "1.025", "1.030", "1.035"], [0.1, 0.2, 0.25, 0.2, 0.15, 0.07, 0.03]),
+    "urine_rbc": (["negative", "0-1", "2-3", "3-5", "5-10", "10-20", "many"], [0.3, 0.35, 0.15, 0.08, 0.06, 0.04, 0.02]),
+    "urine_wbc": (["negative", "0-1", "2-3", "3-5", "5-10", "20-30"], [0.3, 0.35, 0.15, 0.1, 0.06, 0.04]),
+    "urine_epi": (["0-1", "2-3", "5-10", "10-20"], [0.5, 0.3, 0.15, 0.05]),
+    "urine_other": (["-", "Amorphous", "Bacteria few"], [0.9, 0.07, 0.03]),
+    "hbsag": (["Negative", "negative", "Positive"], [0.6, 0.35, 0.05]),
+    "hbsab": (["Negative", "negative", "Positive", "positive"], [0.3, 0.2, 0.3, 0.2]),
+    "hbcab": (["Negative", "negative", "Positive"], [0.5, 0.3, 0.2]),
+}
+
+DEPARTMENTS = ["ผู้ป่วยนอก", "ผู้ป่วยใน", "ห้องผ่าตัด", "เภสัชกรรม", "ชันสูตร", "บริหาร", "โภชนาการ", "ซักฟอก"]
+TITLES = ["นาย", "นาง", "นางสาว"]
+SYLLABLES = ["สม", "ชาย", "ศรี", "ใจ", "ดี", "กิ่ง", "แก้ว", "ประ", "เสริฐ", "วัน", "ทอง", "สุข", "มณี", "รัตน์", "พร", "ชัย", "นภา", "วิ", "ไล", "จัน", "ทร์", "บุญ", "มา", "เพ็ญ"]
+
+ATTEND_RATE = 0.8        # โอกาสมาตรวจแต่ละปี (ปี 68 = ทุกคนในชีต)
+BLANK_RATE = 0.06        # ช่องว่างกระจายในปีที่มาตรวจ
+JUNK_RATE = 0.01         # "0" "-" "N/A" ที่พิมพ์แทนค่าว่าง
+COMMA_RATE = 0.3
+
+
+def thai_names(rng, n_rows, n_unique):
+    # ชื่อ-สกุลสุ่มจากพยางค์ไทย 2-3 พยางค์ต่อคำ แล้วสุ่มซ้ำให้มีชื่อซ้ำกันบ้าง
+    syllables = np.array(SYLLABLES, dtype=object)
+    parts = [syllables[rng.integers(0, len(SYLLABLES), size=n_unique)] for _ in range(5)]
+    first = parts[0] + parts[1] + np.where(rng.random(n_unique) < 0.5, parts[2], "")
+    last = parts[3] + parts[4] + syllables[rng.integers(0, len(SYLLABLES), size=n_unique)]
+    titles = np.array(TITLES, dtype=object)[rng.integers(0, len(TITLES), size=n_unique)]
+    names = titles + " " + first + " " + last
+    return names[rng.integers(0, n_unique, size=n_rows)].astype(str)
+
+
+def identity_columns(rng, n_rows):
+    day = rng.integers(1, 29, size=n_rows).astype(str)
+    month = rng.integers(1, 13, size=n_rows).astype(str)
+    return {
+        "เลขบัตรประชาชน": rng.integers(10**12, 10**13, size=n_rows).astype(str),
+        "HN": np.char.add("HN", np.arange(n_rows).astype(str)),
+        "ชื่อ-สกุล": thai_names(rng, n_rows, max(n_rows * 9 // 10, 1)),
+        "อายุ": rng.integers(18, 65, size=n_rows).astype(str),
+        "เพศ": rng.choice(["ชาย", "หญิง", ""], size=n_rows, p=[0.48, 0.48, 0.04]),
+        "หน่วยงาน": rng.choice(DEPARTMENTS, size=n_rows),
+        "วันที่ตรวจ": np.char.add(np.char.add(np.char.add(day, "/"), np.char.add(month, "/")), str(2500 + CURRENT_YEAR)),
+    }
+
+
+def _number_vocab(low, high, decimals, comma):
+    # ค่าตัวเลขเป็นจุดบนตาราง ค่าละหนึ่งสตริง → แปลงเป็นข้อความครั้งเดียวต่อค่า ไม่ใช่ต่อ cell
+    step = 10.0 ** -decimals
+    grid = np.round(np.arange(low, high + step / 2, step), decimals)
+    if decimals == 0:
+        plain = [str(int(v)) for v in grid]
+        commas = [f"{int(v):,}" for v in grid]
+    else:
+        plain = [f"{v:.{decimals}f}" for v in grid]
+        commas = [f"{v:,.{decimals}f}" for v in grid]
+    return np.array(plain if not comma else commas, dtype=object), len(grid)
+
+
+def _blank_out(rng, values, attended):
+    values[~attended] = ""
+    n = len(values)
+    values[rng.random(n) < BLANK_RATE] = ""
+    junk = rng.random(n) < JUNK_RATE
+    values[junk] = rng.choice(["0", "-", "N/A"], size=int(junk.sum()))
+    return values
+
+
+def make_health_sheet(n_rows, seed=0, years=YEARS, tests=TESTS):
+    """DataFrame ข้อความล้วน (แบบเดียวกับ normalize_records) คอลัมน์ตาม schema ของ years x tests"""
+    rng = np.random.default_rng(seed)
+    data = identity_columns(rng, n_rows)
+    # ปีที่มาตรวจ: ปี 68 ทุกคน ปีก่อนหน้าสุ่ม
+    attended = {year: np.ones(n_rows, dtype=bool) if year == CURRENT_YEAR else rng.random(n_rows) < ATTEND_RATE
+                for year in years}
+
+    for test in tests:
+        if test in NUMERIC_TESTS:
+            low, high, decimals = NUMERIC_TESTS[test]
+            plain, size = _number_vocab(low, high, decimals, comma=False)
+            commas = _number_vocab(low, high, decimals, comma=True)[0] if test in COMMA_TESTS else None
+            baseline = rng.integers(0, size, size=n_rows)
+        else:
+            choices, p = TEXT_TESTS[test]
+        for year in years:
+            col = column_for(test, year)
+            if col is None:
+                continue
+            if test in NUMERIC_TESTS:
+                drift = rng.integers(-size // 20 - 1, size // 20 + 2, size=n_rows)
+                idx = np.clip(baseline + drift, 0, size - 1)
+                values = plain[idx]
+                if commas is not None:
+                    use_comma = rng.random(n_rows) < COMMA_RATE
+                    values[use_comma] = commas[idx[use_comma]]
+            else:
+                values = np.array(choices, dtype=object)[rng.choice(len(choices), size=n_rows, p=p)]
+            data[col] = _blank_out(rng, values, attended[year])
+
+    columns = IDENTITY_COLUMNS + [c for c in data if c not in IDENTITY_COLUMNS]
+    return pd.DataFrame({col: pd.array(data[col], dtype="str") for col in columns})
+
+
+def make_roster(n_rows, seed=0):
+    # เฉพาะคอลัมน์ระบุตัวตน สำหรับวัดการค้นหา
+    return make_health_sheet(n_rows, seed=seed, years=[], tests=[])
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+from interpret_batch import interpret_all_years
+from schema import CURRENT_YEAR
+from search_index import group_positions
+
+# ==================== COHORT AGGREGATES ====================
+# สร้างตารางความชุกตาม หน่วยงาน x เพศ x ช่วงอายุ x ปี ครั้งเดียวตอนโหลดชีต
+# จากผลแปลแบบ batch (interpret_batch) แล้ว dashboard แค่ roll-up ตารางเล็กนี้
+# แต่ละ cell เก็บตำแหน่งแถว (patient, year) ไว้สำหรับ drill-down
+
+DIMENSIONS = ["หน่วยงาน", "เพศ", "ช่วงอายุ", "year"]
+AGE_BINS = [0, 30, 40, 50, 60, 200]
+AGE_LABELS = ["< 30", "30-39", "40-49", "50-59", "60+"]
+
+# ภาวะ: (ชื่อที่แสดง, คอลัมน์ผลแปล, ผลที่นับเป็นพบภาวะ, ผลที่นับว่าไม่ได้ตรวจ)
+CONDITIONS = {
+    "obesity": ("อ้วน (BMI ≥ 25)", "bmi", ["อ้วน", "อ้วนมาก"], ["-"]),
+    "hypertension": ("ความดันสูง", "bp", ["ความดันสูง", "ความดันสูงเล็กน้อย"], ["-"]),
+    "anemia": ("โลหิตจาง", "hb", ["พบภาวะโลหิตจาง", "พบภาวะโลหิตจางเล็กน้อย"], ["-"]),
+    "dyslipidemia": ("ไขมันในเลือดสูง", "lipids", ["ไขมันในเลือดสูง", "ไขมันในเลือดสูงเล็กน้อย"], [""]),
+    "low_gfr": ("GFR < 60", "kidney", ["การทำงานของไตต่ำกว่าเกณฑ์ปกติเล็กน้อย"], [""]),
+    "hbsag_positive": ("HBsAg positive", "hep_b", ["ติดเชื้อไวรัสตับอักเสบบี"], []),
+}
+
+
+def age_bands(df):
+    age = pd.to_numeric(df["อายุ"], errors="coerce") if "อายุ" in df.columns else pd.Series(np.nan, index=df.index)
+    return pd.cut(age, bins=AGE_BINS, labels=AGE_LABELS, right=False)
+
+
+class CohortAggregates:
+    def __init__(self, rows, cube, members):
+        self.rows = rows          # หนึ่งแถวต่อ (patient, year): มิติ + flag ของทุกภาวะ
+        self.cube = cube          # ตาราง aggregate ระดับละเอียดสุด (ทุกมิติ)
+        self.members = members    # cell id -> ตำแหน่งใน rows
+
+    def summary(self, by, filters=None):
+        # roll-up จาก cube: นับผู้ตรวจ / ผู้พบภาวะ และ % ความชุก
+        cube = self._filter(self.cube, filters)
+        counts = [f"{c}_tested" for c in CONDITIONS] + [f"{c}_cases" for c in CONDITIONS]
+        table = cube.groupby(by, observed=True, dropna=False)[counts].sum() if by else cube[counts].sum().to_frame().T
+        for c in CONDITIONS:
+            with np.errstate(all="ignore"):
+                table[f"{c}_pct"] = 100 * table[f"{c}_cases"] / table[f"{c}_tested"]
+        return table
+
+    def drill_down(self, condition, filters=None):
+        # ตำแหน่งผู้ป่วยที่พบภาวะใน cell ที่เลือก: รวมตำแหน่งของ cell ย่อยใน cube ที่ตรงเงื่อนไข
+        cells = self._filter(self.cube, filters)
+        if cells.empty:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.int8)
+        positions = np.concatenate([self.members[cell] for cell in cells["cell"]])
+        hits = positions[self.rows[f"{condition}_case"].to_numpy()[positions]]
+        return self.rows["patient"].to_numpy()[hits], self.rows["year"].to_numpy()[hits]
+
+    @staticmethod
+    def _filter(frame, filters):
+        if not filters:
+            return frame
+        mask = np.ones(len(frame), dtype=bool)
+        for dim, value in filters.items():
+            if value is not None:
+                mask &= (frame[dim] == value).to_numpy()
+        return frame[mask]
+
+
+def build_cohort_aggregates(df):
+    results = interpret_all_years(df)
+    patient = results["patient"].to_numpy()
+
+    rows = pd.DataFrame({
+        "patient": patient,
+        "year": results["year"].to_numpy(),
+        "หน่วยงาน": df["หน่วยงาน"].astype(str).str.strip().to_numpy()[patient] if "หน่วยงาน" in df.columns else "",
+        "เพศ": df["เพศ"].astype(str).str.strip().to_numpy()[patient] if "เพศ" in df.columns else "",
+        "ช่วงอายุ": age_bands(df).astype(str).to_numpy()[patient],
+    })
+    for key, (_, col, positive, untested) in CONDITIONS.items():
+        values = results[col]
+        tested = ~values.isin(untested).to_numpy()
+        if key == "hbsag_positive":
+            # HBsAg ไม่แยกปี → นับเฉพาะปีปัจจุบัน และเฉพาะที่มีผล
+            tested = (rows["year"].to_numpy() == CURRENT_YEAR) & (df["HbsAg"].astype(str).str.strip().to_numpy()[patient] != "") \
+                if "HbsAg" in df.columns else np.zeros(len(rows), dtype=bool)
+        rows[f"{key}_tested"] = tested
+        rows[f"{key}_case"] = tested & values.isin(positive).to_numpy()
+
+    # ตัดแถว (patient, year) ที่ไม่มีผลตรวจใดๆ เลยในปีนั้น
+    any_tested = rows[[f"{c}_tested" for c in CONDITIONS]].any(axis=1).to_numpy()
+    rows = rows[any_tested].reset_index(drop=True)
+
+    rows["cell"] = rows.groupby(DIMENSIONS, observed=True, sort=False, dropna=False).ngroup().astype(np.int32)
+    members_by_cell = group_positions(rows["cell"].to_numpy())
+    members = [members_by_cell[cell] for cell in range(len(members_by_cell))]
+
+    sums = {f"{c}_tested": "sum" for c in CONDITIONS}
+    sums.update({f"{c}_case": "sum" for c in CONDITIONS})
+    cube = rows.groupby(["cell"] + DIMENSIONS, observed=True).agg(sums).reset_index()
+    cube = cube.rename(columns={f"{c}_case": f"{c}_cases" for c in CONDITIONS})
+    return CohortAggregates(rows, cube, members)
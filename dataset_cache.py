@@ -0,0 +1,113 @@
+import threading
+import time
+
+from cohort import build_cohort_aggregates
+from instrumentation import instrumented
+from numeric_cache import build_numeric_cache
+from search_index import build_fuzzy_index, build_patient_index
+from sheet_source import clean_sheet
+from urinalysis import build_urine_codes
+
+# ==================== SHARED DATASET ====================
+# ชุดข้อมูลที่สร้างจาก snapshot หนึ่ง version (ตาราง, ดัชนีค้นหา, cache ตัวเลข, รหัสปัสสาวะ)
+# เก็บเป็น object เดียวใน process ใช้ร่วมกันทุก session โดยไม่ pickle/copy (ต่างจาก st.cache_data)
+# เมื่อ snapshot เปลี่ยน version: สร้างชุดใหม่ใน thread เดียว (single-flight) ระหว่างนั้นทุก session
+# ยังได้ชุดเดิม (stale-while-revalidate) แล้วสลับ reference เมื่อสร้างเสร็จ
+
+
+class Dataset:
+    # อ่านอย่างเดียวหลังสร้าง: array ของ numpy ถูกตั้ง read-only กันการแก้ไขข้าม session โดยไม่ตั้งใจ
+    def __init__(self, version, df, patient_index, fuzzy_index, numeric_cache, urine_codes):
+        self.version = version
+        self.df = df
+        self.patient_index = patient_index
+        self.fuzzy_index = fuzzy_index
+        self.numeric_cache = numeric_cache
+        self.urine_codes = urine_codes
+        self.built_at = time.time()
+        self._cohort = None
+        self._cohort_lock = threading.Lock()
+
+    def cohort(self):
+        # ตารางความชุกสร้างเมื่อเปิด dashboard ครั้งแรกเท่านั้น (ครั้งเดียวต่อ version)
+        with self._cohort_lock:
+            if self._cohort is None:
+                self._cohort = build_cohort_aggregates(self.df)
+            return self._cohort
+
+
+def _freeze(dataset):
+    dataset.numeric_cache.matrix.setflags(write=False)
+    dataset.numeric_cache.year_mask.setflags(write=False)
+    for values in dataset.urine_codes.codes.values():
+        values.setflags(write=False)
+    return dataset
+
+
+@instrumented("build_dataset")
+def build_dataset(frame, version):
+    df = clean_sheet(frame)
+    # ✅ สร้างดัชนีค้นหา (ตรงตัว + fuzzy) ค่าตัวเลขแล็บ (+ ปีที่มีผล) และรหัสผลปัสสาวะ ครั้งเดียวต่อ version
+    return _freeze(Dataset(
+        version, df, build_patient_index(df), build_fuzzy_index(df),
+        build_numeric_cache(df), build_urine_codes(df),
+    ))
+
+
+class SharedDataset:
+    def __init__(self, service, build=build_dataset):
+        self.service = service  # อะไรก็ได้ที่มี current() -> (frame, version) เช่น SnapshotService
+        self.build = build
+        self.current = None
+        self.builds = 0
+        self.stale_reads = 0
+        self.last_error = None
+        self._building = None   # version ที่กำลังสร้างอยู่ (มีได้ทีละหนึ่ง)
+        self._failed = None     # version ที่สร้างไม่สำเร็จ: ไม่ลองซ้ำจนกว่า snapshot จะเปลี่ยนอีก
+        self._cond = threading.Condition()
+
+    def get(self):
+        frame, version = self.service.current()
+        with self._cond:
+            if self.current is not None and self.current.version == version:
+                return self.current
+            if self._building is None and version != self._failed and frame is not None:
+                self._building = version
+                threading.Thread(target=self._build, args=(frame, version), name="dataset-build", daemon=True).start()
+            if self.current is not None:
+                # ชุดเดิมยังใช้ได้ระหว่างสร้างชุดใหม่ ไม่มี session ไหนต้องรอ
+                self.stale_reads += 1
+                return self.current
+            # ยังไม่เคยมีชุดข้อมูล (เริ่มระบบ): รอ build ที่กำลังทำอยู่ แทนการสร้างซ้ำในทุก session
+            while self.current is None and self._building is not None:
+                self._cond.wait()
+            if self.current is None:
+                raise RuntimeError(f"สร้างชุดข้อมูลไม่สำเร็จ: {self.last_error}")
+            return self.current
+
+    def _build(self, frame, version):
+        dataset, error = None, None
+        try:
+            dataset = self.build(frame, version)
+        except Exception as e:
+            error = e
+        with self._cond:
+            if dataset is not None:
+                self.current = dataset
+                self.builds += 1
+                self.last_error = None
+            else:
+                self.last_error = error
+                self._failed = version
+            self._building = None
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "version": self.current.version if self.current else None,
+                "building": self._building,
+                "builds": self.builds,
+                "stale_reads": self.stale_reads,
+                "error": repr(self.last_error) if self.last_error else None,
+            }
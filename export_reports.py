@@ -0,0 +1,140 @@
+import argparse
+import io
+import os
+import re
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from numeric_cache import build_numeric_cache
+from report_html import render_report_document
+from schema import YEARS, columns_for_year, projected_columns
+from urinalysis import build_urine_codes
+
+# ==================== BATCH EXPORT ====================
+# ส่งออกรายงานของทุกคนในหน่วยงาน (หรือทั้งหมด) สำหรับปีที่เลือก เป็น HTML/PDF
+# เรนเดอร์ใน process pool แล้วเขียนลง zip ทีละไฟล์ตามลำดับที่เสร็จ
+# ใช้ได้ทั้งจาก CLI (python export_reports.py ...) และจากหน้า Streamlit
+
+FORMATS = ("html", "pdf")
+_UNSAFE_FILENAME = re.compile(r'[\\/:*?"<>|\s]+')
+
+
+def select_patients(df, year, department=None):
+    # ผู้ป่วยที่อยู่ในหน่วยงาน และมีผลตรวจอย่างน้อยหนึ่งรายการในปีนั้น
+    mask = np.ones(len(df), dtype=bool)
+    if department:
+        mask &= (df["หน่วยงาน"].astype(str).str.strip() == department).to_numpy()
+    year_cols = [c for c in columns_for_year(year).values() if c in df.columns]
+    if year_cols:
+        filled = df[year_cols].astype(str).apply(lambda col: col.str.strip() != "")
+        mask &= filled.any(axis=1).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def report_filename(record, year, fmt):
+    name = _UNSAFE_FILENAME.sub("_", f"{record.get('HN', '')}_{record.get('ชื่อ-สกุล', '')}").strip("_")
+    return f"{name or 'report'}_{2500 + year}.{fmt}"
+
+
+def render_report(record, year, fmt="html", numbers=None, urine=None):
+    document = render_report_document(record, year, numbers, urine)
+    if fmt == "pdf":
+        try:
+            from weasyprint import HTML
+        except ImportError as e:
+            raise RuntimeError("ส่งออก PDF ต้องติดตั้ง weasyprint (pip install weasyprint)") from e
+        return HTML(string=document).write_pdf()
+    return document.encode("utf-8")
+
+
+def _render_job(job):
+    record, numbers, urine, year, fmt = job
+    return report_filename(record, year, fmt), render_report(record, year, fmt, numbers, urine)
+
+
+def export_reports(df, year, out, department=None, fmt="html", workers=None, progress=None):
+    if fmt not in FORMATS:
+        raise ValueError(f"รูปแบบไฟล์ต้องเป็น {FORMATS}")
+    positions = select_patients(df, year, department)
+    total = len(positions)
+    selected = df.iloc[positions]
+    records = selected.to_dict("records")
+    numeric = build_numeric_cache(selected)
+    urine = build_urine_codes(selected)
+    jobs = ((record, numeric.row(i), urine.row(i), year, fmt) for i, record in enumerate(records))
+
+    start = time.perf_counter()
+    done = 0
+    used_names = set()
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, total // ((workers or os.cpu_count() or 1) * 8))
+            for filename, payload in pool.map(_render_job, jobs, chunksize=chunksize):
+                # ชื่อซ้ำ (HN ว่าง/ชื่อเหมือนกัน) → เติมลำดับต่อท้าย
+                base, ext = os.path.splitext(filename)
+                n = 1
+                while filename in used_names:
+                    n += 1
+                    filename = f"{base}_{n}{ext}"
+                used_names.add(filename)
+                archive.writestr(filename, payload)
+                done += 1
+                if progress is not None:
+                    progress(done, total, time.perf_counter() - start)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "count": done,
+        "seconds": elapsed,
+        "per_second": done / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def export_reports_bytes(df, year, department=None, fmt="html", workers=None, progress=None):
+    buffer = io.BytesIO()
+    stats = export_reports(df, year, buffer, department, fmt, workers, progress)
+    return buffer.getvalue(), stats
+
+
+def load_cli_sheet(path=None, year=None):
+    # year: โหลดเฉพาะคอลัมน์ที่รายงานปีนั้นใช้ (ระบุตัวตน + ผลตรวจปีนั้น)
+    from sheet_source import LocalFileSource, ProjectedSheet, clean_sheet
+    from snapshot import SnapshotStore
+
+    if path:
+        source = LocalFileSource(path)
+        return clean_sheet(source.fetch() if year is None else ProjectedSheet(source).load([year]))
+    store = SnapshotStore()
+    if not store.exists():
+        raise SystemExit("ไม่พบ snapshot ของชีต: ระบุ --sheet หรือเปิดแอปเพื่อสร้าง snapshot ก่อน")
+    df, _, _ = store.read(None if year is None else projected_columns([year]))
+    return clean_sheet(df)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ส่งออกรายงานผลตรวจสุขภาพทั้งหน่วยงานเป็นไฟล์ zip")
+    parser.add_argument("--year", type=int, choices=YEARS, required=True, help="ปี พ.ศ. 2 หลัก เช่น 68")
+    parser.add_argument("--department", help="ชื่อหน่วยงาน (ไม่ระบุ = ทุกคน)")
+    parser.add_argument("--format", choices=FORMATS, default="html")
+    parser.add_argument("--out", required=True, help="ไฟล์ zip ปลายทาง")
+    parser.add_argument("--sheet", help="ไฟล์ CSV/XLSX (ไม่ระบุ = ใช้ snapshot ล่าสุด)")
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args(argv)
+
+    df = load_cli_sheet(args.sheet, args.year)
+
+    def progress(done, total, elapsed):
+        rate = done / elapsed if elapsed > 0 else 0.0
+        print(f"\r{done}/{total} รายงาน ({rate:.1f} ฉบับ/วินาที)", end="", file=sys.stderr)
+
+    stats = export_reports(df, args.year, args.out, args.department, args.format, args.workers, progress)
+    print(file=sys.stderr)
+    print(f"ส่งออก {stats['count']} ฉบับใน {stats['seconds']:.1f} วินาที ({stats['per_second']:.1f} ฉบับ/วินาที) → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
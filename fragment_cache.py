@@ -0,0 +1,59 @@
+import threading
+from collections import OrderedDict
+
+# ==================== REPORT FRAGMENT CACHE ====================
+# LRU cache ของ HTML แต่ละส่วนของรายงาน คีย์ = (HN, ตำแหน่งแถว, ปี, ส่วน)
+# ผูกกับ version ของ snapshot: เมื่อ version เปลี่ยน ล้างทั้งหมดทันที
+# ถ้ามี diff จากรุ่นที่แคชอยู่ (snapshot_diff) เก็บส่วนของแถวที่เนื้อหาไม่เปลี่ยนไว้ แค่ย้ายไปตำแหน่งแถวใหม่
+
+
+class FragmentCache:
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def set_version(self, version, diff=None):
+        with self._lock:
+            if version == self.version:
+                return
+            if diff is not None and diff.from_version == self.version and diff.to_version == version:
+                old_to_new = diff.unchanged_mapping()
+                kept = OrderedDict()
+                for (hn, pos, *rest), fragment in self._entries.items():
+                    if pos < len(old_to_new) and old_to_new[pos] >= 0:
+                        kept[(hn, int(old_to_new[pos]), *rest)] = fragment
+                self._entries = kept
+            else:
+                self._entries.clear()
+            self.version = version
+
+    def get_or_render(self, key, render):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        # เรนเดอร์นอก lock เพื่อไม่ให้ session อื่นต้องรอ
+        fragment = render()
+        with self._lock:
+            self._entries[key] = fragment
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return fragment
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "version": self.version,
+            }
@@ -0,0 +1,174 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+# ==================== INSTRUMENTATION ====================
+# จับเวลาและจำนวน memory block ที่จองเพิ่มของแต่ละขั้นตอนในหนึ่งรอบการรัน (rerun/fragment)
+# รอบที่กำลังรันเก็บแบบ thread-local (Streamlit รันแต่ละ session ใน thread ของตัวเอง)
+# นอกรอบการรัน (เช่น process ส่งออกรายงาน) decorator จะเรียกฟังก์ชันตรง ๆ ไม่มีต้นทุนเพิ่ม
+# งานเบื้องหลังที่อยากให้เห็นในแผงผู้ดูแล (เช่น โหลดชีตใน thread รีเฟรช) ใช้ background_span เปิดรอบของตัวเอง
+# จบรอบแล้วเก็บไว้ในหน่วยความจำ (แผงผู้ดูแล) และต่อท้ายไฟล์ JSONL สำหรับวิเคราะห์ภายหลัง
+
+LOG_PATH = Path(os.environ.get("HEALTH_PROFILE_LOG", ".profile/timings.jsonl"))
+# tracemalloc ทำให้ทุกอย่างช้าลงหลายเท่า เปิดเฉพาะตอนต้องการดูขนาดหน่วยความจำเป็น byte
+TRACE_BYTES = os.environ.get("HEALTH_TRACEMALLOC") == "1"
+RECENT_RUNS = 500
+
+_local = threading.local()
+_recent = deque(maxlen=RECENT_RUNS)
+_lock = threading.Lock()
+
+
+class Run:
+    def __init__(self, kind, session=None):
+        self.kind = kind
+        self.session = session
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self._blocks0 = sys.getallocatedblocks()
+        self.spans = {}  # name -> [calls, ms, blocks, bytes]
+
+    def add(self, name, ms, blocks, nbytes):
+        span = self.spans.setdefault(name, [0, 0.0, 0, 0])
+        span[0] += 1
+        span[1] += ms
+        span[2] += blocks
+        span[3] += nbytes
+
+    def record(self):
+        return {
+            "ts": round(self.started, 3),
+            "session": self.session,
+            "kind": self.kind,
+            "total_ms": round((time.perf_counter() - self._t0) * 1000, 3),
+            "blocks": sys.getallocatedblocks() - self._blocks0,
+            "spans": {
+                name: {"calls": calls, "ms": round(ms, 3), "blocks": blocks, "bytes": nbytes}
+                for name, (calls, ms, blocks, nbytes) in self.spans.items()
+            },
+        }
+
+
+def current_run():
+    return getattr(_local, "run", None)
+
+
+def start_run(kind, session=None):
+    # รอบก่อนหน้าที่ไม่ได้ปิด (เช่น st.stop()) ถูกทิ้งไป
+    if TRACE_BYTES and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _local.run = Run(kind, session)
+    return _local.run
+
+
+def finish_run():
+    run = current_run()
+    if run is None:
+        return None
+    _local.run = None
+    record = run.record()
+    with _lock:
+        _recent.append(record)
+        _append_log(record)
+    return record
+
+
+def _append_log(record):
+    try:
+        LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError:
+        pass  # log เป็นของเสริม ไม่ให้ทำหน้ารายงานล้ม
+
+
+@contextmanager
+def timed(name):
+    run = current_run()
+    if run is None:
+        yield
+        return
+    blocks0 = sys.getallocatedblocks()
+    bytes0 = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - t0) * 1000
+        nbytes = tracemalloc.get_traced_memory()[0] - bytes0 if tracemalloc.is_tracing() else 0
+        run.add(name, ms, sys.getallocatedblocks() - blocks0, nbytes)
+
+
+@contextmanager
+def run_or_span(kind, session=None):
+    # fragment ที่ถูกเรียกระหว่างรันทั้งหน้า = span หนึ่งของรอบนั้น, rerun เฉพาะ fragment = รอบใหม่
+    if current_run() is not None:
+        with timed(kind):
+            yield
+        return
+    start_run(kind, session)
+    try:
+        yield
+    finally:
+        finish_run()
+
+
+@contextmanager
+def background_span(name):
+    # ในรอบการรัน = span ปกติ, นอกรอบ (thread เบื้องหลัง) = รอบ "background" ที่มี span เดียว บันทึกลง JSONL เหมือนกัน
+    if current_run() is not None:
+        with timed(name):
+            yield
+        return
+    start_run("background")
+    try:
+        with timed(name):
+            yield
+    finally:
+        finish_run()
+
+
+def instrumented(name=None):
+    def decorate(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if current_run() is None:
+                return fn(*args, **kwargs)
+            with timed(label):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def recent_runs(session=None):
+    with _lock:
+        runs = list(_recent)
+    if session is not None:
+        runs = [run for run in runs if run["session"] == session]
+    return runs
+
+
+def span_samples(runs):
+    # name -> list ของเวลา (ms) ต่อรอบ สำหรับทำ histogram; "total" = ทั้งรอบ
+    # รอบเบื้องหลังไม่ใช่การรันหน้า จึงไม่นับใน total
+    samples = {"total": [run["total_ms"] for run in runs if run["kind"] != "background"]}
+    for run in runs:
+        for name, span in run["spans"].items():
+            samples.setdefault(name, []).append(span["ms"])
+    return samples
+
+
+def read_log(path=LOG_PATH):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
@@ -0,0 +1,379 @@
+import re
+from functools import lru_cache
+
+from reference_ranges import CATEGORIES, RANGES
+
+# ==================== INTERPRET FUNCTIONS ====================
+# เกณฑ์ตัวเลขทั้งหมดอยู่ใน reference_ranges.json ฟังก์ชันที่นี่แค่แปลงค่าแล้วส่งให้ตารางเกณฑ์
+def _number(value, strip_commas=False):
+    try:
+        return float(str(value).replace(",", "").strip() if strip_commas else value)
+    except (ValueError, TypeError):
+        return float("nan")
+
+def interpret_bmi(bmi):
+    return CATEGORIES["bmi"].classify(bmi=_number(bmi))
+
+def interpret_bp(sbp, dbp):
+    return CATEGORIES["bp"].classify(sbp=_number(sbp), dbp=_number(dbp))
+
+def bmi_advice_text(bmi):
+    return CATEGORIES["bmi_advice"].classify(bmi=_number(bmi))
+
+def bp_advice_text(sbp, dbp):
+    return CATEGORIES["bp_advice"].classify(sbp=_number(sbp), dbp=_number(dbp))
+
+def combined_health_advice(bmi, sbp, dbp):
+    return compose_health_advice(bmi_advice_text(bmi), bp_advice_text(sbp, dbp))
+
+def compose_health_advice(bmi_text, bp_text):
+    # สร้างคำแนะนำรวม
+    if not bmi_text and not bp_text:
+        return "ไม่พบข้อมูลเพียงพอในการประเมินสุขภาพ"
+
+    if "ปกติ" in bmi_text and not bp_text:
+        return "น้ำหนักอยู่ในเกณฑ์ดี ควรรักษาพฤติกรรมสุขภาพนี้ต่อไป"
+
+    if not bmi_text and bp_text:
+        return f"{bp_text} แนะนำให้ดูแลสุขภาพ และติดตามค่าความดันอย่างสม่ำเสมอ"
+
+    if bmi_text and bp_text:
+        return f"{bmi_text} และ {bp_text} แนะนำให้ปรับพฤติกรรมด้านอาหารและการออกกำลังกาย"
+
+    return f"{bmi_text} แนะนำให้ดูแลเรื่องโภชนาการและการออกกำลังกายอย่างเหมาะสม"
+
+# 🧪 ปัสสาวะ: ข้อความ → รหัสลำดับ (reference_ranges) → แถบแปลผล
+def interpret_alb_code(code):
+    return CATEGORIES["urine_alb"].classify(alb=RANGES["urine_alb"].category_input(code))
+
+def interpret_sugar_code(code):
+    return CATEGORIES["urine_sugar"].classify(sugar=RANGES["urine_sugar"].category_input(code))
+
+def interpret_rbc_code(code):
+    return CATEGORIES["urine_rbc"].classify(rbc=RANGES["urine_rbc"].category_input(code))
+
+def interpret_urine_wbc_code(code):
+    return CATEGORIES["urine_wbc"].classify(wbc=RANGES["urine_wbc"].category_input(code))
+
+def interpret_alb(value):
+    return interpret_alb_code(RANGES["urine_alb"].encode(value))
+
+def interpret_sugar(value):
+    return interpret_sugar_code(RANGES["urine_sugar"].encode(value))
+
+def interpret_rbc(value):
+    return interpret_rbc_code(RANGES["urine_rbc"].encode(value))
+
+def interpret_urine_wbc(value):
+    return interpret_urine_wbc_code(RANGES["urine_wbc"].encode(value))
+
+def advice_urine(sex, alb, sugar, rbc, wbc):
+    return urine_advice_text(sex, interpret_alb(alb), interpret_sugar(sugar), interpret_rbc(rbc), interpret_urine_wbc(wbc))
+
+def urine_advice_text(sex, alb_text, sugar_text, rbc_text, wbc_text):
+    if all(x in ["-", "ปกติ", "ไม่พบ", "พบโปรตีนในปัสสาวะเล็กน้อย", "พบน้ำตาลในปัสสาวะเล็กน้อย"]
+           for x in [alb_text, sugar_text, rbc_text, wbc_text]):
+        return ""
+
+    if "พบน้ำตาลในปัสสาวะ" in sugar_text and "เล็กน้อย" not in sugar_text:
+        return "ควรลดการบริโภคน้ำตาล และตรวจระดับน้ำตาลในเลือดเพิ่มเติม"
+
+    if sex == "หญิง" and "พบเม็ดเลือดแดง" in rbc_text and "ปกติ" in wbc_text:
+        return "อาจมีปนเปื้อนจากประจำเดือน แนะนำให้ตรวจซ้ำ"
+
+    if sex == "ชาย" and "พบเม็ดเลือดแดง" in rbc_text and "ปกติ" in wbc_text:
+        return "พบเม็ดเลือดแดงในปัสสาวะ ควรตรวจทางเดินปัสสาวะเพิ่มเติม"
+
+    if "พบเม็ดเลือดขาวในปัสสาวะ" in wbc_text and "เล็กน้อย" not in wbc_text:
+        return "อาจมีการอักเสบของระบบทางเดินปัสสาวะ แนะนำให้ตรวจซ้ำ"
+
+    return "ควรตรวจปัสสาวะซ้ำเพื่อติดตามผล"
+
+def interpret_stool_exam(value):
+    if not value or value.strip() == "":
+        return "-"
+    if "ปกติ" in value:
+        return "ปกติ"
+    elif "เม็ดเลือดแดง" in value:
+        return "พบเม็ดเลือดแดงในอุจจาระ นัดตรวจซ้ำ"
+    elif "เม็ดเลือดขาว" in value:
+        return "พบเม็ดเลือดขาวในอุจจาระ นัดตรวจซ้ำ"
+    return value.strip()
+
+def interpret_stool_cs(value):
+    if not value or value.strip() == "":
+        return "-"
+    if "ไม่พบ" in value or "ปกติ" in value:
+        return "ไม่พบการติดเชื้อ"
+    return "พบการติดเชื้อในอุจจาระ ให้พบแพทย์เพื่อตรวจรักษาเพิ่มเติม"
+
+# 📌 ฟังก์ชันรวมคำแนะนำแบบไม่ซ้ำซ้อน
+_SEE_DOCTOR = re.compile(r"^(ควรพบแพทย์เพื่อตรวจหา(?:และติดตาม)?(?:[^,]*)?)")
+_LEADING_AND = re.compile(r"^และ\s+")
+
+def merge_similar_sentences(messages):
+    if len(messages) == 1:
+        return messages[0]
+
+    merged = []
+    seen_prefixes = {}
+
+    for msg in messages:
+        prefix = _SEE_DOCTOR.match(msg)
+        if prefix:
+            key = "ควรพบแพทย์เพื่อตรวจหา"
+            rest = msg[len(prefix.group(1)):].strip()
+            phrase = prefix.group(1)[len(key):].strip()
+
+            # 🔧 รวม phrase และ rest → แล้วลบ "และ" ที่ขึ้นต้น
+            full_detail = f"{phrase} {rest}".strip()
+            full_detail = _LEADING_AND.sub("", full_detail)
+
+            if key in seen_prefixes:
+                seen_prefixes[key].append(full_detail)
+            else:
+                seen_prefixes[key] = [full_detail]
+        else:
+            merged.append(msg)
+
+    for key, endings in seen_prefixes.items():
+        endings = [e.strip() for e in endings if e]
+        if endings:
+            if len(endings) == 1:
+                merged.append(f"{key} {endings[0]}")
+            else:
+                body = " ".join(endings[:-1]) + " และ " + endings[-1]
+                merged.append(f"{key} {body}")
+        else:
+            merged.append(key)
+
+    return "<br>".join(merged)
+
+cbc_messages = {
+    2:  "ดูแลสุขภาพ ออกกำลังกาย ทานอาหารมีประโยชน์ ติดตามผลเลือดสม่ำเสมอ",
+    4:  "ควรพบแพทย์เพื่อตรวจหาสาเหตุเกล็ดเลือดต่ำ เพื่อเฝ้าระวังอาการผิดปกติ",
+    6:  "ควรตรวจซ้ำเพื่อติดตามเม็ดเลือดขาว และดูแลสุขภาพร่างกายให้แข็งแรง",
+    8:  "ควรพบแพทย์เพื่อตรวจหาสาเหตุภาวะโลหิตจาง เพื่อรักษาตามนัด",
+    9:  "ควรพบแพทย์เพื่อตรวจหาและติดตามภาวะโลหิตจางร่วมกับเม็ดเลือดขาวผิดปกติ",
+    10: "ควรพบแพทย์เพื่อตรวจหาสาเหตุเกล็ดเลือดสูง เพื่อพิจารณาการรักษา",
+    13: "ควรดูแลสุขภาพ ติดตามภาวะโลหิตจางและเม็ดเลือดขาวผิดปกติอย่างใกล้ชิด",
+}
+
+def interpret_wbc(wbc):
+    return CATEGORIES["wbc"].classify(wbc=_number(wbc))
+
+def interpret_hb(hb, sex):
+    return CATEGORIES["hb"].classify(sex=sex, hb=_number(hb))
+
+def interpret_plt(plt):
+    return CATEGORIES["plt"].classify(plt=_number(plt))
+
+def cbc_advice(hb_result, wbc_result, plt_result):
+    message_ids = cbc_message_ids(hb_result, wbc_result, plt_result)
+    if message_ids in ("-", "", "ควรพบแพทย์เพื่อตรวจเพิ่มเติม"):
+        return message_ids
+    # รวมข้อความจากหลาย id
+    return merge_similar_sentences([cbc_messages[i] for i in message_ids])
+
+def cbc_message_ids(hb_result, wbc_result, plt_result):
+    # tuple ของ id ใน cbc_messages (เรียงแล้ว) หรือข้อความตรงตัวเมื่อไม่มี id ("-", "", ให้พบแพทย์)
+    message_ids = []
+
+    if all(x in ["", "-", None] for x in [hb_result, wbc_result, plt_result]):
+        return "-"
+
+    if hb_result == "พบภาวะโลหิตจาง":
+        if wbc_result == "ปกติ" and plt_result == "ปกติ":
+            message_ids.append(8)
+        elif wbc_result in ["ต่ำกว่าเกณฑ์", "ต่ำกว่าเกณฑ์เล็กน้อย", "สูงกว่าเกณฑ์เล็กน้อย", "สูงกว่าเกณฑ์"]:
+            message_ids.append(9)
+    elif hb_result == "พบภาวะโลหิตจางเล็กน้อย":
+        if wbc_result == "ปกติ" and plt_result == "ปกติ":
+            message_ids.append(2)
+        elif wbc_result in ["ต่ำกว่าเกณฑ์", "ต่ำกว่าเกณฑ์เล็กน้อย", "สูงกว่าเกณฑ์เล็กน้อย", "สูงกว่าเกณฑ์"]:
+            message_ids.append(13)
+
+    if wbc_result in ["ต่ำกว่าเกณฑ์", "ต่ำกว่าเกณฑ์เล็กน้อย", "สูงกว่าเกณฑ์เล็กน้อย", "สูงกว่าเกณฑ์"] and hb_result == "ปกติ":
+        message_ids.append(6)
+
+    if plt_result == "สูงกว่าเกณฑ์":
+        message_ids.append(10)
+    elif plt_result in ["ต่ำกว่าเกณฑ์", "ต่ำกว่าเกณฑ์เล็กน้อย"]:
+        message_ids.append(4)
+
+    if not message_ids and hb_result == "ปกติ" and wbc_result == "ปกติ" and plt_result == "ปกติ":
+        return ""
+
+    if not message_ids:
+        return "ควรพบแพทย์เพื่อตรวจเพิ่มเติม"
+
+    return tuple(sorted(set(message_ids)))
+
+def summarize_liver(alp_val, sgot_val, sgpt_val):
+    return CATEGORIES["liver"].classify(alp=_number(alp_val), sgot=_number(sgot_val), sgpt=_number(sgpt_val))
+
+def liver_advice(summary_text):
+    if summary_text == "การทำงานของตับสูงกว่าเกณฑ์ปกติเล็กน้อย":
+        return "ควรลดอาหารไขมันสูงและตรวจติดตามการทำงานของตับซ้ำ"
+    elif summary_text == "ปกติ":
+        return ""
+    return "-"
+
+def uric_acid_advice(value_raw):
+    return CATEGORIES["uric"].classify(uric=_number(value_raw))
+
+# 🧪 แปลผลการทำงานของไตจาก GFR
+def kidney_summary_gfr_only(gfr_raw):
+    return CATEGORIES["kidney"].classify(gfr=_number(gfr_raw, strip_commas=True))
+
+# 📌 คำแนะนำเมื่อพบค่าผิดปกติ
+def kidney_advice_from_summary(summary_text):
+    if summary_text == "การทำงานของไตต่ำกว่าเกณฑ์ปกติเล็กน้อย":
+        return (
+            "การทำงานของไตต่ำกว่าเกณฑ์ปกติเล็กน้อย "
+            "ลดอาหารเค็ม อาหารโปรตีนสูงย่อยยาก ดื่มน้ำ 8-10 แก้วต่อวัน "
+            "และไม่ควรกลั้นปัสสาวะ มีอาการบวมผิดปกติให้พบแพทย์"
+        )
+    return ""
+
+def fbs_advice(fbs_raw):
+    return CATEGORIES["fbs"].classify(fbs=_number(fbs_raw, strip_commas=True))
+
+# 🧪 ฟังก์ชันสรุปผลไขมันในเลือด
+def summarize_lipids(chol_raw, tgl_raw, ldl_raw):
+    return CATEGORIES["lipids"].classify(
+        chol=_number(chol_raw, strip_commas=True),
+        tgl=_number(tgl_raw, strip_commas=True),
+        ldl=_number(ldl_raw, strip_commas=True),
+    )
+
+# 📝 ฟังก์ชันให้คำแนะนำ
+def lipids_advice(summary_text):
+    if summary_text == "ไขมันในเลือดสูง":
+        return (
+            "ไขมันในเลือดสูง ควรลดอาหารที่มีไขมันอิ่มตัว เช่น ของทอด หนังสัตว์ "
+            "ออกกำลังกายสม่ำเสมอ และพิจารณาพบแพทย์เพื่อตรวจติดตาม"
+        )
+    elif summary_text == "ไขมันในเลือดสูงเล็กน้อย":
+        return (
+            "ไขมันในเลือดสูงเล็กน้อย ควรปรับพฤติกรรมการบริโภค ลดของมัน "
+            "และออกกำลังกายเพื่อควบคุมระดับไขมัน"
+        )
+    return ""
+
+def hepatitis_b_advice(hbsag, hbsab, hbcab):
+    hbsag = hbsag.lower()
+    hbsab = hbsab.lower()
+    hbcab = hbcab.lower()
+
+    if "positive" in hbsag:
+        return "ติดเชื้อไวรัสตับอักเสบบี"
+    elif "positive" in hbsab and "positive" not in hbsag:
+        return "มีภูมิคุ้มกันต่อไวรัสตับอักเสบบี"
+    elif "positive" in hbcab and "positive" not in hbsab:
+        return "เคยติดเชื้อแต่ไม่มีภูมิคุ้มกันในปัจจุบัน"
+    elif all(x == "negative" for x in [hbsag, hbsab, hbcab]):
+        return "ไม่มีภูมิคุ้มกันต่อไวรัสตับอักเสบบี"
+    else:
+        return "ไม่สามารถสรุปผลชัดเจน แนะนำให้พบแพทย์เพื่อประเมินซ้ำ"
+
+# ==================== ADVICE MESSAGE TABLES ====================
+# คำแนะนำแต่ละหมวดเป็น message id (id ของแถบแปลผลใน reference_ranges.json / ชุด id ของ cbc_messages)
+# ตาราง id -> (หมวด, ข้อความ) และข้อความ CBC ที่รวมประโยคแล้ว คำนวณครั้งเดียวตอน import
+# คำแนะนำสรุปท้ายรายงาน = lookup ด้วย tuple ของ id (จัดหมวดตาม tag ไม่ต้องเดาจากคำในข้อความ)
+
+# หมวดตามลำดับที่แสดง: (tag, หัวข้อ, ไอคอน)
+ADVICE_GROUPS = [
+    ("fbs", "FBS", "🍬"),
+    ("kidney", "ไต", "💧"),
+    ("liver", "ตับ", "🫀"),
+    ("uric", "ยูริค", "🦴"),
+    ("lipids", "ไขมัน", "🧈"),
+    ("cbc", "CBC", "🩸"),
+]
+NO_ADVICE = "ไม่พบคำแนะนำเพิ่มเติมจากผลตรวจ"
+
+# หมวดที่คำแนะนำมาจากแถบแปลผลเดียว: แถบ -> ข้อความคำแนะนำ
+_BAND_ADVICE = {
+    "fbs": lambda label: label,
+    "kidney": kidney_advice_from_summary,
+    "liver": liver_advice,
+    "uric": lambda label: label,
+    "lipids": lipids_advice,
+}
+
+
+def _advice_message(text):
+    # "" และ "-" = ไม่มีคำแนะนำ (ไม่แสดงในสรุป)
+    return text if text and text.strip() != "-" else None
+
+
+def _build_message_tables():
+    messages, band_messages = {}, {}
+    for tag, advice in _BAND_ADVICE.items():
+        category = CATEGORIES[tag]
+        ids = []
+        for code, label in enumerate(category.labels):
+            text = _advice_message(advice(label))
+            message_id = None
+            if text is not None:
+                message_id = category.ids[code] if code else f"{tag}_missing"
+                messages[message_id] = (tag, text)
+            ids.append(message_id)
+        band_messages[tag] = ids
+
+    # CBC: ทุกชุด (Hb, WBC, Plt) -> id เดียวของข้อความที่รวมประโยคไว้แล้ว
+    cbc_ids = {}
+    hb_labels, wbc_labels, plt_labels = (CATEGORIES[k].labels for k in ("hb", "wbc", "plt"))
+    for h, hb in enumerate(hb_labels):
+        for w, wbc in enumerate(wbc_labels):
+            for p, plt in enumerate(plt_labels):
+                ids = cbc_message_ids(hb, wbc, plt)
+                text = _advice_message(cbc_advice(hb, wbc, plt))
+                message_id = None
+                if text is not None:
+                    message_id = "cbc_" + ("_".join(map(str, ids)) if isinstance(ids, tuple) else "recheck")
+                    messages[message_id] = ("cbc", text)
+                cbc_ids[h, w, p] = message_id
+    return messages, band_messages, cbc_ids
+
+
+ADVICE_MESSAGES, BAND_MESSAGE_IDS, CBC_MESSAGE_IDS = _build_message_tables()
+_GROUP_ORDER = {tag: i for i, (tag, _, _) in enumerate(ADVICE_GROUPS)}
+
+
+def advice_message_ids(sex, fbs, gfr, alp, sgot, sgpt, uric, chol, tgl, ldl, hb, wbc, plt):
+    # ค่าดิบจากชีต -> tuple ของ message id เรียงตามหมวด (ไม่มีคำแนะนำ = ไม่อยู่ใน tuple)
+    codes = {
+        "fbs": CATEGORIES["fbs"].code(fbs=_number(fbs, strip_commas=True)),
+        "kidney": CATEGORIES["kidney"].code(gfr=_number(gfr, strip_commas=True)),
+        "liver": CATEGORIES["liver"].code(alp=_number(alp), sgot=_number(sgot), sgpt=_number(sgpt)),
+        "uric": CATEGORIES["uric"].code(uric=_number(uric)),
+        "lipids": CATEGORIES["lipids"].code(
+            chol=_number(chol, strip_commas=True), tgl=_number(tgl, strip_commas=True), ldl=_number(ldl, strip_commas=True)
+        ),
+    }
+    ids = [BAND_MESSAGE_IDS[tag][code] for tag, code in codes.items()]
+    ids.append(CBC_MESSAGE_IDS[
+        CATEGORIES["hb"].code(sex=sex, hb=_number(hb)),
+        CATEGORIES["wbc"].code(wbc=_number(wbc)),
+        CATEGORIES["plt"].code(plt=_number(plt)),
+    ])
+    return tuple(message_id for message_id in ids if message_id is not None)
+
+
+@lru_cache(maxsize=None)
+def final_advice(message_ids):
+    # ชุด id ที่เป็นไปได้มีจำกัด → HTML ของแต่ละชุดสร้างครั้งเดียว
+    if not message_ids:
+        return NO_ADVICE
+    by_tag = {}
+    for message_id in sorted(set(message_ids), key=lambda m: _GROUP_ORDER[ADVICE_MESSAGES[m][0]]):
+        tag, text = ADVICE_MESSAGES[message_id]
+        by_tag.setdefault(tag, []).append(text)
+    section_texts = [
+        f"<b>{icon} {title}:</b> " + " ".join(by_tag[tag])
+        for tag, title, icon in ADVICE_GROUPS
+        if tag in by_tag
+    ]
+    return "<div style='margin-bottom: 0.75rem;'>" + "</div><div style='margin-bottom: 0.75rem;'>".join(section_texts) + "</div>"
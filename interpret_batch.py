@@ -0,0 +1,312 @@
+import numpy as np
+import pandas as pd
+
+from interpret import (
+    ADVICE_GROUPS, BAND_MESSAGE_IDS, CBC_MESSAGE_IDS, cbc_advice, compose_health_advice, final_advice,
+    hepatitis_b_advice, kidney_advice_from_summary, lipids_advice, liver_advice, urine_advice_text,
+)
+from reference_ranges import CATEGORIES, RANGES
+from schema import CURRENT_YEAR, YEARS, column_for
+
+# ==================== BATCH INTERPRETATION ====================
+# แปลผลทั้ง cohort ครั้งเดียวบนทั้งคอลัมน์ ผลลัพธ์เป็น category code
+# เกณฑ์ตัวเลขใช้ตารางเดียวกับรายงานรายคน (reference_ranges.json) ส่วนผลข้อความ/ผลรวม
+# ได้ป้ายกำกับจากการเรียกฟังก์ชันเดิมใน interpret.py ด้วยค่าตัวแทนของแต่ละช่วง
+
+BMI_LABELS = CATEGORIES["bmi"].labels
+BP_LABELS = CATEGORIES["bp"].labels
+BMI_TEXTS = CATEGORIES["bmi_advice"].labels
+BP_TEXTS = CATEGORIES["bp_advice"].labels
+HB_LABELS = CATEGORIES["hb"].labels
+WBC_LABELS = CATEGORIES["wbc"].labels
+PLT_LABELS = CATEGORIES["plt"].labels
+LIVER_LABELS = CATEGORIES["liver"].labels
+URIC_LABELS = CATEGORIES["uric"].labels
+KIDNEY_LABELS = CATEGORIES["kidney"].labels
+FBS_LABELS = CATEGORIES["fbs"].labels
+LIPID_LABELS = CATEGORIES["lipids"].labels
+HEP_B_PROBES = [
+    ("positive", "negative", "negative"),
+    ("negative", "positive", "negative"),
+    ("negative", "negative", "positive"),
+    ("negative", "negative", "negative"),
+    ("", "", ""),
+]
+HEP_B_LABELS = [hepatitis_b_advice(*v) for v in HEP_B_PROBES]
+
+SEX_PROBES = ["ชาย", "หญิง", ""]
+ALB_LABELS = CATEGORIES["urine_alb"].labels
+SUGAR_LABELS = CATEGORIES["urine_sugar"].labels
+URINE_RBC_LABELS = CATEGORIES["urine_rbc"].labels
+URINE_WBC_LABELS = CATEGORIES["urine_wbc"].labels
+
+
+def _raw(df, col, default=""):
+    if col is None or col not in df.columns:
+        return np.full(len(df), default, dtype=object)
+    return df[col].astype(str).str.strip().to_numpy(dtype=object)
+
+
+def _parse(values, strip_commas=False):
+    # แปลงข้อความเป็นตัวเลขทีละค่าที่ไม่ซ้ำ (ใช้ float() แบบเดียวกับฟังก์ชันเดิม) แล้วกระจายกลับ
+    codes, uniques = pd.factorize(values)
+    parsed = np.full(len(uniques), np.nan)
+    ok = np.zeros(len(uniques), dtype=bool)
+    for i, text in enumerate(uniques):
+        try:
+            parsed[i] = float(text.replace(",", "") if strip_commas else text)
+            ok[i] = True
+        except (ValueError, TypeError):
+            pass
+    return parsed[codes], ok[codes]
+
+
+def _categorical(codes, labels):
+    # ป้ายกำกับอาจซ้ำกัน (เช่น ตารางผลรวม) → ยุบให้เหลือ category ที่ไม่ซ้ำ
+    unique_labels, inverse = np.unique(np.asarray(labels, dtype=object).astype(str), return_inverse=True)
+    return pd.Categorical.from_codes(inverse[codes], categories=unique_labels)
+
+
+def bmi_values(weight, height):
+    w, w_ok = _parse(weight)
+    h, h_ok = _parse(height)
+    with np.errstate(all="ignore"):
+        denom = (h / 100) ** 2
+        bmi = w / denom
+    ok = w_ok & h_ok & (denom != 0) & ~(np.isinf(denom) & np.isfinite(h))
+    return np.where(ok, bmi, np.nan)
+
+
+def bmi_codes(bmi):
+    return CATEGORIES["bmi"].codes(bmi=bmi)
+
+
+def bp_codes(sbp_raw, dbp_raw):
+    sbp, _ = _parse(sbp_raw)
+    dbp, _ = _parse(dbp_raw)
+    return CATEGORIES["bp"].codes(sbp=sbp, dbp=dbp)
+
+
+def health_advice_codes(bmi, sbp_raw, dbp_raw):
+    bmi_text = CATEGORIES["bmi_advice"].codes(bmi=bmi)
+    sbp, _ = _parse(sbp_raw)
+    dbp, _ = _parse(dbp_raw)
+    bp_text = CATEGORIES["bp_advice"].codes(sbp=sbp, dbp=dbp)
+    return bmi_text * len(BP_TEXTS) + bp_text
+
+
+HEALTH_ADVICE_LABELS = [compose_health_advice(b, p) for b in BMI_TEXTS for p in BP_TEXTS]
+
+
+def hb_codes(hb_raw, sex):
+    hb, _ = _parse(hb_raw)
+    return CATEGORIES["hb"].codes(sex=sex, hb=hb)
+
+
+def wbc_codes(wbc_raw):
+    return CATEGORIES["wbc"].codes(wbc=_parse(wbc_raw)[0])
+
+
+def plt_codes(plt_raw):
+    return CATEGORIES["plt"].codes(plt=_parse(plt_raw)[0])
+
+
+CBC_ADVICE_LABELS = [cbc_advice(h, w, p) for h in HB_LABELS for w in WBC_LABELS for p in PLT_LABELS]
+
+
+def cbc_advice_codes(hb, wbc, plt):
+    return (hb * len(WBC_LABELS) + wbc) * len(PLT_LABELS) + plt
+
+
+def liver_codes(alp_raw, sgot_raw, sgpt_raw):
+    return CATEGORIES["liver"].codes(alp=_parse(alp_raw)[0], sgot=_parse(sgot_raw)[0], sgpt=_parse(sgpt_raw)[0])
+
+
+def uric_codes(uric_raw):
+    return CATEGORIES["uric"].codes(uric=_parse(uric_raw)[0])
+
+
+def kidney_codes(gfr_raw):
+    return CATEGORIES["kidney"].codes(gfr=_parse(gfr_raw, strip_commas=True)[0])
+
+
+def fbs_codes(fbs_raw):
+    return CATEGORIES["fbs"].codes(fbs=_parse(fbs_raw, strip_commas=True)[0])
+
+
+def lipid_codes(chol_raw, tgl_raw, ldl_raw):
+    return CATEGORIES["lipids"].codes(
+        chol=_parse(chol_raw, strip_commas=True)[0],
+        tgl=_parse(tgl_raw, strip_commas=True)[0],
+        ldl=_parse(ldl_raw, strip_commas=True)[0],
+    )
+
+
+def advice_summary_codes(group_codes):
+    # group_codes: tag -> code ของแถบแปลผล (cbc = code ของชุด Hb/WBC/Plt) ทั้งคอลัมน์
+    # แต่ละหมวด -> ลำดับ message id (0 = ไม่มีคำแนะนำ) แล้วรวมเป็น key เดียว
+    # HTML สรุปคำนวณครั้งเดียวต่อชุด id ที่พบจริง (final_advice มี cache ข้ามการเรียก)
+    key = np.zeros(len(next(iter(group_codes.values()))), dtype=np.int64)
+    choices = []
+    for tag, _, _ in ADVICE_GROUPS:
+        ids = [None] + sorted({m for m in group_message_ids(tag) if m is not None})
+        slot = np.array([ids.index(m) for m in group_message_ids(tag)], dtype=np.int64)
+        key = key * len(ids) + slot[group_codes[tag]]
+        choices.append(ids)
+    keys, inverse = np.unique(key, return_inverse=True)
+    labels = []
+    for combined in keys.tolist():
+        picked = []
+        for ids in reversed(choices):
+            combined, slot = divmod(combined, len(ids))
+            picked.append(ids[slot])
+        labels.append(final_advice(tuple(m for m in reversed(picked) if m is not None)))
+    return inverse, labels
+
+
+def group_message_ids(tag):
+    if tag == "cbc":
+        return [CBC_MESSAGE_IDS[combo] for combo in sorted(CBC_MESSAGE_IDS)]
+    return BAND_MESSAGE_IDS[tag]
+
+
+def _per_unique(values, fn):
+    # ค่าข้อความในคอลัมน์ซ้ำกันมาก → คำนวณ fn ครั้งเดียวต่อค่าที่ไม่ซ้ำ แล้วกระจายกลับด้วย index
+    codes, uniques = pd.factorize(values)
+    return np.array([fn(text) for text in uniques], dtype=object)[codes]
+
+
+def _lower(values):
+    return _per_unique(values, str.lower)
+
+
+def _contains_positive(values):
+    return _per_unique(values, lambda text: "positive" in text.lower()).astype(bool)
+
+
+def hep_b_codes(hbsag_raw, hbsab_raw, hbcab_raw):
+    pos_ag = _contains_positive(hbsag_raw)
+    pos_ab = _contains_positive(hbsab_raw)
+    pos_c = _contains_positive(hbcab_raw)
+    all_negative = (_lower(hbsag_raw) == "negative") & (_lower(hbsab_raw) == "negative") & (_lower(hbcab_raw) == "negative")
+    return np.select([pos_ag, pos_ab, pos_c & ~pos_ab, all_negative], [0, 1, 2, 3], 4)
+
+
+def alb_codes(alb_raw):
+    rule = RANGES["urine_alb"]
+    return CATEGORIES["urine_alb"].codes(alb=rule.category_input(rule.encode_many(alb_raw)))
+
+
+def sugar_codes(sugar_raw):
+    rule = RANGES["urine_sugar"]
+    return CATEGORIES["urine_sugar"].codes(sugar=rule.category_input(rule.encode_many(sugar_raw)))
+
+
+def urine_rbc_codes(rbc_raw):
+    rule = RANGES["urine_rbc"]
+    return CATEGORIES["urine_rbc"].codes(rbc=rule.category_input(rule.encode_many(rbc_raw)))
+
+
+def urine_wbc_codes(wbc_raw):
+    rule = RANGES["urine_wbc"]
+    return CATEGORIES["urine_wbc"].codes(wbc=rule.category_input(rule.encode_many(wbc_raw)))
+
+
+URINE_ADVICE_LABELS = [
+    urine_advice_text(sex, alb, sugar, rbc, wbc)
+    for sex in SEX_PROBES
+    for alb in ALB_LABELS
+    for sugar in SUGAR_LABELS
+    for rbc in URINE_RBC_LABELS
+    for wbc in URINE_WBC_LABELS
+]
+
+
+LIVER_ADVICE_LABELS = [liver_advice(s) for s in LIVER_LABELS]
+KIDNEY_ADVICE_LABELS = [kidney_advice_from_summary(s) for s in KIDNEY_LABELS]
+LIPIDS_ADVICE_LABELS = [lipids_advice(s) for s in LIPID_LABELS]
+
+
+def urine_advice_codes(sex, alb, sugar, rbc, wbc):
+    sex_code = np.where(sex == "ชาย", 0, np.where(sex == "หญิง", 1, 2))
+    code = (sex_code * len(ALB_LABELS) + alb) * len(SUGAR_LABELS) + sugar
+    return (code * len(URINE_RBC_LABELS) + rbc) * len(URINE_WBC_LABELS) + wbc
+
+
+# หมวดคำแนะนำ -> คอลัมน์รหัสที่ใช้เลือก message id (cbc = รหัสชุด Hb/WBC/Plt)
+ADVICE_GROUP_COLUMNS = {
+    "fbs": "fbs_advice", "kidney": "kidney", "liver": "liver", "uric": "uric_advice", "lipids": "lipids",
+    "cbc": "cbc_advice",
+}
+
+
+def cohort_codes(df, year):
+    # รหัส int ของทุกการแปลผล คู่กับตารางป้ายกำกับ (ยังไม่ยุบป้ายซ้ำ → รหัสคงที่ตราบใดที่เกณฑ์ไม่เปลี่ยน)
+    col = lambda test: column_for(test, year)
+    sex = _raw(df, "เพศ")
+
+    bmi = bmi_values(_raw(df, col("weight")), _raw(df, col("height")))
+    sbp, dbp = _raw(df, col("sbp")), _raw(df, col("dbp"))
+    hb = hb_codes(_raw(df, col("hb")), sex)
+    wbc = wbc_codes(_raw(df, col("wbc")))
+    plt = plt_codes(_raw(df, col("plt")))
+    liver = liver_codes(_raw(df, col("alp")), _raw(df, col("sgot")), _raw(df, col("sgpt")))
+    kidney = kidney_codes(_raw(df, col("gfr")))
+    lipids = lipid_codes(_raw(df, col("chol")), _raw(df, col("tgl")), _raw(df, col("ldl")))
+
+    codes = {
+        "bmi": (bmi_codes(bmi), BMI_LABELS),
+        "bp": (bp_codes(sbp, dbp), BP_LABELS),
+        "health_advice": (health_advice_codes(bmi, sbp, dbp), HEALTH_ADVICE_LABELS),
+        "hb": (hb, HB_LABELS),
+        "wbc": (wbc, WBC_LABELS),
+        "plt": (plt, PLT_LABELS),
+        "cbc_advice": (cbc_advice_codes(hb, wbc, plt), CBC_ADVICE_LABELS),
+        "liver": (liver, LIVER_LABELS),
+        "liver_advice": (liver, LIVER_ADVICE_LABELS),
+        "uric_advice": (uric_codes(_raw(df, col("uric"))), URIC_LABELS),
+        "kidney": (kidney, KIDNEY_LABELS),
+        "kidney_advice": (kidney, KIDNEY_ADVICE_LABELS),
+        "fbs_advice": (fbs_codes(_raw(df, col("fbs"))), FBS_LABELS),
+        "lipids": (lipids, LIPID_LABELS),
+        "lipids_advice": (lipids, LIPIDS_ADVICE_LABELS),
+        "hep_b": (
+            hep_b_codes(_raw(df, "HbsAg", "N/A"), _raw(df, "HbsAb", "N/A"), _raw(df, "HBcAB", "N/A")), HEP_B_LABELS
+        ),
+    }
+
+    if year == CURRENT_YEAR:
+        # ผลปัสสาวะแบบละเอียดมีเฉพาะปี 68
+        alb = alb_codes(_raw(df, col("urine_alb")))
+        sugar = sugar_codes(_raw(df, col("urine_sugar")))
+        rbc = urine_rbc_codes(_raw(df, col("urine_rbc")))
+        uwbc = urine_wbc_codes(_raw(df, col("urine_wbc")))
+        codes.update({
+            "urine_alb": (alb, ALB_LABELS),
+            "urine_sugar": (sugar, SUGAR_LABELS),
+            "urine_rbc": (rbc, URINE_RBC_LABELS),
+            "urine_wbc": (uwbc, URINE_WBC_LABELS),
+            "urine_advice": (urine_advice_codes(sex, alb, sugar, rbc, uwbc), URINE_ADVICE_LABELS),
+        })
+
+    return codes
+
+
+def interpret_cohort(df, year):
+    codes = cohort_codes(df, year)
+    advice, advice_labels = advice_summary_codes(
+        {tag: codes[column][0] for tag, column in ADVICE_GROUP_COLUMNS.items()}
+    )
+    result = {name: _categorical(values, labels) for name, (values, labels) in codes.items()}
+    result["advice_summary"] = _categorical(advice, advice_labels)
+    return pd.DataFrame(result, index=df.index)
+
+
+def interpret_all_years(df, years=YEARS):
+    frames = []
+    for year in years:
+        frame = interpret_cohort(df, year)
+        frame.insert(0, "year", np.int8(year))
+        frame.insert(0, "patient", np.arange(len(df), dtype=np.int32))
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
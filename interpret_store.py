@@ -0,0 +1,209 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import instrumented
+from interpret import ADVICE_MESSAGES
+from interpret_batch import ADVICE_GROUP_COLUMNS, cohort_codes, group_message_ids
+from reference_ranges import RULES_PATH
+from schema import CURRENT_YEAR, YEARS, columns_for_year
+from snapshot import row_hashes
+
+# ==================== INTERPRETATION STORE ====================
+# แปลผลทุก (ผู้ป่วย, ปี) แบบ batch แล้วเก็บเป็นตารางรหัส int ให้ระบบอื่นอ่าน (Parquet + codes.json)
+# ใช้ hash ของแถว (ตัวเดียวกับ snapshot) จับว่าแถวไหนเปลี่ยน: แถวที่ hash เคยแปลผลแล้วใช้ผลเดิม
+# แปลใหม่เฉพาะแถวที่เพิ่ม/แก้ และแถวที่ถูกลบหายไปเอง เกณฑ์/ข้อความเปลี่ยน (rules_version) → แปลใหม่ทั้งหมด
+# สถิติ removed = จำนวน HN ในตารางเดิมที่ไม่มีในชีตใหม่แล้ว
+#
+# โครงโฟลเดอร์: <dir>/results.parquet  patient, HN, year, row_hash, <รหัสการแปลผล>, advice_<หมวด>, has_results
+#              <dir>/codes.json       ตารางป้ายของแต่ละคอลัมน์ (รหัส -1 = ไม่มีในปีนั้น), message id ของคำแนะนำ
+#
+# รัน: python -m interpret_store --dir .interpretations
+
+DEFAULT_INTERPRET_DIR = os.environ.get("HEALTH_INTERPRET_DIR", ".interpretations")
+STORE_FORMAT = 1  # เพิ่มเมื่อโครงตาราง/วิธีคำนวณรหัสเปลี่ยน
+
+# รหัสคำแนะนำ: 0 = ไม่มีคำแนะนำ, 1.. = message id เรียงตามชื่อ
+ADVICE_IDS = [None] + sorted(ADVICE_MESSAGES)
+_ADVICE_LOOKUP = {
+    tag: np.array([ADVICE_IDS.index(m) for m in group_message_ids(tag)], dtype=np.int16)
+    for tag in ADVICE_GROUP_COLUMNS
+}
+
+
+@lru_cache(maxsize=1)
+def code_labels():
+    # ตารางป้ายของทุกคอลัมน์รหัส: ได้จาก cohort_codes ชุดเดียวกับที่แปลผล (เรียกกับตารางว่างของปี 68 ที่มีครบทุกคอลัมน์)
+    codes = cohort_codes(pd.DataFrame({"เพศ": pd.Series([], dtype=str)}), CURRENT_YEAR)
+    return {name: [str(label) for label in labels] for name, (_, labels) in codes.items()}
+
+
+def _code_dtype(labels):
+    return np.int8 if len(labels) < 128 else np.int16
+
+
+@lru_cache(maxsize=1)
+def rules_version():
+    digest = hashlib.sha1()
+    digest.update(str(STORE_FORMAT).encode("utf-8"))
+    digest.update(json.dumps(code_labels(), ensure_ascii=False, sort_keys=True).encode("utf-8"))
+    digest.update(json.dumps(ADVICE_MESSAGES, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+    with open(RULES_PATH, "rb") as f:
+        digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def _has_results(df, year):
+    year_cols = [c for c in columns_for_year(year).values() if c in df.columns]
+    if not year_cols:
+        return np.zeros(len(df), dtype=bool)
+    return df[year_cols].astype(str).apply(lambda col: col.str.strip() != "").any(axis=1).to_numpy()
+
+
+@instrumented("interpret_store.interpret")
+def interpret_rows(df, positions, hashes, years=YEARS):
+    # แปลผลแถวของ df (positions = ตำแหน่งในชีตเต็ม) ทุกปี → ตารางยาว หนึ่งแถวต่อ (ผู้ป่วย, ปี)
+    labels = code_labels()
+    frames = []
+    for year in years:
+        codes = cohort_codes(df, year)
+        frame = {
+            "patient": positions.astype(np.int32),
+            "year": np.full(len(df), year, dtype=np.int8),
+            "row_hash": hashes,
+        }
+        for name, names in labels.items():
+            dtype = _code_dtype(names)
+            frame[name] = codes[name][0].astype(dtype) if name in codes else np.full(len(df), -1, dtype=dtype)
+        for tag, column in ADVICE_GROUP_COLUMNS.items():
+            frame[f"advice_{tag}"] = _ADVICE_LOOKUP[tag][codes[column][0]]
+        frame["has_results"] = _has_results(df, year)
+        frames.append(pd.DataFrame(frame))
+    return pd.concat(frames, ignore_index=True)
+
+
+class InterpretationStore:
+    def __init__(self, directory=DEFAULT_INTERPRET_DIR):
+        self.directory = directory
+        self.data_path = os.path.join(directory, "results.parquet")
+        self.meta_path = os.path.join(directory, "codes.json")
+
+    def exists(self):
+        return os.path.exists(self.data_path) and os.path.exists(self.meta_path)
+
+    def read(self):
+        import pyarrow.parquet as pq
+
+        with open(self.meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        return pq.read_table(self.data_path).to_pandas(), meta
+
+    def write(self, table, meta):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        os.makedirs(self.directory, exist_ok=True)
+        # เขียนไฟล์ชั่วคราวก่อน แล้วค่อย os.replace เพื่อให้ระบบที่อ่านอยู่ไม่เจอไฟล์ครึ่งๆ กลางๆ
+        tmp_data = self.data_path + ".tmp"
+        pq.write_table(pa.Table.from_pandas(table, preserve_index=False), tmp_data, compression="zstd")
+        tmp_meta = self.meta_path + ".tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_data, self.data_path)
+        os.replace(tmp_meta, self.meta_path)
+
+
+def _codes_meta(years):
+    return {
+        "format": STORE_FORMAT,
+        "rules_version": rules_version(),
+        "years": list(years),
+        "columns": code_labels(),
+        "advice_messages": [
+            {"code": code, "id": message_id, "group": ADVICE_MESSAGES[message_id][0], "text": ADVICE_MESSAGES[message_id][1]}
+            for code, message_id in enumerate(ADVICE_IDS) if message_id is not None
+        ],
+    }
+
+
+@instrumented("interpret_store.update")
+def update_interpretations(df, hashes=None, store=None, source_version=None, years=YEARS):
+    # คืน (ตารางผล, สถิติ) และเขียนลง store; hashes = row_hashes ของ snapshot (ไม่ส่งมาจะคำนวณเอง)
+    store = store or InterpretationStore()
+    hashes = row_hashes(df) if hashes is None else np.asarray(hashes, dtype=np.uint64)
+    years = list(years)
+    positions = np.arange(len(df), dtype=np.int32)
+
+    hn = df["HN"].astype(str).to_numpy(dtype=object) if "HN" in df.columns else np.full(len(df), "", dtype=object)
+
+    previous = None
+    if store.exists():
+        table, meta = store.read()
+        if meta.get("rules_version") == rules_version() and meta.get("years") == years:
+            previous = table
+
+    if previous is None:
+        reuse = np.zeros(len(df), dtype=bool)
+        parts, removed = [], 0
+    else:
+        # แถวที่ hash เคยแปลผลแล้ว: ย้ายผลเดิมมาที่ตำแหน่งใหม่ (แถวซ้ำกันทั้งแถวใช้ผลชุดเดียวกัน)
+        known = previous.drop(columns=["patient", "HN"]).drop_duplicates(["row_hash", "year"])
+        known_hashes = known["row_hash"].to_numpy(dtype=np.uint64)
+        reuse = np.isin(hashes, known_hashes)
+        keys = pd.DataFrame({"patient": positions[reuse], "row_hash": hashes[reuse]})
+        parts = [keys.merge(known, on="row_hash", how="inner")]
+        # ผู้ป่วยที่หายไปจากชีต: นับจาก HN ของตารางเดิมที่ไม่มีในชีตใหม่ (แถวที่แก้ไม่นับเป็นการลบ)
+        removed = int((~pd.Index(previous["HN"].unique()).isin(hn)).sum())
+
+    fresh = np.flatnonzero(~reuse)
+    parts.append(interpret_rows(df.iloc[fresh], positions[fresh], hashes[fresh], years))
+    table = pd.concat(parts, ignore_index=True)[parts[-1].columns].sort_values(["patient", "year"], ignore_index=True)
+    table.insert(1, "HN", hn[table["patient"].to_numpy()])
+
+    stats = {
+        "source_version": source_version,
+        "patients": len(df),
+        "rows": len(table),
+        "recomputed": int(fresh.size),
+        "reused": int(reuse.sum()),
+        "removed": removed,
+        "updated_at": time.time(),
+    }
+    store.write(table, dict(_codes_meta(years), **stats))
+    return table, stats
+
+
+# ==================== CLI ====================
+def main(argv=None):
+    from shared_dataset import _load_secrets
+    from sheet_source import source_from_config
+    from snapshot import SnapshotService
+
+    parser = argparse.ArgumentParser(description="แปลผลทุกผู้ป่วยทุกปีแล้วเก็บเป็นตารางรหัสให้ระบบอื่นอ่าน (แปลใหม่เฉพาะแถวที่เปลี่ยน)")
+    parser.add_argument("--dir", default=DEFAULT_INTERPRET_DIR)
+    args = parser.parse_args(argv)
+
+    secrets = _load_secrets()
+    if secrets is None and not os.environ.get("HEALTH_SHEET_FILE"):
+        raise SystemExit("ไม่พบ .streamlit/secrets.toml: ระบุ HEALTH_SHEET_FILE หรือรันจากโฟลเดอร์ของแอป")
+    service = SnapshotService(source_from_config(secrets))
+    frame, version = service.load()
+    start = time.perf_counter()
+    _, stats = update_interpretations(frame, service.hashes, InterpretationStore(args.dir), version)
+    print(
+        f"แปลผล {stats['patients']:,} คน ({stats['rows']:,} แถว ผู้ป่วย×ปี) → {args.dir} · "
+        f"แปลใหม่ {stats['recomputed']:,} · ใช้ผลเดิม {stats['reused']:,} · ลบ {stats['removed']:,} · "
+        f"{time.perf_counter() - start:.2f} s",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
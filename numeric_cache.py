@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+
+from schema import YEARS, column_for, columns_for_year
+
+# ==================== NUMERIC CACHE ====================
+# แปลงคอลัมน์ผลแล็บที่เป็นตัวเลขทั้งหมดเป็น float32 ครั้งเดียวตอนโหลดชีต
+# ช่องว่างหรือค่า 0 = NaN (ไม่ได้ตรวจ) ส่วนค่าที่มีข้อความแต่แปลงไม่ได้เก็บตำแหน่งไว้ตรวจสอบ
+# พร้อม year_mask: บิตต่อปีว่าผู้ป่วยมีผลตรวจ (ทุกรายการ รวมผลข้อความ) ปีไหนบ้าง ใช้สร้างตัวเลือกปีของรายงาน
+
+NUMERIC_TESTS = [
+    "weight", "height", "waist", "sbp", "dbp", "pulse",
+    "fbs", "uric", "alp", "sgot", "sgpt", "chol", "tgl", "hdl", "ldl", "bun", "cr", "gfr",
+    "hb", "hct", "wbc", "plt", "ne", "ly", "eo", "mo", "ba", "rbc", "mcv", "mch", "mchc",
+    "urine_ph", "urine_spgr",
+]
+
+
+def numeric_columns(columns):
+    wanted = []
+    for year in YEARS:
+        for test in NUMERIC_TESTS:
+            col = column_for(test, year)
+            if col is not None and col in columns and col not in wanted:
+                wanted.append(col)
+    return wanted
+
+
+def coerce_numeric(series):
+    text = series.astype(str).str.replace(",", "", regex=False).str.strip()
+    values = pd.to_numeric(text, errors="coerce").to_numpy(dtype=np.float32)
+    unparseable = np.isnan(values) & (text != "").to_numpy() & (text.str.lower() != "nan").to_numpy()
+    values[values == 0] = np.nan
+    return values, unparseable
+
+
+class NumericCache:
+    def __init__(self, matrix, columns, unparseable, year_mask=None):
+        # matrix: float32 (แถว x คอลัมน์) ก้อนเดียว, values เป็น DataFrame ที่ชี้หน่วยความจำเดียวกัน
+        self.matrix = matrix
+        self.values = pd.DataFrame(matrix, columns=columns, copy=False)
+        self.unparseable = unparseable
+        self.year_mask = np.zeros(len(matrix), dtype=np.uint16) if year_mask is None else year_mask
+
+    def available_years(self, pos):
+        bits = int(self.year_mask[pos])
+        return [year for i, year in enumerate(YEARS) if bits >> i & 1]
+
+    def column_index(self, cols):
+        # ตำแหน่งคอลัมน์ใน matrix (-1 = ไม่มีในชีต)
+        return self.values.columns.get_indexer(cols)
+
+    def column(self, col):
+        if col not in self.values.columns:
+            return np.full(len(self.values), np.nan, dtype=np.float32)
+        return self.values[col].to_numpy()
+
+    def row(self, pos):
+        # float32 -> ทศนิยมสั้นที่สุดที่ได้ค่าเดิม (2.6 ไม่กลายเป็น 2.5999999) ก่อนเทียบกับเกณฑ์
+        return {col: float(str(v)) for col, v in zip(self.values.columns, self.matrix[pos])}
+
+    def audit(self, df):
+        # รายการค่าที่แปลงเป็นตัวเลขไม่ได้: HN, คอลัมน์, ค่าดิบ
+        rows = [
+            (df["HN"].iloc[pos] if "HN" in df.columns else pos, col, df[col].iloc[pos])
+            for col, positions in self.unparseable.items()
+            for pos in positions
+        ]
+        return pd.DataFrame(rows, columns=["HN", "column", "raw"])
+
+
+def build_numeric_cache(df):
+    columns = numeric_columns(df.columns)
+    matrix = np.empty((len(df), len(columns)), dtype=np.float32)
+    unparseable = {}
+    for i, col in enumerate(columns):
+        matrix[:, i], bad = coerce_numeric(df[col])
+        if bad.any():
+            unparseable[col] = np.flatnonzero(bad)
+    return NumericCache(matrix, columns, unparseable, build_year_mask(df))
+
+
+def build_year_mask(df):
+    # บิต i = มีช่องที่ไม่ว่างอย่างน้อยหนึ่งช่องในปี YEARS[i] (2 byte ต่อคน แทนการเก็บตารางยาวทั้งก้อน)
+    mask = np.zeros(len(df), dtype=np.uint16)
+    for bit, year in enumerate(YEARS):
+        filled = np.zeros(len(df), dtype=bool)
+        for col in columns_for_year(year).values():
+            if col in df.columns:
+                filled |= (df[col].fillna("").astype(str).str.strip() != "").to_numpy()
+        mask |= filled.astype(np.uint16) << bit
+    return mask
+
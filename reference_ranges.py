@@ -0,0 +1,228 @@
+import json
+import operator
+import os
+from functools import reduce
+from pathlib import Path
+
+import numpy as np
+
+# ==================== REFERENCE RANGES ====================
+# ค่าปกติ เกณฑ์แปลผล และรหัสข้อความ อยู่ใน reference_ranges.json ที่เดียว
+# แถบแปลผลที่ใช้ขอบค่าปกติอ้างถึง ranges ตรง ๆ ("ranges.hb.min") แทนการเขียนตัวเลขซ้ำ
+# โหลดครั้งเดียวตอน import แล้ว compile เป็น predicate: เงื่อนไขแต่ละข้อเป็น operator
+# ที่ใช้ได้ทั้งกับตัวเลขเดี่ยว (รายงานรายคน) และ numpy array (แปลผลทั้ง cohort)
+
+RULES_PATH = Path(os.environ.get("HEALTH_RULES_FILE", Path(__file__).with_name("reference_ranges.json")))
+
+OPERATORS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge, "==": operator.eq}
+MISSING_TEXT = ("N/A", "-", "")
+KINDS = ("number", "choice", "grade", "scaled", "cells", "text")
+
+# รหัสลำดับของผลกึ่งปริมาณ (ปัสสาวะ) เก็บเป็น int8: ค่าลบสงวนไว้สำหรับไม่มีผล/อ่านไม่ได้
+MISSING = -1
+UNKNOWN = -2
+MAX_CODE = 125
+GRADES = ["negative", "trace", "1+", "2+", "3+", "4+", "5+", "6+"]
+
+
+class Threshold:
+    # ค่าเดียว หรือแยกตามเพศ {"ชาย": 13, "หญิง": 12, "default": 13}; เพศที่ไม่มีในตาราง = NaN
+    def __init__(self, spec):
+        self.by_sex = {k: float(v) for k, v in spec.items()} if isinstance(spec, dict) else None
+        self.value = None if self.by_sex else float(spec)
+
+    def resolve(self, sex=None):
+        if self.by_sex is None:
+            return self.value
+        default = self.by_sex.get("default", np.nan)
+        if sex is None or isinstance(sex, str):
+            return self.by_sex.get(sex, default)
+        resolved = np.full(len(sex), default)
+        for key, value in self.by_sex.items():
+            if key != "default":
+                resolved[sex == key] = value
+        return resolved
+
+
+class RangeRule:
+    def __init__(self, key, spec):
+        self.key = key
+        self.label = spec["label"]
+        self.normal = spec["normal"]
+        self.kind = spec.get("kind", "number")
+        if self.kind not in KINDS:
+            raise ValueError(f"{key}: unknown kind {self.kind!r}")
+        if self.kind == "number":
+            self.min = Threshold(spec["min"]) if "min" in spec else None
+            self.max = Threshold(spec["max"]) if "max" in spec else None
+            self.below = Threshold(spec["below"]) if "below" in spec else None
+            return
+        # ผลแบบข้อความ: แปลงเกณฑ์เป็นรหัสตั้งแต่ตอนโหลด เทียบกันด้วยจำนวนเต็มล้วน
+        self.values = [v.lower() for v in spec.get("values", GRADES if self.kind == "grade" else [])]
+        self.offset = float(spec.get("offset", 0))
+        self.scale = float(spec.get("scale", 1))
+        if self.kind == "choice":
+            self.allowed_codes = np.array([self.values.index(v.lower()) for v in spec["allowed"]], dtype=np.int8)
+        if self.kind in ("grade", "scaled", "cells"):
+            self.min_code = self.encode(spec["min"]) if "min" in spec else 0
+            self.max_code = self.encode(spec["max"]) if "max" in spec else MAX_CODE
+
+    def abnormal(self, value, sex=None):
+        # value เป็น float หรือ float array ก็ได้; NaN (ไม่มีผล) ไม่ถือว่าผิดปกติ
+        flags = np.zeros(np.shape(value), dtype=bool)
+        if self.min is not None:
+            flags = flags | (value < self.min.resolve(sex))
+        if self.max is not None:
+            flags = flags | (value > self.max.resolve(sex))
+        if self.below is not None:
+            flags = flags | (value >= self.below.resolve(sex))
+        return flags if np.ndim(flags) else bool(flags)
+
+    def encode(self, raw):
+        # ข้อความ → รหัส int8: choice/grade = ลำดับในรายการ, scaled = (ค่า - offset) * scale,
+        # cells = ค่าบนของช่วง เช่น "5-10" → 10 ("negative" = 0)
+        text = str(raw).strip()
+        if text.upper() in MISSING_TEXT:
+            return MISSING
+        text = text.lower()
+        if self.kind in ("choice", "grade"):
+            return self.values.index(text) if text in self.values else UNKNOWN
+        try:
+            if self.kind == "scaled":
+                value = round((float(text) - self.offset) * self.scale)
+            elif self.kind == "cells":
+                value = 0 if text == "negative" else int(text.split("-")[-1])
+            else:
+                return UNKNOWN
+        except ValueError:
+            return UNKNOWN
+        return min(max(value, 0), MAX_CODE)
+
+    def encode_many(self, values):
+        # batch: แปลงครั้งเดียวต่อค่าที่ไม่ซ้ำ แล้วกระจายกลับ (pandas โหลดเมื่อใช้ batch เท่านั้น)
+        import pandas as pd
+
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+        table = np.array([self.encode(text) for text in uniques], dtype=np.int8)
+        return table[codes] if len(uniques) else np.full(len(codes), MISSING, dtype=np.int8)
+
+    def code_abnormal(self, codes):
+        codes = np.asarray(codes)
+        if self.kind == "text":
+            flags = np.zeros(codes.shape, dtype=bool)
+        elif self.kind == "choice":
+            flags = (codes == UNKNOWN) | ((codes >= 0) & ~np.isin(codes, self.allowed_codes))
+        elif self.kind == "cells" or self.kind == "grade":
+            flags = (codes == UNKNOWN) | (codes > self.max_code)
+        else:
+            flags = (codes == UNKNOWN) | ((codes >= 0) & ((codes < self.min_code) | (codes > self.max_code)))
+        return flags if flags.ndim else bool(flags)
+
+    def category_input(self, codes):
+        # รหัส → ตัวเลขสำหรับตารางแปลผล: ไม่มีผล = NaN; cells ที่อ่านไม่ได้ถือว่าสูงสุด
+        values = np.asarray(codes, dtype=float)
+        values = np.where(values == MISSING, np.nan, values)
+        values = np.where(values == UNKNOWN, np.inf if self.kind == "cells" else np.nan, values)
+        return values if values.ndim else float(values)
+
+    def decode(self, code):
+        if code == MISSING:
+            return "ไม่มีผล"
+        if code == UNKNOWN:
+            return "อ่านค่าไม่ได้"
+        if self.kind in ("choice", "grade"):
+            return self.values[code]
+        if self.kind == "scaled":
+            return f"{self.offset + code / self.scale:g}"
+        return f"≤ {code}"
+
+    def flag_text(self, raw):
+        text = str(raw).strip()
+        if text.upper() in MISSING_TEXT:
+            return "-", False
+        return text, self.code_abnormal(self.encode(text))
+
+
+def _resolve_threshold(ranges, threshold):
+    # "ranges.<รายการ>.<min|max|below>" → เกณฑ์ของค่าปกติรายการนั้น (ตัวเลขเดียวกัน อยู่ที่เดียว)
+    if not isinstance(threshold, str):
+        return threshold
+    section, test, bound = (threshold.split(".") + ["", "", ""])[:3]
+    if section != "ranges" or bound not in ("min", "max", "below") or bound not in ranges.get(test, {}):
+        raise KeyError(threshold)
+    return ranges[test][bound]
+
+
+def _compile_condition(key, inputs, band, ranges):
+    mode = "any" if "any" in band else "all"
+    clauses = []
+    for name, op, threshold in band.get(mode, []):
+        try:
+            resolved = _resolve_threshold(ranges, threshold)
+        except KeyError:
+            raise ValueError(f"{key}/{band['id']}: unknown threshold reference {threshold!r}") from None
+        if name not in inputs or op not in OPERATORS:
+            raise ValueError(f"{key}/{band['id']}: bad clause {[name, op, threshold]}")
+        clauses.append((name, OPERATORS[op], Threshold(resolved)))
+    if not clauses:
+        return None, []
+    combine = operator.or_ if mode == "any" else operator.and_
+
+    def evaluate(values, sex):
+        return reduce(combine, [op(values[name], threshold.resolve(sex)) for name, op, threshold in clauses])
+
+    return evaluate, [threshold for _, _, threshold in clauses if threshold.by_sex]
+
+
+class Category:
+    # แถบแปลผลเรียงตามลำดับ ใช้แถบแรกที่เงื่อนไขเป็นจริง (แถบสุดท้ายไม่มีเงื่อนไข = ค่าอื่น ๆ)
+    # code 0 = ไม่มีผล/อ่านค่าไม่ได้ ส่วน code 1.. ตามลำดับแถบ
+    def __init__(self, key, spec, ranges=None):
+        self.key = key
+        self.inputs = spec["inputs"]
+        self.bands = []
+        self.sex_thresholds = []
+        for band in spec["bands"]:
+            evaluate, by_sex = _compile_condition(key, self.inputs, band, ranges or {})
+            self.bands.append(evaluate)
+            self.sex_thresholds += by_sex
+        self.ids = ["missing"] + [band["id"] for band in spec["bands"]]
+        self.labels = [spec["missing"]] + [band["label"] for band in spec["bands"]]
+
+    def code(self, sex=None, **values):
+        if any(v != v for v in values.values()):
+            return 0
+        if any(t.resolve(sex) != t.resolve(sex) for t in self.sex_thresholds):
+            return 0
+        for code, evaluate in enumerate(self.bands, 1):
+            if evaluate is None or evaluate(values, sex):
+                return code
+        return 0
+
+    def classify(self, sex=None, **values):
+        return self.labels[self.code(sex=sex, **values)]
+
+    def codes(self, sex=None, **arrays):
+        n = len(next(iter(arrays.values())))
+        missing = np.zeros(n, dtype=bool)
+        for values in arrays.values():
+            missing |= np.isnan(values)
+        for threshold in self.sex_thresholds:
+            missing |= np.isnan(threshold.resolve(sex))
+        conditions = [
+            np.ones(n, dtype=bool) if evaluate is None else np.broadcast_to(evaluate(arrays, sex), n)
+            for evaluate in self.bands
+        ]
+        return np.where(missing, 0, np.select(conditions, range(1, len(self.bands) + 1), 0))
+
+
+def load_rules(path=RULES_PATH):
+    with open(path, encoding="utf-8") as f:
+        spec = json.load(f)
+    ranges = {key: RangeRule(key, rule) for key, rule in spec["ranges"].items()}
+    sections = {name: [ranges[key] for key in keys] for name, keys in spec["sections"].items()}
+    categories = {key: Category(key, rule, spec["ranges"]) for key, rule in spec["categories"].items()}
+    return ranges, sections, categories
+
+
+RANGES, SECTIONS, CATEGORIES = load_rules()
@@ -0,0 +1,234 @@
+from collections import namedtuple
+
+from instrumentation import instrumented
+from interpret import (
+    ADVICE_MESSAGES, advice_message_ids, combined_health_advice, final_advice, hepatitis_b_advice,
+    interpret_alb_code, interpret_bp, interpret_rbc_code, interpret_stool_cs, interpret_stool_exam,
+    interpret_sugar_code, interpret_urine_wbc_code, urine_advice_text,
+)
+from reference_ranges import MISSING_TEXT, SECTIONS
+from schema import CURRENT_YEAR, IDENTITY_COLUMNS, column_for, columns_by_year
+from urinalysis import person_urine_codes
+
+# ==================== REPORT ENGINE ====================
+# แปลผลรายงานรายคนเป็นข้อมูลล้วน (ไม่มี HTML ไม่ import Streamlit/gspread/pandas)
+# report_html เป็นแค่ view ที่จัดหน้าจากผลของโมดูลนี้ ส่วนงาน batch/API เรียก build_report ตรง ๆ
+# person = record ของผู้ป่วย (dict หรือ Series) ที่ค่าเป็นข้อความแบบในชีต
+
+NAN = float("nan")
+
+ResultRow = namedtuple("ResultRow", ["label", "value", "normal", "abnormal"])
+Vitals = namedtuple("Vitals", ["weight", "height", "waist", "bp", "pulse", "bmi", "bmi_error", "summary_advice"])
+HepatitisB = namedtuple("HepatitisB", ["hbsag", "hbsab", "hbcab", "advice"])
+
+
+class HealthReport:
+    def __init__(self, year, identity, vitals, cbc, blood, urine, urine_advice, urine_summary,
+                 advice_ids, stool_exam, stool_cs, cxr, ekg, hepatitis_a, hepatitis_b):
+        self.year = year
+        self.identity = identity            # ชื่อคอลัมน์ระบุตัวตน -> ค่า ("-" ถ้าไม่มี)
+        self.vitals = vitals
+        self.cbc = cbc                      # [ResultRow, ...] ตามลำดับใน reference_ranges.json
+        self.blood = blood
+        self.urine = urine                  # ปี 68 เท่านั้น (ปีอื่น = [])
+        self.urine_advice = urine_advice
+        self.urine_summary = urine_summary  # ปีก่อน 68: ข้อความสรุปผลปัสสาวะ
+        self.advice_ids = advice_ids        # message id ของคำแนะนำแต่ละหมวด เรียงตามหมวด
+        self.stool_exam = stool_exam
+        self.stool_cs = stool_cs
+        self.cxr = cxr
+        self.ekg = ekg
+        self.hepatitis_a = hepatitis_a
+        self.hepatitis_b = hepatitis_b
+
+    @property
+    def advices(self):
+        # ข้อความคำแนะนำแต่ละหมวดก่อนรวม
+        return [ADVICE_MESSAGES[message_id][1] for message_id in self.advice_ids]
+
+    @property
+    def advice_summary(self):
+        return final_advice(self.advice_ids)
+
+    @property
+    def abnormal(self):
+        # ชื่อรายการที่ผิดปกติทั้งหมด (สำหรับคัดกรอง/สรุป)
+        return [row.label for row in self.cbc + self.blood + self.urine if row.abnormal]
+
+    def to_dict(self):
+        return {
+            "year": self.year,
+            "identity": dict(self.identity),
+            "vitals": self.vitals._asdict(),
+            "cbc": [row._asdict() for row in self.cbc],
+            "blood": [row._asdict() for row in self.blood],
+            "urine": [row._asdict() for row in self.urine],
+            "urine_advice": self.urine_advice,
+            "urine_summary": self.urine_summary,
+            "advice_ids": list(self.advice_ids),
+            "advices": self.advices,
+            "advice_summary": self.advice_summary,
+            "stool_exam": self.stool_exam,
+            "stool_cs": self.stool_cs,
+            "cxr": self.cxr,
+            "ekg": self.ekg,
+            "hepatitis_a": self.hepatitis_a,
+            "hepatitis_b": self.hepatitis_b._asdict(),
+        }
+
+
+def _value(person, test, year):
+    col = column_for(test, year)
+    return str(person.get(col, "") or "").strip() if col else ""
+
+
+def interpret_text(value):
+    if not value or str(value).strip() == "":
+        return "-"
+    return str(value).strip()
+
+
+def coerce_number(raw):
+    # ค่าเดี่ยว (record ที่ไม่ได้มาจาก cache) ใช้กติกาเดียวกับ numeric_cache.coerce_numeric: ว่าง/0 = NaN
+    try:
+        value = float(str(raw).replace(",", "").strip())
+    except (ValueError, TypeError):
+        return NAN
+    return NAN if value == 0 else value
+
+
+def person_number(person, col, numbers=None):
+    if col is None:
+        return NAN
+    if numbers is not None:
+        return numbers.get(col, NAN)
+    return coerce_number(person.get(col, ""))
+
+
+def format_number(val):
+    # รับตัวเลขที่แปลงไว้แล้วจาก numeric cache (NaN = ไม่มีผล)
+    if val != val:
+        return "-"
+    return f"{val:,.0f}" if float(val).is_integer() else f"{val:,.1f}"  # ใช้คอมม่าและไม่ต้องมี .0 ถ้าไม่จำเป็น
+
+
+# ==================== SECTIONS ====================
+def identity(person):
+    return {col: person.get(col, "-") for col in IDENTITY_COLUMNS}
+
+
+def vitals(person, year):
+    year_cols = columns_by_year[year]
+    sbp = person.get(year_cols["sbp"], "")
+    dbp = person.get(year_cols["dbp"], "")
+    pulse = person.get(year_cols["pulse"], "-")
+    weight = person.get(year_cols["weight"], "-")
+    height = person.get(year_cols["height"], "-")
+    waist = person.get(year_cols["waist"], "-")
+
+    bp_result = "-"
+    if sbp and dbp:
+        bp_result = f"{sbp}/{dbp} ม.ม.ปรอท - {interpret_bp(sbp, dbp)}"
+
+    pulse = f"{pulse} ครั้ง/นาที" if pulse != "-" else "-"
+    weight = f"{weight} กก." if weight else "-"
+    height = f"{height} ซม." if height else "-"
+    waist = f"{waist} ซม." if waist else "-"
+
+    bmi_error = None
+    try:
+        weight_val = float(weight.replace(" กก.", "").strip())
+        height_val = float(height.replace(" ซม.", "").strip())
+        bmi_val = weight_val / ((height_val / 100) ** 2)
+    except Exception as e:
+        bmi_error = f"❌ ไม่สามารถคำนวณ BMI ได้: {e}"
+        bmi_val = None
+
+    return Vitals(weight, height, waist, bp_result, pulse, bmi_val, bmi_error,
+                  combined_health_advice(bmi_val, sbp, dbp))
+
+
+def range_results(person, year, section, numbers=None):
+    # ✅ ค่าปกติ (แยกตามเพศ) มาจาก reference_ranges.json
+    sex = person.get("เพศ", "").strip()
+    rows = []
+    for rule in SECTIONS[section]:
+        value = person_number(person, column_for(rule.key, year), numbers)
+        rows.append(ResultRow(rule.label, format_number(value), rule.normal, rule.abnormal(value, sex)))
+    return rows
+
+
+def urine_results(person, year, urine=None):
+    # ปี 68: ตารางผลรายการ + คำแนะนำ (ธงผิดปกติจากรหัส int8) / ปีก่อน: ข้อความสรุปในชีต
+    if year != CURRENT_YEAR:
+        return [], "", person.get(column_for("urine_summary", year), "").strip()
+
+    codes = person_urine_codes(person, year, urine)
+    rows = []
+    for rule in SECTIONS["urine"]:
+        raw = str(person.get(column_for(rule.key, year), "N/A")).strip()
+        val_text = "-" if raw.upper() in MISSING_TEXT else raw
+        is_abn = rule.code_abnormal(codes[rule.key]) if rule.key in codes else False
+        rows.append(ResultRow(rule.label, val_text, rule.normal, is_abn))
+
+    advice = urine_advice_text(
+        person.get("เพศ", "").strip(),
+        interpret_alb_code(codes["urine_alb"]),
+        interpret_sugar_code(codes["urine_sugar"]),
+        interpret_rbc_code(codes["urine_rbc"]),
+        interpret_urine_wbc_code(codes["urine_wbc"]),
+    )
+    return rows, advice, ""
+
+
+@instrumented("advice.interpret")
+def collect_advice_ids(person, year):
+    # message id ของคำแนะนำแต่ละหมวด (ตาราง interpret.ADVICE_MESSAGES)
+    value = lambda test: _value(person, test, year)
+    return advice_message_ids(
+        person.get("เพศ", "").strip(),
+        value("fbs"), value("gfr"), value("alp"), value("sgot"), value("sgpt"), value("uric"),
+        value("chol"), value("tgl"), value("ldl"), value("hb"), value("wbc"), value("plt"),
+    )
+
+
+def stool_results(person, year):
+    exam_text = interpret_stool_exam(person.get(column_for("stool_exam", year), "").strip())
+    cs_text = interpret_stool_cs(person.get(column_for("stool_cs", year), "").strip())
+    return exam_text, cs_text
+
+
+def text_result(person, test, year):
+    return interpret_text(person.get(column_for(test, year), ""))
+
+
+def hepatitis_b(person):
+    # ตาราง HBsAg/HBsAb/HBcAb ไม่แยกปี
+    hbsag = person.get("HbsAg", "N/A").strip()
+    hbsab = person.get("HbsAb", "N/A").strip()
+    hbcab = person.get("HBcAB", "N/A").strip()
+    return HepatitisB(hbsag, hbsab, hbcab, hepatitis_b_advice(hbsag, hbsab, hbcab))
+
+
+# ==================== FULL REPORT ====================
+def build_report(person, year, numbers=None, urine=None):
+    # numbers/urine = แถวจาก NumericCache.row / UrineCodes.row ถ้ามี (ไม่งั้นแปลงจาก record)
+    urine_rows, urine_advice, urine_summary = urine_results(person, year, urine)
+    stool_exam, stool_cs = stool_results(person, year)
+    return HealthReport(
+        year=year,
+        identity=identity(person),
+        vitals=vitals(person, year),
+        cbc=range_results(person, year, "cbc", numbers),
+        blood=range_results(person, year, "blood", numbers),
+        urine=urine_rows,
+        urine_advice=urine_advice,
+        urine_summary=urine_summary,
+        advice_ids=collect_advice_ids(person, year),
+        stool_exam=stool_exam,
+        stool_cs=stool_cs,
+        cxr=text_result(person, "cxr", year),
+        ekg=text_result(person, "ekg", year),
+        hepatitis_a=text_result(person, "hep_a", year),
+        hepatitis_b=hepatitis_b(person),
+    )
@@ -0,0 +1,540 @@
+import html
+import re
+from string import Template
+
+from instrumentation import instrumented
+from interpret import final_advice
+from report_engine import (
+    collect_advice_ids, hepatitis_b, range_results, stool_results, text_result, urine_results, vitals,
+)
+from schema import CURRENT_YEAR
+
+# ==================== REPORT HTML ====================
+# สร้าง HTML ของรายงานแต่ละส่วนโดยไม่พึ่ง Streamlit จากผลแปลของ report_engine
+# ใช้ทั้งในหน้าเว็บ (st.markdown ทีละส่วน) และตอนส่งออกรายงานเป็นไฟล์
+
+PAGE_STYLE = """
+<style>
+    .report-header {
+        font-size: 18px;
+        line-height: 1.8;
+        color: inherit;
+        padding: 24px 8px;
+        text-align: center;
+    }
+
+    .report-header .title {
+        font-size: 22px;
+        font-weight: bold;
+    }
+
+    .report-header .address {
+        margin-top: 10px;
+    }
+
+    .report-header hr {
+        margin: 24px 0;
+    }
+
+    .report-header .fields {
+        display: flex;
+        flex-wrap: wrap;
+        justify-content: center;
+        gap: 32px;
+        margin-bottom: 20px;
+    }
+
+    .report-header .fields.vitals {
+        margin-bottom: 16px;
+    }
+
+    .report-header .summary {
+        margin-top: 16px;
+    }
+
+    .section-header {
+        background-color: #1B5E20;
+        padding: 20px 24px;
+        border-radius: 6px;
+        font-size: 18px;
+        font-weight: bold;
+        color: white;
+        text-align: center;
+        line-height: 1.4;
+        margin: 2rem 0 1rem 0;
+    }
+
+    .styled-wrapper {
+        max-width: 820px;
+        margin: 0 auto;
+    }
+
+    .styled-result {
+        width: 100%;
+        border-collapse: collapse;
+    }
+
+    .styled-result th {
+        background-color: #111;
+        color: white;
+        padding: 6px 12px;
+        text-align: center;
+    }
+
+    .styled-result td {
+        padding: 6px 12px;
+        vertical-align: middle;
+    }
+
+    .styled-result td:nth-child(2) {
+        text-align: center;
+    }
+
+    .abn {
+        background-color: rgba(255, 0, 0, 0.15);
+    }
+
+    .advice-box {
+        background-color: rgba(33, 150, 243, 0.15);
+        padding: 2rem 2.5rem;
+        border-radius: 10px;
+        font-size: 16px;
+        line-height: 1.5;
+        color: inherit;
+    }
+
+    .advice-box .title {
+        font-size: 18px;
+        font-weight: bold;
+        margin-bottom: 1.5rem;
+    }
+
+    .note-box {
+        background-color: rgba(255, 215, 0, 0.2);
+        padding: 1rem;
+        border-radius: 6px;
+        font-size: 16px;
+    }
+
+    .note-box.urine {
+        margin-top: 1rem;
+    }
+
+    .note-box .title {
+        font-size: 18px;
+        font-weight: bold;
+    }
+
+    .note-box .body {
+        margin-top: 0.5rem;
+    }
+
+    .urine-text {
+        margin-top: 1rem;
+        font-size: 16px;
+        line-height: 1.7;
+    }
+
+    .urine-text.empty {
+        padding: 1rem;
+        background-color: rgba(255, 255, 255, 0.05);
+    }
+
+    .stool-text {
+        font-size: 16px;
+        line-height: 1.7;
+        margin-bottom: 1rem;
+    }
+
+    .text-box {
+        text-align: left;
+        font-size: 16px;
+        padding: 1rem;
+        border-radius: 6px;
+        margin-bottom: 1.5rem;
+    }
+
+    .hepb-table {
+        width: 100%;
+        font-size: 16px;
+        text-align: center;
+        border-collapse: collapse;
+        margin-bottom: 1rem;
+    }
+
+    .hepb-table thead tr {
+        font-weight: bold;
+        border-bottom: 1px solid #ccc;
+    }
+
+    .doctor-box {
+        background-color: #1B5E20;
+        padding: 20px 24px;
+        border-radius: 6px;
+        font-size: 18px;
+        line-height: 1.6;
+        margin: 1.5rem 0;
+        color: inherit;
+    }
+
+    .signature {
+        margin-top: 3rem;
+        text-align: right;
+        padding-right: 1rem;
+    }
+
+    .signature .block {
+        display: inline-block;
+        text-align: center;
+        width: 340px;
+    }
+
+    .signature .line {
+        border-bottom: 1px dotted #ccc;
+        margin-bottom: 0.5rem;
+        width: 100%;
+    }
+
+    .signature .name {
+        white-space: nowrap;
+    }
+
+    .two-columns {
+        display: flex;
+        gap: 24px;
+        max-width: 1400px;
+        margin: 0 auto;
+    }
+
+    .two-columns > div {
+        flex: 1;
+        min-width: 0;
+    }
+
+    .doctor-section {
+        font-size: 16px;
+        line-height: 1.8;
+        margin-top: 2rem;
+    }
+
+    .summary-box {
+        background-color: #dcedc8;
+        padding: 12px 18px;
+        font-weight: bold;
+        border-radius: 6px;
+        margin-bottom: 1.5rem;
+    }
+
+    .appointment-box {
+        background-color: #ffcdd2;
+        padding: 12px 18px;
+        border-radius: 6px;
+        margin-bottom: 1.5rem;
+    }
+
+    .remark {
+        font-weight: bold;
+        margin-top: 2rem;
+    }
+
+    .footer {
+        display: flex;
+        justify-content: space-between;
+        margin-top: 3rem;
+        font-size: 16px;
+    }
+
+    .footer .right {
+        text-align: right;
+    }
+</style>
+"""
+
+FONT_STYLE = """
+    <style>
+    @import url('https://fonts.googleapis.com/css2?family=Chakra+Petch&display=swap');
+    html, body, [class*="css"] {
+        font-family: 'Chakra Petch', sans-serif !important;
+    }
+    </style>
+"""
+
+RESULT_HEADERS = ["ชื่อการตรวจ", "ผลตรวจ", "ค่าปกติ"]
+
+
+# ==================== TEMPLATES ====================
+# สไตล์ทั้งหมดอยู่ใน PAGE_STYLE (ส่งครั้งเดียวต่อหน้า) ส่วนแม่แบบมีแค่โครง HTML + class
+# compile ครั้งเดียวตอน import: ตัดการเยื้อง/ขึ้นบรรทัดของแม่แบบทิ้ง (ไม่แตะค่าที่เติมเข้าไป) ให้ payload เล็กลง
+def _compile(source):
+    return Template(re.sub(r"\s*\n\s*", "", source.strip()))
+
+
+HEADER_TEMPLATE = _compile("""
+    <div class="report-header">
+        <div class="title">รายงานผลการตรวจสุขภาพ</div>
+        <div>วันที่ตรวจ: $date</div>
+        <div class="address">
+            โรงพยาบาลสันทราย 201 หมู่ที่ 11 ถนน เชียงใหม่ - พร้าว<br>
+            ตำบลหนองหาร อำเภอสันทราย เชียงใหม่ 50290 โทร 053 921 199 ต่อ 167
+        </div>
+        <hr>
+        <div class="fields">
+            <div><b>ชื่อ-สกุล:</b> $name</div>
+            <div><b>อายุ:</b> $age ปี</div>
+            <div><b>เพศ:</b> $sex</div>
+            <div><b>HN:</b> $hn</div>
+            <div><b>หน่วยงาน:</b> $department</div>
+        </div>
+        <div class="fields vitals">
+            <div><b>น้ำหนัก:</b> $weight</div>
+            <div><b>ส่วนสูง:</b> $height</div>
+            <div><b>รอบเอว:</b> $waist</div>
+            <div><b>ความดันโลหิต:</b> $bp</div>
+            <div><b>ชีพจร:</b> $pulse</div>
+        </div>
+        <div class="summary"><b>คำแนะนำ:</b> $summary_advice</div>
+    </div>
+""")
+
+SECTION_HEADER_TEMPLATE = _compile("""
+    <div class="section-header">$title</div>
+""")
+
+RESULT_TABLE_TEMPLATE = _compile("""
+    <div class="styled-wrapper">
+        <table class="styled-result">
+            <thead><tr>$headers</tr></thead>
+            <tbody>$rows</tbody>
+        </table>
+    </div>
+""")
+
+ADVICE_TEMPLATE = _compile("""
+    <div class="advice-box">
+        <div class="title">📋 คำแนะนำสรุปผลตรวจสุขภาพ ปี $year</div>
+        $advice
+    </div>
+""")
+
+URINE_ADVICE_TEMPLATE = _compile("""
+    <div class="note-box urine">
+        <div class="title">📌 คำแนะนำจากผลตรวจปัสสาวะ ปี 2568</div>
+        <div class="body">$advice</div>
+    </div>
+""")
+
+URINE_TEXT_TEMPLATE = _compile("""
+    <div class="urine-text">$text</div>
+""")
+
+URINE_EMPTY_HTML = _compile("""
+    <div class="urine-text empty">ไม่พบข้อมูลผลตรวจปัสสาวะในปีนี้</div>
+""").template
+
+STOOL_TEMPLATE = _compile("""
+    <p class="stool-text">
+        <b>ผลตรวจอุจจาระทั่วไป:</b> $exam<br>
+        <b>ผลตรวจอุจจาระเพาะเชื้อ:</b> $culture
+    </p>
+""")
+
+TEXT_BOX_TEMPLATE = _compile("""
+    <div class="text-box">$text</div>
+""")
+
+HEPATITIS_B_TEMPLATE = _compile("""
+    <table class="hepb-table">
+        <thead>
+            <tr><th>HBsAg</th><th>HBsAb</th><th>HBcAb</th></tr>
+        </thead>
+        <tbody>
+            <tr><td>$hbsag</td><td>$hbsab</td><td>$hbcab</td></tr>
+        </tbody>
+    </table>
+    <div class="note-box">$advice</div>
+""")
+
+DOCTOR_HTML = _compile("""
+    <div class="doctor-box">
+        <b>สรุปความเห็นของแพทย์ :</b> (ยังไม่ได้เชื่อมคอลัมน์)
+    </div>
+    <div class="signature">
+        <div class="block">
+            <div class="line"></div>
+            <div class="name">นายแพทย์นพรัตน์ รัชฎาพร</div>
+            <div class="name">เลขที่ใบอนุญาตผู้ประกอบวิชาชีพเวชกรรม ว.26674</div>
+        </div>
+    </div>
+""").template
+
+TWO_COLUMNS_TEMPLATE = _compile("""
+    <div class="two-columns">
+        <div>$left</div>
+        <div>$right</div>
+    </div>
+""")
+
+DOCUMENT_TEMPLATE = Template("""<!DOCTYPE html>
+<html lang="th">
+<head>
+<meta charset="utf-8">
+<title>รายงานผลตรวจสุขภาพ $hn</title>
+$page_style
+$font_style
+</head>
+<body style="padding: 24px;">
+$body
+</body>
+</html>
+""")
+
+_CELL_OPEN = {False: "<td>", True: "<td class='abn'>"}
+
+
+@instrumented("render_health_report")
+def render_health_report(person, year, warn=None):
+    vital = vitals(person, year)
+    if vital.bmi_error and warn is not None:
+        warn(vital.bmi_error)
+
+    return HEADER_TEMPLATE.substitute(
+        date=person.get('วันที่ตรวจ', '-'),
+        name=person.get('ชื่อ-สกุล', '-'),
+        age=person.get('อายุ', '-'),
+        sex=person.get('เพศ', '-'),
+        hn=person.get('HN', '-'),
+        department=person.get('หน่วยงาน', '-'),
+        weight=vital.weight,
+        height=vital.height,
+        waist=vital.waist,
+        bp=vital.bp,
+        pulse=vital.pulse,
+        summary_advice=html.escape(vital.summary_advice),
+    )
+
+
+# ✅ Styled table renderer
+@instrumented("styled_result_table")
+def styled_result_table(headers, rows):
+    # สไตล์ของตารางอยู่ใน PAGE_STYLE แล้ว: ที่นี่ประกอบแค่แถว (join ทีเดียว ไม่ต่อสตริงซ้ำ)
+    return RESULT_TABLE_TEMPLATE.substitute(
+        headers="".join(f"<th>{h}</th>" for h in headers),
+        rows="".join(
+            "<tr>" + "".join(f"{_CELL_OPEN[bool(is_abn)]}{cell}</td>" for cell, is_abn in row) + "</tr>"
+            for row in rows
+        ),
+    )
+
+
+def render_section_header(title):
+    return SECTION_HEADER_TEMPLATE.substitute(title=title)
+
+
+# ==================== SECTIONS ====================
+def header_html(person, year, warn=None):
+    return render_health_report(person, year, warn)
+
+
+def result_cells(rows):
+    # ResultRow → เซลล์ตาราง (ข้อความ, ผิดปกติ?) ทั้งแถวไฮไลต์เมื่อผิดปกติ
+    return [[(row.label, row.abnormal), (row.value, row.abnormal), (row.normal, row.abnormal)] for row in rows]
+
+
+def cbc_section_html(person, year, numbers=None):
+    return (
+        render_section_header("ผลการตรวจความสมบูรณ์ของเม็ดเลือด (Complete Blood Count)")
+        + styled_result_table(RESULT_HEADERS, result_cells(range_results(person, year, "cbc", numbers)))
+    )
+
+
+def blood_section_html(person, year, numbers=None):
+    return (
+        render_section_header("ผลตรวจเลือด (Blood Test)")
+        + styled_result_table(RESULT_HEADERS, result_cells(range_results(person, year, "blood", numbers)))
+    )
+
+
+@instrumented("advice")
+def advice_section_html(person, year):
+    return ADVICE_TEMPLATE.substitute(year=2500 + year, advice=final_advice(collect_advice_ids(person, year)))
+
+
+def urine_section_html(person, year, urine=None):
+    parts = [render_section_header("ผลการตรวจปัสสาวะ (Urinalysis)")]
+    urine_rows, urine_advice, urine_text = urine_results(person, year, urine)
+
+    if year == CURRENT_YEAR:
+        # 🔎 ปี 68 มีรายละเอียดครบ: ธงผิดปกติเทียบจากรหัส int8 ที่แปลงไว้ตอนโหลดชีต
+        parts.append(styled_result_table(RESULT_HEADERS, result_cells(urine_rows)))
+
+        # ✅ คำแนะนำ
+        if urine_advice:
+            parts.append(URINE_ADVICE_TEMPLATE.substitute(advice=urine_advice))
+    else:
+        # 🔎 ปี < 68 → ใช้ข้อมูลสรุปจากฟิลด์ "ผลปัสสาวะ<ปี>"
+        if urine_text:
+            parts.append(URINE_TEXT_TEMPLATE.substitute(text=urine_text))
+        else:
+            parts.append(URINE_EMPTY_HTML)
+    return "".join(parts)
+
+
+def stool_section_html(person, year):
+    # ✅ ผลตรวจอุจจาระ + คำแนะนำ
+    exam_text, cs_text = stool_results(person, year)
+    return render_section_header("ผลตรวจอุจจาระ (Stool Examination)") + STOOL_TEMPLATE.substitute(
+        exam=exam_text, culture=cs_text,
+    )
+
+
+def _text_box(text):
+    return TEXT_BOX_TEMPLATE.substitute(text=text)
+
+
+def cxr_section_html(person, year):
+    cxr_result = text_result(person, "cxr", year)
+    return render_section_header("ผลเอกซเรย์ (Chest X-ray)") + _text_box(cxr_result)
+
+
+def ekg_section_html(person, year):
+    ekg_result = text_result(person, "ekg", year)
+    return render_section_header("ผลคลื่นไฟฟ้าหัวใจ (EKG)") + _text_box(ekg_result)
+
+
+def hepatitis_a_section_html(person, year):
+    hep_a_raw = text_result(person, "hep_a", year)
+    return render_section_header("ผลการตรวจไวรัสตับอักเสบเอ (Viral hepatitis A)") + _text_box(hep_a_raw)
+
+
+def hepatitis_b_section_html(person, year):
+    hep_b = hepatitis_b(person)
+    # แสดงผลแบบไม่มีพื้นหลังสีในแถวหัวตาราง
+    return render_section_header("ผลการตรวจไวรัสตับอักเสบบี (Viral hepatitis B)") + HEPATITIS_B_TEMPLATE.substitute(
+        hbsag=hep_b.hbsag, hbsab=hep_b.hbsab, hbcab=hep_b.hbcab, advice=hep_b.advice,
+    )
+
+
+def doctor_section_html():
+    return DOCTOR_HTML
+
+
+# ==================== FULL DOCUMENT ====================
+def render_report_document(person, year, numbers=None, urine=None):
+    # หน้า HTML เดี่ยวสำหรับส่งออก: จัดวาง 2 คอลัมน์เหมือนหน้าเว็บ
+    def two_columns(left, right):
+        return TWO_COLUMNS_TEMPLATE.substitute(left=left, right=right)
+
+    body = "".join([
+        header_html(person, year),
+        two_columns(cbc_section_html(person, year, numbers), blood_section_html(person, year, numbers)),
+        advice_section_html(person, year),
+        two_columns(
+            urine_section_html(person, year, urine) + stool_section_html(person, year),
+            cxr_section_html(person, year) + ekg_section_html(person, year)
+            + hepatitis_a_section_html(person, year) + hepatitis_b_section_html(person, year),
+        ),
+        doctor_section_html(),
+    ])
+    return DOCUMENT_TEMPLATE.substitute(
+        hn=html.escape(str(person.get('HN', ''))), page_style=PAGE_STYLE, font_style=FONT_STYLE, body=body,
+    )
@@ -0,0 +1,129 @@
+# ==================== SHEET SCHEMA ====================
+# ชื่อคอลัมน์ในชีตต่อ (รายการตรวจ, ปี) รวมไว้ที่เดียว
+# ปี 68 บางคอลัมน์ไม่มีเลขปีต่อท้าย และบางรายการมีเฉพาะปี 68
+
+YEARS = list(range(61, 69))
+CURRENT_YEAR = 68
+
+IDENTITY_COLUMNS = ["เลขบัตรประชาชน", "HN", "ชื่อ-สกุล", "อายุ", "เพศ", "หน่วยงาน", "วันที่ตรวจ"]
+
+# รายการที่มีทุกปี: รูปแบบชื่อคอลัมน์ {y} = เลขปี 2 หลัก
+YEARLY_TESTS = {
+    "weight": "น้ำหนัก{y}",
+    "height": "ส่วนสูง{y}",
+    "waist": "รอบเอว{y}",
+    "sbp": "SBP{y}",
+    "dbp": "DBP{y}",
+    "pulse": "pulse{y}",
+    "fbs": "FBS{y}",
+    "uric": "Uric Acid{y}",
+    "alp": "ALP{y}",
+    "sgot": "SGOT{y}",
+    "sgpt": "SGPT{y}",
+    "chol": "CHOL{y}",
+    "tgl": "TGL{y}",
+    "hdl": "HDL{y}",
+    "ldl": "LDL{y}",
+    "bun": "BUN{y}",
+    "cr": "Cr{y}",
+    "gfr": "GFR{y}",
+    "hb": "Hb(%){y}",
+    "hct": "HCT{y}",
+    "wbc": "WBC (cumm){y}",
+    "plt": "Plt (/mm){y}",
+    "cxr": "CXR{y}",
+    "ekg": "EKG{y}",
+    "hep_a": "Hepatitis A{y}",
+    "hep_b": "Hepatitis B{y}",
+    "stool_exam": "Stool exam{y}",
+    "stool_cs": "Stool C/S{y}",
+    "urine_summary": "ผลปัสสาวะ{y}",
+}
+
+# ปี 68: ชื่อคอลัมน์ที่ต่างจากรูปแบบ (None = ไม่มีในปีนี้)
+CURRENT_YEAR_OVERRIDES = {
+    "weight": "น้ำหนัก",
+    "height": "ส่วนสูง",
+    "waist": "รอบเอว",
+    "sbp": "SBP",
+    "dbp": "DBP",
+    "pulse": "pulse",
+    "cxr": "CXR",
+    "ekg": "EKG",
+    "stool_exam": "Stool exam",
+    "stool_cs": "Stool C/S",
+    "urine_summary": None,
+}
+
+# รายการที่มีเฉพาะปี 68
+CURRENT_YEAR_ONLY = {
+    "ne": "Ne (%)68",
+    "ly": "Ly (%)68",
+    "eo": "Eo68",
+    "mo": "M68",
+    "ba": "BA68",
+    "rbc": "RBCmo68",
+    "mcv": "MCV68",
+    "mch": "MCH68",
+    "mchc": "MCHC",
+    "urine_color": "Color68",
+    "urine_sugar": "sugar68",
+    "urine_alb": "Alb68",
+    "urine_ph": "pH68",
+    "urine_spgr": "Spgr68",
+    "urine_rbc": "RBC168",
+    "urine_wbc": "WBC168",
+    "urine_epi": "SQ-epi68",
+    "urine_other": "ORTER68",
+    "hbsag": "HbsAg",
+    "hbsab": "HbsAb",
+    "hbcab": "HBcAB",
+}
+
+TESTS = list(YEARLY_TESTS) + list(CURRENT_YEAR_ONLY)
+
+
+def column_for(test, year):
+    if test in CURRENT_YEAR_ONLY:
+        return CURRENT_YEAR_ONLY[test] if year == CURRENT_YEAR else None
+    if year == CURRENT_YEAR and test in CURRENT_YEAR_OVERRIDES:
+        return CURRENT_YEAR_OVERRIDES[test]
+    return YEARLY_TESTS[test].format(y=year)
+
+
+def columns_for_year(year):
+    columns = {}
+    for test in TESTS:
+        col = column_for(test, year)
+        if col is not None:
+            columns[test] = col
+    return columns
+
+
+# รายการปี 68 ที่รายงานทุกปีใช้ร่วมกัน (ตาราง HBsAg/HBsAb/HBcAb ไม่แยกปี)
+SHARED_TESTS = ["hbsag", "hbsab", "hbcab"]
+
+
+def projected_columns(years):
+    # คอลัมน์ขั้นต่ำสำหรับรายงานของปีที่เลือก: ระบุตัวตน + ทุกรายการของปีนั้น + รายการที่ใช้ร่วมทุกปี
+    columns = list(IDENTITY_COLUMNS)
+    for year in sorted(set(years)):
+        columns += [col for col in columns_for_year(year).values() if col not in columns]
+    columns += [CURRENT_YEAR_ONLY[test] for test in SHARED_TESTS if CURRENT_YEAR_ONLY[test] not in columns]
+    return columns
+
+
+def all_test_columns():
+    # [(ชื่อคอลัมน์, รายการตรวจ, ปี), ...] ของทุกปี
+    return [
+        (col, test, year)
+        for year in YEARS
+        for test, col in columns_for_year(year).items()
+    ]
+
+
+# ==================== YEAR MAPPING ====================
+columns_by_year = {
+    y: {key: column_for(key, y) for key in ("weight", "height", "waist", "sbp", "dbp", "pulse")}
+    for y in YEARS
+}
@@ -0,0 +1,365 @@
+import ast
+from functools import lru_cache
+
+import numpy as np
+
+from instrumentation import instrumented
+from numeric_cache import NUMERIC_TESTS
+from schema import CURRENT_YEAR, YEARS, column_for
+
+# ==================== RISK SCREENING ====================
+# ค้นหาผู้ป่วยทั้ง roster ตามเกณฑ์ผลแล็บ เช่น "fbs[68] >= 126 and rising(fbs, 66)"
+# นิพจน์ถูก parse ด้วย ast (รับเฉพาะโครงที่อนุญาต) แล้ว compile เป็นฟังก์ชันที่คำนวณ mask
+# จากคอลัมน์ float32 ของ numeric cache ทีละคอลัมน์ (ไม่วนทีละแถว) ช่องว่าง/NaN = ไม่ผ่านเงื่อนไข
+# (รวมถึงใต้ not และ != : แถวที่ไม่มีค่าของรายการในเงื่อนไขย่อยนั้นไม่ผ่าน เช่น not fbs >= 126 ไม่รวมคนที่ไม่มีผล fbs)
+#
+# ไวยากรณ์:
+#   fbs[68], gfr[2566]      ค่าของรายการในปีนั้น (ชื่อรายการตาม schema ไม่สนตัวพิมพ์)
+#   fbs                      ไม่ระบุปี = ปี 68 หรือปีที่กำลังวนใน any/all/count
+#   bmi                      คำนวณจากน้ำหนัก/ส่วนสูงของปีนั้น
+#   any(gfr < 60)            เป็นจริงอย่างน้อยหนึ่งปี
+#   all(ldl < 160)           เป็นจริงทุกปีที่มีผล (ต้องมีผลอย่างน้อยหนึ่งปี)
+#   count(sbp >= 140) >= 2   จำนวนปีที่เป็นจริง
+#   rising(fbs, 66)          ค่าไม่ลดลงเลยตั้งแต่ปี 66 ถึง 68 (ข้ามปีที่ไม่มีผล) และปีสุดท้ายสูงกว่าปีแรก
+#   falling(gfr, 64, 67)     กลับกันของ rising
+#   and / or / not, + - * /, เปรียบเทียบแบบต่อเนื่อง 100 <= fbs < 126
+
+SCREENING_TESTS = NUMERIC_TESTS + ["bmi"]
+RESULT_IDENTITY = ["HN", "ชื่อ-สกุล", "เพศ", "อายุ", "หน่วยงาน"]
+DEPARTMENT_COL = "หน่วยงาน"
+
+EXAMPLES = [
+    "fbs[68] >= 126 and rising(fbs, 66)",
+    "any(gfr < 60)",
+    "count(sbp >= 140) >= 2",
+    "bmi >= 30 and ldl >= 160",
+]
+
+HELP = """
+`fbs[68]` ค่าปีที่ระบุ · `fbs` ปีล่าสุด · `bmi` คำนวณจากน้ำหนัก/ส่วนสูง
+`any(gfr < 60)` อย่างน้อยหนึ่งปี · `all(...)` ทุกปีที่มีผล · `count(...) >= 2` จำนวนปี
+`rising(fbs, 66)` / `falling(gfr, 64, 67)` แนวโน้มต่อเนื่อง · ใช้ `and` `or` `not` และ `+ - * /` ได้
+"""
+
+_COMPARE = {
+    ast.Lt: np.less, ast.LtE: np.less_equal, ast.Gt: np.greater, ast.GtE: np.greater_equal,
+    ast.Eq: np.equal, ast.NotEq: np.not_equal,
+}
+_ARITHMETIC = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide}
+
+
+class QueryError(ValueError):
+    pass
+
+
+class _Columns:
+    # ตัวอ่านคอลัมน์ของ numeric cache ระหว่างประเมินนิพจน์ (จำคอลัมน์ที่อ่านแล้ว)
+    def __init__(self, numeric_cache):
+        self.numeric_cache = numeric_cache
+        self.rows = len(numeric_cache.matrix)
+        self._cache = {}
+
+    def get(self, test, year):
+        key = (test, year)
+        if key not in self._cache:
+            if test == "bmi":
+                with np.errstate(all="ignore"):
+                    values = self.get("weight", year) / (self.get("height", year) / 100) ** 2
+            else:
+                col = column_for(test, year)
+                values = self.numeric_cache.column(col) if col else np.full(self.rows, np.nan, dtype=np.float32)
+            self._cache[key] = values
+        return self._cache[key]
+
+
+def _year(node):
+    if not isinstance(node, ast.Constant) or not isinstance(node.value, int) or isinstance(node.value, bool):
+        raise QueryError("ปีต้องเป็นตัวเลข เช่น fbs[68] หรือ fbs[2568]")
+    year = node.value - 2500 if node.value > 2500 else node.value
+    if year not in YEARS:
+        raise QueryError(f"ไม่มีข้อมูลปี {node.value} (มี พ.ศ. {YEARS[0] + 2500}-{YEARS[-1] + 2500})")
+    return year
+
+
+def _test(node):
+    if not isinstance(node, ast.Name) or node.id.lower() not in SCREENING_TESTS:
+        name = ast.unparse(node) if isinstance(node, ast.AST) else node
+        raise QueryError(f"ไม่รู้จักรายการตรวจ '{name}' (ใช้ได้: {', '.join(SCREENING_TESTS)})")
+    return node.id.lower()
+
+
+def _kind(node):
+    # ชนิดของนิพจน์ย่อยก่อนประเมิน: "bool" = เงื่อนไข, "number" = ค่าตัวเลข, None = โครงที่ compile จะแจ้งเอง
+    if isinstance(node, ast.Expression):
+        return _kind(node.body)
+    if isinstance(node, (ast.BoolOp, ast.Compare)) or (isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not)):
+        return "bool"
+    if isinstance(node, (ast.Name, ast.Subscript, ast.BinOp, ast.Constant)) or isinstance(node, ast.UnaryOp):
+        return "number"
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+        name = node.func.id.lower()
+        if name in ("any", "all", "rising", "falling"):
+            return "bool"
+        if name == "count":
+            return "number"
+    return None
+
+
+def _require(node, kind):
+    # and/or/not/any/all/count รับเฉพาะเงื่อนไข ค่าตัวเลขใช้ได้เฉพาะในการเปรียบเทียบและ + - * /
+    found = _kind(node)
+    if found is None or found == kind:
+        return
+    if kind == "bool":
+        raise QueryError(f"'{ast.unparse(node)}' ไม่ใช่เงื่อนไข: ต้องเปรียบเทียบกับค่า เช่น fbs >= 126")
+    raise QueryError(f"'{ast.unparse(node)}' เป็นเงื่อนไข ใช้เป็นตัวเลขไม่ได้ (ใช้ count(...) นับจำนวนปี)")
+
+
+class _Compiler:
+    def __init__(self):
+        self.references = []  # (test, ปี หรือ None = ทุกปี) ตามลำดับที่พบ สำหรับเลือกคอลัมน์แสดงผล
+
+    def refer(self, test, year):
+        if (test, year) not in self.references:
+            self.references.append((test, year))
+
+    def compile(self, node, in_years=False):
+        # คืนฟังก์ชัน (columns, ปีปัจจุบัน) -> array และชุดรายการที่ใช้ปีปัจจุบัน (ไว้เช็กว่ามีผลใน all())
+        if isinstance(node, ast.Expression):
+            return self.compile(node.body, in_years)
+        if isinstance(node, ast.BoolOp):
+            for value in node.values:
+                _require(value, "bool")
+            parts = [self.compile(value, in_years) for value in node.values]
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            return (lambda cols, year: combine.reduce([f(cols, year) for f, _ in parts])), _union(parts)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            _require(node.operand, "bool")
+            inner, tests = self.compile(node.operand, in_years)
+            present = self.present(node.operand)
+            return (lambda cols, year: np.logical_not(inner(cols, year)) & present(cols, year)), tests
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            _require(node.operand, "number")
+            inner, tests = self.compile(node.operand, in_years)
+            return (lambda cols, year: -inner(cols, year)), tests
+        if isinstance(node, ast.Compare):
+            return self._compare(node, in_years)
+        if isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC:
+            op = _ARITHMETIC[type(node.op)]
+            _require(node.left, "number")
+            _require(node.right, "number")
+            left, left_tests = self.compile(node.left, in_years)
+            right, right_tests = self.compile(node.right, in_years)
+
+            def arithmetic(cols, year):
+                with np.errstate(all="ignore"):
+                    return op(left(cols, year), right(cols, year))
+            return arithmetic, left_tests | right_tests
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            value = float(node.value)
+            return (lambda cols, year: value), set()
+        if isinstance(node, ast.Name):
+            test = _test(node)
+            self.refer(test, None if in_years else CURRENT_YEAR)
+            return (lambda cols, year: cols.get(test, year)), {test}
+        if isinstance(node, ast.Subscript):
+            test, year = _test(node.value), _year(node.slice)
+            self.refer(test, year)
+            return (lambda cols, _: cols.get(test, year)), set()
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            return self._call(node, in_years)
+        raise QueryError(f"ใช้ '{ast.unparse(node)}' ในเงื่อนไขไม่ได้")
+
+    def present(self, node):
+        # ฟังก์ชัน (columns, ปีปัจจุบัน) -> mask แถวที่มีค่าครบทุกรายการที่นิพจน์ย่อยอ่านตรงๆ
+        # any/all/count/rising/falling จัดการช่องว่างเองแล้ว ผลถือว่ามีค่าเสมอ
+        if isinstance(node, ast.Name):
+            test = _test(node)
+            return lambda cols, year: ~np.isnan(cols.get(test, year))
+        if isinstance(node, ast.Subscript):
+            test, year = _test(node.value), _year(node.slice)
+            return lambda cols, _: ~np.isnan(cols.get(test, year))
+        if isinstance(node, (ast.Constant, ast.Call)):
+            return lambda cols, _: np.ones(cols.rows, dtype=bool)
+        children = [self.present(child) for child in ast.iter_child_nodes(node) if isinstance(child, ast.expr)]
+        return lambda cols, year: np.logical_and.reduce([np.ones(cols.rows, dtype=bool)] + [f(cols, year) for f in children])
+
+    def _compare(self, node, in_years):
+        for operand in [node.left] + node.comparators:
+            _require(operand, "number")
+        operands = [self.compile(node.left, in_years)] + [self.compile(c, in_years) for c in node.comparators]
+        ops = []
+        for op in node.ops:
+            if type(op) not in _COMPARE:
+                raise QueryError("ใช้ได้เฉพาะ < <= > >= == !=")
+            ops.append(_COMPARE[type(op)])
+        # NaN != x เป็นจริง: ตัดแถวที่ไม่มีค่าออก (เปรียบเทียบแบบอื่นกับ NaN เป็นเท็จอยู่แล้ว)
+        present = self.present(node) if any(isinstance(op, ast.NotEq) for op in node.ops) else None
+
+        def compare(cols, year):
+            values = [f(cols, year) for f, _ in operands]
+            result = None
+            with np.errstate(invalid="ignore"):
+                for op, left, right in zip(ops, values, values[1:]):
+                    step = np.asarray(op(left, right), dtype=bool)
+                    result = step if result is None else result & step
+            result = np.broadcast_to(result, (cols.rows,)) if result.ndim == 0 else result
+            return result & present(cols, year) if present is not None else result
+        return compare, _union(operands)
+
+    def _call(self, node, in_years):
+        name = node.func.id.lower()
+        if name in ("any", "all", "count"):
+            if in_years or len(node.args) != 1:
+                raise QueryError(f"{name}(...) ต้องมีเงื่อนไขเดียว และซ้อนใน any/all/count ไม่ได้")
+            _require(node.args[0], "bool")
+            inner, tests = self.compile(node.args[0], in_years=True)
+            return _over_years(name, inner, tests), set()
+        if name in ("rising", "falling"):
+            if not 2 <= len(node.args) <= 3:
+                raise QueryError(f"{name}(รายการ, ปีเริ่ม[, ปีสุดท้าย])")
+            test = _test(node.args[0])
+            since = _year(node.args[1])
+            until = _year(node.args[2]) if len(node.args) == 3 else CURRENT_YEAR
+            if since >= until:
+                raise QueryError(f"{name}: ปีเริ่มต้องมาก่อนปีสุดท้าย")
+            years = [y for y in YEARS if since <= y <= until]
+            for year in years:
+                self.refer(test, year)
+            return _trend(test, years, rising=name == "rising"), set()
+        raise QueryError(f"ไม่รู้จักฟังก์ชัน '{node.func.id}' (ใช้ได้: any, all, count, rising, falling)")
+
+
+def _union(parts):
+    tests = set()
+    for _, part in parts:
+        tests |= part
+    return tests
+
+
+def _over_years(name, inner, tests):
+    def over_years(cols, _):
+        hits = np.zeros(cols.rows, dtype=np.int16)
+        tested = np.zeros(cols.rows, dtype=np.int16)
+        for year in YEARS:
+            result = inner(cols, year)
+            present = np.ones(cols.rows, dtype=bool)
+            for test in tests:
+                present &= ~np.isnan(cols.get(test, year))
+            hits += result & present
+            tested += present
+        if name == "any":
+            return hits > 0
+        if name == "all":
+            return (tested > 0) & (hits == tested)
+        return hits.astype(np.float32)
+    return over_years
+
+
+def _trend(test, years, rising):
+    def trend(cols, _):
+        ok = np.ones(cols.rows, dtype=bool)
+        first = np.full(cols.rows, np.nan, dtype=np.float32)
+        last = np.full(cols.rows, np.nan, dtype=np.float32)
+        points = np.zeros(cols.rows, dtype=np.int16)
+        for year in years:
+            values = cols.get(test, year)
+            present = ~np.isnan(values)
+            with np.errstate(invalid="ignore"):
+                step_back = values < last if rising else values > last
+            ok &= ~(present & step_back)
+            first = np.where(np.isnan(first) & present, values, first)
+            last = np.where(present, values, last)
+            points += present
+        with np.errstate(invalid="ignore"):
+            moved = last > first if rising else last < first
+        return ok & (points >= 2) & moved
+    return trend
+
+
+class ScreeningQuery:
+    def __init__(self, expression):
+        self.expression = expression.strip()
+        if not self.expression:
+            raise QueryError("กรุณาใส่เงื่อนไข")
+        try:
+            tree = ast.parse(self.expression, mode="eval")
+        except SyntaxError as e:
+            raise QueryError(f"เงื่อนไขไม่ถูกต้อง: {e.msg}") from None
+        _require(tree, "bool")
+        compiler = _Compiler()
+        self._evaluate, _ = compiler.compile(tree)
+        self.references = compiler.references
+
+    def columns(self):
+        # คอลัมน์ผลแล็บที่ใช้ในเงื่อนไข (ตามลำดับปี) สำหรับแสดงผล/ส่งออก
+        columns = []
+        for test, year in self.references:
+            for y in YEARS if year is None else [year]:
+                for t in ("weight", "height") if test == "bmi" else (test,):
+                    col = column_for(t, y)
+                    if col and col not in columns:
+                        columns.append(col)
+        return columns
+
+    def mask(self, numeric_cache):
+        return self._evaluate(_Columns(numeric_cache), CURRENT_YEAR)
+
+
+@lru_cache(maxsize=64)
+def compile_query(expression):
+    return ScreeningQuery(expression)
+
+
+class ScreeningResult:
+    def __init__(self, query, positions, department=None):
+        self.query = query
+        self.positions = positions  # ตำแหน่งแถวของผู้ที่ผ่านเงื่อนไข เรียงตามลำดับในชีต
+        self.department = department
+
+    def __len__(self):
+        return len(self.positions)
+
+    def pages(self, page_size):
+        return max(1, -(-len(self.positions) // page_size))
+
+    def table(self, df, positions=None):
+        positions = self.positions if positions is None else positions
+        columns = [c for c in RESULT_IDENTITY if c in df.columns]
+        columns += [c for c in self.query.columns() if c in df.columns]
+        return df.iloc[positions][columns].reset_index(drop=True)
+
+    def page(self, df, page, page_size=50):
+        # page เริ่มที่ 1: แปลงเป็นตารางเฉพาะแถวของหน้านั้น
+        start = (page - 1) * page_size
+        return self.table(df, self.positions[start:start + page_size])
+
+    def by_department(self, df):
+        # จำนวนผู้ที่ผ่านเงื่อนไขต่อหน่วยงาน เทียบกับจำนวนคนทั้งหน่วยงาน
+        import pandas as pd
+
+        if DEPARTMENT_COL not in df.columns:
+            return pd.DataFrame(columns=["ผ่านเงื่อนไข", "ทั้งหมด", "%"])
+        departments = df[DEPARTMENT_COL].astype(str).str.strip()
+        table = pd.DataFrame({
+            "ผ่านเงื่อนไข": departments.iloc[self.positions].value_counts(),
+            "ทั้งหมด": departments.value_counts(),
+        }).fillna(0).astype(int)
+        if self.department is not None:
+            table = table.loc[[self.department]] if self.department in table.index else table.iloc[0:0]
+        table["%"] = (100 * table["ผ่านเงื่อนไข"] / table["ทั้งหมด"]).round(1)
+        table.index.name = DEPARTMENT_COL
+        return table.sort_values(["ผ่านเงื่อนไข", "ทั้งหมด"], ascending=False)
+
+    def to_csv(self, df):
+        # utf-8-sig ให้ Excel เปิดภาษาไทยได้ถูก
+        return self.table(df).to_csv(index=False).encode("utf-8-sig")
+
+
+@instrumented("screening.query")
+def screen(df, numeric_cache, expression, department=None):
+    query = compile_query(expression)
+    mask = query.mask(numeric_cache)
+    if department is not None and DEPARTMENT_COL in df.columns:
+        mask = mask & (df[DEPARTMENT_COL].astype(str).str.strip() == department).to_numpy()
+    return ScreeningResult(query, np.flatnonzero(mask), department)
@@ -0,0 +1,176 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# ==================== SEARCH INDEX ====================
+# ดัชนีค้นหาผู้ป่วย: สร้างครั้งเดียวต่อการโหลด Google Sheet
+# แต่ละคีย์ map ค่า -> ตำแหน่งแถว (np.ndarray) ใน DataFrame
+
+ID_COL = "เลขบัตรประชาชน"
+HN_COL = "HN"
+NAME_COL = "ชื่อ-สกุล"
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_key(value):
+    return str(value).strip()
+
+
+def normalize_name(value):
+    # ตัดช่องว่างหัวท้าย และรวมช่องว่างซ้ำระหว่างชื่อ-นามสกุลให้เหลือช่องเดียว
+    return _WHITESPACE.sub(" ", str(value)).strip()
+
+
+def _normalize_keys(series):
+    return series.astype(str).str.strip()
+
+
+def _normalize_names(series):
+    return series.astype(str).str.replace(_WHITESPACE, " ", regex=True).str.strip()
+
+
+INDEXED_COLUMNS = {
+    "id_card": (ID_COL, _normalize_keys),
+    "hn": (HN_COL, _normalize_keys),
+    "name": (NAME_COL, _normalize_names),
+}
+
+
+def group_positions(values):
+    # dict ค่า -> ตำแหน่งแถว: factorize (hash) ครั้งเดียว แล้วแบ่งช่วงจากการเรียงรหัส
+    codes, uniques = pd.factorize(values)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    return {value: order[bounds[i]:bounds[i + 1]] for i, value in enumerate(uniques)}
+
+
+def build_patient_index(df):
+    index = {}
+    for key, (col, normalize) in INDEXED_COLUMNS.items():
+        if col not in df.columns:
+            index[key] = {}
+            continue
+        index[key] = group_positions(normalize(df[col]).to_numpy(dtype=object))
+    return index
+
+
+def lookup_patients(index, id_card="", hn="", full_name=""):
+    criteria = [
+        ("id_card", normalize_key(id_card)),
+        ("hn", normalize_key(hn)),
+        ("name", normalize_name(full_name)),
+    ]
+    positions = None
+    for key, value in criteria:
+        if not value:
+            continue
+        hits = index[key].get(value)
+        if hits is None:
+            return np.empty(0, dtype=np.intp)
+        positions = hits if positions is None else np.intersect1d(positions, hits, assume_unique=True)
+    if positions is None:
+        return np.empty(0, dtype=np.intp)
+    return positions
+
+
+# ==================== FUZZY SEARCH ====================
+# ค้นหาแบบพิมพ์บางส่วน (type-ahead): inverted index ของ trigram ระดับ "ตัวอักษรที่มองเห็น"
+# สระบน/ล่างและวรรณยุกต์ไทยติดกับพยัญชนะตัวหน้าเสมอ จึงไม่ถูกตัดกลาง n-gram
+# ไม่สนคำนำหน้าชื่อ (นาย/นาง/นางสาว...) และช่องว่างที่พิมพ์เกิน/ขาด
+
+_TITLE = re.compile(r"^(?:นางสาว|นาง|นาย|น\.ส\.|ด\.ช\.|ด\.ญ\.)\s*")
+_GRAPHEME = re.compile("[^\u0e31\u0e34-\u0e3a\u0e47-\u0e4e][\u0e31\u0e34-\u0e3a\u0e47-\u0e4e]*")
+_WORD_START = "\x02"
+MIN_COVERAGE = 0.34
+
+
+def fuzzy_words(value):
+    return _strip_title(normalize_name(value))
+
+
+def _strip_title(name):
+    return _TITLE.sub("", name.lower()).split()
+
+
+def name_grams(words):
+    # trigram ต่อเนื่องข้ามคำ (ไม่สนช่องว่าง) + gram ต้นคำ สำหรับคำค้นสั้น ๆ แบบพิมพ์ต้นชื่อ/นามสกุล
+    graphemes = []
+    grams = set()
+    for word in words:
+        chars = _GRAPHEME.findall(word)
+        if chars:
+            grams.add(_WORD_START + chars[0])
+            grams.add(_WORD_START + "".join(chars[:2]))
+            graphemes += chars
+    grams.update(map("".join, zip(graphemes, graphemes[1:], graphemes[2:])))
+    return grams
+
+
+class FuzzyPatientIndex:
+    def __init__(self, name_rows, postings, gram_counts, hn_sorted, hn_rows):
+        self.name_rows = name_rows      # list: ชื่อ (unique) -> ตำแหน่งแถว
+        self.postings = postings        # dict: gram -> รหัสชื่อ (unique)
+        self.gram_counts = gram_counts  # จำนวน gram ของแต่ละชื่อ
+        self.hn_sorted = hn_sorted      # HN (ตัวพิมพ์ใหญ่) เรียงลำดับ สำหรับค้นหาด้วย prefix
+        self.hn_rows = hn_rows
+
+    def search_hn(self, prefix, k=10):
+        prefix = normalize_key(prefix).upper()
+        if not prefix:
+            return np.empty(0, dtype=np.intp)
+        lo = np.searchsorted(self.hn_sorted, prefix, side="left")
+        hi = np.searchsorted(self.hn_sorted, prefix + "\uffff", side="left")
+        return self.hn_rows[lo:min(hi, lo + k)]
+
+    def search_name(self, query, k=10):
+        query_grams = list(name_grams(fuzzy_words(query)))
+        hits = [self.postings[g] for g in query_grams if g in self.postings]
+        if not query_grams or not hits:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        matched = np.bincount(np.concatenate(hits), minlength=len(self.name_rows))
+        candidates = np.flatnonzero(matched >= MIN_COVERAGE * len(query_grams))
+        coverage = matched[candidates] / len(query_grams)
+        # เท่ากันที่ความครอบคลุม -> ให้ชื่อที่ยาวใกล้เคียงคำค้น (Dice) ขึ้นก่อน
+        dice = 2 * matched[candidates] / (len(query_grams) + self.gram_counts[candidates])
+        rank = coverage + 0.01 * dice
+        if len(candidates) > k:
+            top = np.argpartition(-rank, k)[:k]
+            candidates, coverage, rank = candidates[top], coverage[top], rank[top]
+        order = np.argsort(-rank, kind="stable")
+        rows, scores = [], []
+        for name_id, score in zip(candidates[order], coverage[order]):
+            for pos in self.name_rows[name_id]:
+                rows.append(pos)
+                scores.append(score)
+        return np.asarray(rows[:k], dtype=np.intp), np.asarray(scores[:k])
+
+    def search(self, query, k=10):
+        # HN ที่ขึ้นต้นตรงกันมาก่อน (score 1.0) ตามด้วยชื่อที่ใกล้เคียง
+        hn_hits = self.search_hn(query, k)
+        name_hits, name_scores = self.search_name(query, k)
+        keep = ~np.isin(name_hits, hn_hits)
+        rows = np.concatenate([hn_hits, name_hits[keep]])[:k]
+        scores = np.concatenate([np.ones(len(hn_hits)), name_scores[keep]])[:k]
+        return rows, scores
+
+
+def build_fuzzy_index(df):
+    names = df[NAME_COL] if NAME_COL in df.columns else pd.Series([""] * len(df))
+    codes, uniques = pd.factorize(_normalize_names(names).to_numpy(dtype=object))
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    name_rows = [order[bounds[i]:bounds[i + 1]] for i in range(len(uniques))]
+
+    # uniques ผ่าน normalize_name มาแล้ว เหลือแค่ตัดคำนำหน้า
+    gram_lists = [name_grams(_strip_title(name)) for name in uniques]
+    gram_counts = np.fromiter((len(g) for g in gram_lists), dtype=np.int32, count=len(gram_lists))
+    name_ids = np.repeat(np.arange(len(uniques), dtype=np.int32), gram_counts)
+    flat = np.fromiter((g for grams in gram_lists for g in grams), dtype=object, count=int(gram_counts.sum()))
+    postings = {gram: name_ids[pos] for gram, pos in group_positions(flat).items()}
+
+    hns = df[HN_COL] if HN_COL in df.columns else pd.Series([""] * len(df))
+    hns = _normalize_keys(hns).str.upper().to_numpy(dtype=object)
+    hn_rows = np.argsort(hns, kind="stable")
+    return FuzzyPatientIndex(name_rows, postings, gram_counts, hns[hn_rows], hn_rows)
@@ -0,0 +1,187 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+
+from dataset_cache import Dataset, SharedDataset, build_dataset
+from instrumentation import instrumented
+from numeric_cache import NumericCache
+from search_index import build_fuzzy_index, build_patient_index
+from urinalysis import URINE_RULES, UrineCodes
+
+# ==================== SHARED-MEMORY DATASET (MULTI-PROCESS) ====================
+# โหมดหลาย process: publisher หนึ่งตัวสร้างชุดข้อมูลจาก snapshot แล้วเขียนลงโฟลเดอร์ใน /dev/shm
+# (ชีตที่ clean แล้วเป็น Arrow IPC, ค่าแล็บ float32, บิตปีที่มีผล และรหัสปัสสาวะ int8 เป็น .npy)
+# แอปหลายตัว (worker) map ไฟล์เดียวกันแบบอ่านอย่างเดียว: หน้าหน่วยความจำเป็นของ page cache ที่ใช้ร่วมกัน
+# จำนวน worker เพิ่มแล้วหน่วยความจำไม่โตตาม เหลือแค่ดัชนีค้นหาที่แต่ละ worker สร้างเอง
+#
+# โครงโฟลเดอร์: <dir>/<version>/{sheet.arrow, numeric.npy, years.npy, urine.npy, meta.json}
+#              <dir>/CURRENT = version ล่าสุด (สลับแบบ atomic หลังเขียนครบ)
+#
+# รัน publisher: python -m shared_dataset --dir /dev/shm/health-report
+# รัน worker:    HEALTH_SHARED_DIR=/dev/shm/health-report streamlit run app.py --server.port 8502
+
+DEFAULT_SHARED_DIR = "/dev/shm/health-report" if os.path.isdir("/dev/shm") else ".shared"
+KEEP_VERSIONS = 2  # worker ที่ยังอ่าน version ก่อนหน้าอยู่ ยังเปิดไฟล์ได้ระหว่างสลับ
+
+
+def _write_arrow(df, path):
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _read_arrow(path):
+    # memory map + to_pandas: คอลัมน์ข้อความ (dtype str ของ pandas 3 มี Arrow อยู่เบื้องหลัง) ชี้บัฟเฟอร์ในไฟล์ ไม่ copy
+    # pandas 2 จะแปลงเป็น object และ copy ทุกเซลล์ → requirements.txt กำหนด pandas>=3
+    import pyarrow as pa
+
+    with pa.memory_map(path, "r") as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+@instrumented("publish_dataset")
+def publish_dataset(dataset, directory=DEFAULT_SHARED_DIR):
+    final = os.path.join(directory, dataset.version)
+    if os.path.isdir(final):
+        _set_current(directory, dataset.version)
+        return final
+    tmp = final + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    _write_arrow(dataset.df, os.path.join(tmp, "sheet.arrow"))
+    np.save(os.path.join(tmp, "numeric.npy"), dataset.numeric_cache.matrix)
+    np.save(os.path.join(tmp, "years.npy"), dataset.numeric_cache.year_mask)
+    urine_keys = [rule.key for rule in URINE_RULES]
+    np.save(os.path.join(tmp, "urine.npy"), np.stack([dataset.urine_codes.codes[key] for key in urine_keys]))
+    meta = {
+        "version": dataset.version,
+        "rows": len(dataset.df),
+        "numeric_columns": list(dataset.numeric_cache.values.columns),
+        "unparseable": {col: pos.tolist() for col, pos in dataset.numeric_cache.unparseable.items()},
+        "urine_keys": urine_keys,
+        "published_at": time.time(),
+    }
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    os.replace(tmp, final)
+    _set_current(directory, dataset.version)
+    _prune(directory, dataset.version)
+    return final
+
+
+def _set_current(directory, version):
+    tmp = os.path.join(directory, "CURRENT.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(directory, "CURRENT"))
+
+
+def _prune(directory, current):
+    # ลบ version เก่า (worker ที่ map ไฟล์ไว้แล้วยังอ่านได้จนปล่อย เพราะ unlink ไม่ยกเลิก mapping)
+    versions = [
+        entry for entry in os.listdir(directory)
+        if os.path.isdir(os.path.join(directory, entry)) and not entry.endswith(".tmp") and entry != current
+    ]
+    versions.sort(key=lambda entry: os.path.getmtime(os.path.join(directory, entry)), reverse=True)
+    for entry in versions[KEEP_VERSIONS - 1:]:
+        shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+
+
+def current_version(directory=DEFAULT_SHARED_DIR):
+    try:
+        with open(os.path.join(directory, "CURRENT"), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+@instrumented("attach_dataset")
+def attach_dataset(path, version):
+    # ฝั่ง worker: ทุก array ที่ได้จาก np.load(mmap_mode="r") เป็น read-only อยู่แล้ว
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    df = _read_arrow(os.path.join(path, "sheet.arrow"))
+    matrix = np.load(os.path.join(path, "numeric.npy"), mmap_mode="r")
+    unparseable = {col: np.asarray(pos, dtype=np.intp) for col, pos in meta["unparseable"].items()}
+    year_mask = np.load(os.path.join(path, "years.npy"), mmap_mode="r")
+    urine = np.load(os.path.join(path, "urine.npy"), mmap_mode="r")
+    # ดัชนีค้นหาเป็น dict ของ Python ใช้ร่วมข้าม process ไม่ได้ → สร้างในแต่ละ worker (เล็กเมื่อเทียบกับตาราง)
+    return Dataset(
+        version, df, build_patient_index(df), build_fuzzy_index(df),
+        NumericCache(matrix, meta["numeric_columns"], unparseable, year_mask),
+        UrineCodes(dict(zip(meta["urine_keys"], urine))),
+    )
+
+
+class PublishedSource:
+    # แทน SnapshotService ใน SharedDataset: current() -> (โฟลเดอร์ของ version, version)
+    # SharedDataset จึงได้ single-flight/stale-while-revalidate ตอนสลับไป version ใหม่ด้วย
+    def __init__(self, directory=DEFAULT_SHARED_DIR):
+        self.directory = directory
+
+    def current(self):
+        version = current_version(self.directory)
+        if version is None:
+            raise RuntimeError(f"ยังไม่มีชุดข้อมูลใน {self.directory}: เปิด publisher (python -m shared_dataset) ก่อน")
+        return os.path.join(self.directory, version), version
+
+
+def attached_dataset(directory=DEFAULT_SHARED_DIR):
+    return SharedDataset(PublishedSource(directory), build=attach_dataset)
+
+
+# ==================== PUBLISHER ====================
+def publish_loop(service, directory, interval):
+    while True:
+        frame, version = service.current()
+        if version != current_version(directory):
+            publish_dataset(build_dataset(frame, version), directory)
+            print(f"เผยแพร่ชุดข้อมูล {version} ({len(frame):,} แถว) → {directory}", file=sys.stderr)
+        if interval <= 0:
+            return
+        time.sleep(interval)
+        try:
+            service.refresh()
+        except Exception as e:
+            # เก็บชุดเดิมให้ worker ใช้ต่อ แล้วลองใหม่รอบหน้า
+            print(f"รีเฟรชชีตไม่สำเร็จ: {e}", file=sys.stderr)
+
+
+def _load_secrets(path=".streamlit/secrets.toml"):
+    if not os.path.exists(path):
+        return None
+    import tomllib
+
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+
+def main(argv=None):
+    from sheet_source import source_from_config
+    from snapshot import SnapshotService
+
+    parser = argparse.ArgumentParser(description="สร้างชุดข้อมูลจากชีตแล้วเผยแพร่ใน shared memory ให้แอปหลาย process")
+    parser.add_argument("--dir", default=os.environ.get("HEALTH_SHARED_DIR", DEFAULT_SHARED_DIR))
+    parser.add_argument("--interval", type=int, default=300, help="วินาทีระหว่างเช็กชีต (0 = เผยแพร่ครั้งเดียวแล้วจบ)")
+    args = parser.parse_args(argv)
+
+    secrets = _load_secrets()
+    if secrets is None and not os.environ.get("HEALTH_SHEET_FILE"):
+        raise SystemExit("ไม่พบ .streamlit/secrets.toml: ระบุ HEALTH_SHEET_FILE หรือรันจากโฟลเดอร์ของแอป")
+    os.makedirs(args.dir, exist_ok=True)
+    service = SnapshotService(source_from_config(secrets))
+    service.load()
+    publish_loop(service, args.dir, args.interval)
+
+
+if __name__ == "__main__":
+    main()
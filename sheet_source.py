@@ -0,0 +1,340 @@
+import os
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import instrumented
+from schema import (
+    CURRENT_YEAR, CURRENT_YEAR_OVERRIDES, IDENTITY_COLUMNS, YEARLY_TESTS, all_test_columns, projected_columns,
+)
+
+# ==================== SHEET SOURCES ====================
+# แหล่งข้อมูลแบบสลับได้: Google Sheet จริง หรือไฟล์ CSV/XLSX ในเครื่อง (ใช้แทนตอนทดสอบ)
+# ทุกแหล่งมี revision() สำหรับเช็กว่าข้อมูลเปลี่ยนหรือไม่ และ fetch() คืน DataFrame
+# ระบุ worksheets (รายชื่อ หรือ "*" = ทุกแผ่น) เพื่อดึงหลายแผ่นพร้อมกันแล้วรวมเป็นตารางผู้ป่วยเดียว
+
+SHEET_URL = "https://docs.google.com/spreadsheets/d/1N3l0o_Y6QYbGKx22323mNLPym77N0jkJfyxXFM2BDmc"
+GOOGLE_SCOPE = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+
+
+def normalize_records(df):
+    # ทำทุกคอลัมน์ให้เป็นข้อความ เพื่อให้เขียน snapshot แบบ columnar ได้ และตรงกับค่าที่พิมพ์ในชีต
+    return df.fillna("").astype(str)
+
+
+@instrumented("clean_sheet")
+def clean_sheet(df):
+    df = df.copy()
+    df.columns = df.columns.str.strip()
+    df['เลขบัตรประชาชน'] = df['เลขบัตรประชาชน'].astype(str).str.strip()
+    df['HN'] = df['HN'].astype(str).str.strip()
+    df['ชื่อ-สกุล'] = df['ชื่อ-สกุล'].astype(str).str.strip()
+    return df
+
+
+class GoogleSheetSource:
+    def __init__(self, service_account_info, sheet_url=SHEET_URL, worksheets=None, workers=4):
+        self.service_account_info = service_account_info
+        self.sheet_url = sheet_url
+        self.worksheets = worksheets  # None = แผ่นแรกเท่านั้น (แบบเดิม)
+        self.workers = workers
+        self.last_report = None
+        self._spreadsheet = None
+
+    def _open(self):
+        if self._spreadsheet is None:
+            import gspread
+            from oauth2client.service_account import ServiceAccountCredentials
+
+            creds = ServiceAccountCredentials.from_json_keyfile_dict(self.service_account_info, GOOGLE_SCOPE)
+            self._spreadsheet = gspread.authorize(creds).open_by_url(self.sheet_url)
+        return self._spreadsheet
+
+    def revision(self):
+        # เวลาแก้ไขล่าสุดของไฟล์จาก Drive (เรียกเบากว่าดึงข้อมูลทั้งชีตมาก)
+        spreadsheet = self._open()
+        try:
+            if hasattr(spreadsheet, "get_lastUpdateTime"):
+                return spreadsheet.get_lastUpdateTime()
+            return spreadsheet.lastUpdateTime
+        except Exception:
+            return None
+
+    def fetch(self, columns=None):
+        # columns = รายชื่อคอลัมน์ที่ต้องการ (projection) หรือ None = ทุกคอลัมน์
+        spreadsheet = with_retry(self._open)
+        if self.worksheets is None:
+            return with_retry(lambda: worksheet_frame(spreadsheet.sheet1, columns))
+
+        available = {ws.title: ws for ws in with_retry(spreadsheet.worksheets)}
+        titles = select_worksheets(list(available), self.worksheets)
+        fetchers = {title: (lambda ws=available[title]: worksheet_frame(ws, columns)) for title in titles}
+        df, self.last_report = merge_worksheets(fetch_concurrently(fetchers, self.workers))
+        return df
+
+
+def worksheet_frame(ws, columns=None):
+    if columns is None:
+        return normalize_records(pd.DataFrame(ws.get_all_records()))
+    from gspread.utils import numericise_all, rowcol_to_a1
+
+    # อ่านหัวตารางก่อน แล้วดึงเฉพาะคอลัมน์ที่ต้องการด้วย batch_get ครั้งเดียว (คอลัมน์ติดกันรวมเป็นช่วงเดียว)
+    header = [str(name) for name in ws.row_values(1)]
+    positions = projected_positions(header, columns)
+    if not positions:
+        return pd.DataFrame(columns=[])
+    runs = []
+    for pos in positions:
+        if runs and pos == runs[-1][1] + 1:
+            runs[-1][1] = pos
+        else:
+            runs.append([pos, pos])
+    letter = lambda pos: rowcol_to_a1(1, pos + 1)[:-1]
+    ranges = [f"{letter(start)}:{letter(end)}" for start, end in runs]
+    blocks = ws.batch_get(ranges, major_dimension="COLUMNS")
+
+    values = {}
+    for (start, end), block in zip(runs, blocks):
+        for offset, pos in enumerate(range(start, end + 1)):
+            # API ตัดช่องว่างท้ายคอลัมน์ (และคอลัมน์ว่างท้ายช่วง) ออก
+            values[header[pos]] = block[offset][1:] if offset < len(block) else []
+    n_rows = max((len(column) for column in values.values()), default=0)
+    # แปลงตัวเลขแบบเดียวกับ get_all_records เพื่อให้ค่าตรงกับการดึงทั้งแผ่น
+    return normalize_records(pd.DataFrame({
+        name: numericise_all(column + [""] * (n_rows - len(column)), default_blank="")
+        for name, column in values.items()
+    }))
+
+
+def projected_positions(header, columns):
+    # ตำแหน่งในหัวตารางของคอลัมน์ที่ต้องการ เทียบชื่อหลังปรับตาม schema (ช่องว่าง/ตัวพิมพ์/เลขปี 68)
+    wanted = set(columns)
+    return [pos for pos, name in enumerate(header) if COLUMN_LOOKUP.get(_column_key(name), name.strip()) in wanted]
+
+
+class LocalFileSource:
+    # ไฟล์เดียว = แผ่นเดียว (หรือทุกแผ่นใน xlsx เมื่อระบุ worksheets), โฟลเดอร์ = หนึ่งไฟล์ต่อแผ่น
+    def __init__(self, path, worksheets=None, workers=4):
+        self.path = path
+        self.worksheets = worksheets
+        self.workers = workers
+        self.last_report = None
+
+    def _files(self):
+        return sorted(
+            os.path.join(self.path, name) for name in os.listdir(self.path)
+            if name.lower().endswith((".csv", ".xlsx", ".xls"))
+        )
+
+    def revision(self):
+        if os.path.isdir(self.path):
+            return ",".join(f"{os.path.basename(f)}:{os.stat(f).st_mtime_ns}" for f in self._files())
+        return str(os.stat(self.path).st_mtime_ns)
+
+    def fetch(self, columns=None):
+        if os.path.isdir(self.path):
+            files = {os.path.splitext(os.path.basename(f))[0]: f for f in self._files()}
+            titles = select_worksheets(list(files), self.worksheets or "*")
+            fetchers = {title: (lambda path=files[title]: read_sheet_file(path, columns=columns)) for title in titles}
+        elif self.worksheets is not None and self.path.lower().endswith((".xlsx", ".xls")):
+            titles = select_worksheets(pd.ExcelFile(self.path).sheet_names, self.worksheets)
+            fetchers = {title: (lambda title=title: read_sheet_file(self.path, title, columns)) for title in titles}
+        else:
+            return read_sheet_file(self.path, columns=columns)
+        df, self.last_report = merge_worksheets(fetch_concurrently(fetchers, self.workers))
+        return df
+
+
+def read_sheet_file(path, sheet_name=0, columns=None):
+    # columns: parse เฉพาะคอลัมน์ที่ต้องการ (usecols) ไม่ต้องสร้างคอลัมน์อื่นเลย
+    usecols = None
+    if columns is not None:
+        wanted = set(columns)
+        usecols = lambda name: COLUMN_LOOKUP.get(_column_key(name), str(name).strip()) in wanted
+    if path.lower().endswith((".xlsx", ".xls")):
+        df = pd.read_excel(path, sheet_name=sheet_name, dtype=str, keep_default_na=False, usecols=usecols)
+    else:
+        df = pd.read_csv(path, dtype=str, keep_default_na=False, usecols=usecols)
+    return normalize_records(df)
+
+
+# ==================== MULTI-WORKSHEET LOADING ====================
+# ดึงทุกแผ่นพร้อมกันด้วย thread pool (gspread เป็น I/O แบบ sync) แต่ละแผ่นลองใหม่แบบ backoff
+# เมื่อโดน rate limit / server error แล้วปรับชื่อคอลัมน์ให้ตรง schema ก่อนรวมแถวของผู้ป่วยคนเดียวกัน
+
+TRANSIENT_STATUS = {429, 500, 502, 503, 504}
+SOURCE_COLUMN = "ชีตต้นทาง"
+
+
+def select_worksheets(available, wanted):
+    # wanted: "*" = ทุกแผ่น, หรือรายชื่อ (list หรือข้อความคั่นด้วยคอมม่า)
+    if wanted == "*":
+        return available
+    if isinstance(wanted, str):
+        wanted = [title.strip() for title in wanted.split(",") if title.strip()]
+    missing = [title for title in wanted if title not in available]
+    if missing:
+        raise ValueError(f"ไม่พบแผ่นงาน: {', '.join(missing)} (มี: {', '.join(available)})")
+    return wanted
+
+
+def is_transient(exc):
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+    if status is not None:
+        return status in TRANSIENT_STATUS
+    return isinstance(exc, (ConnectionError, TimeoutError))
+
+
+def with_retry(fn, attempts=5, base_delay=1.0, max_delay=30.0, sleep=time.sleep):
+    # exponential backoff + jitter: 1, 2, 4, 8 วินาที (±50%) ข้อผิดพลาดถาวรโยนออกทันที
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except Exception as exc:
+            if attempt == attempts - 1 or not is_transient(exc):
+                raise
+            sleep(min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.5))
+
+
+def fetch_concurrently(fetchers, workers=4, **retry):
+    # fetchers: {ชื่อแผ่น: ฟังก์ชันคืน DataFrame} → {ชื่อแผ่น: DataFrame} ตามลำดับเดิม
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(fetchers)))) as pool:
+        futures = {title: pool.submit(with_retry, fetch, **retry) for title, fetch in fetchers.items()}
+        return {title: future.result() for title, future in futures.items()}
+
+
+def _column_key(name):
+    return re.sub(r"\s+", "", str(name)).lower()
+
+
+def _canonical_columns():
+    # ชื่อมาตรฐานตาม schema; ปี 68 ที่ไม่มีเลขปีต่อท้ายรับแบบมีเลขปีด้วย (น้ำหนัก68 → น้ำหนัก)
+    canonical = IDENTITY_COLUMNS + [col for col, _, _ in all_test_columns()]
+    lookup = {_column_key(col): col for col in canonical}
+    for test, col in CURRENT_YEAR_OVERRIDES.items():
+        if col is not None:
+            lookup.setdefault(_column_key(YEARLY_TESTS[test].format(y=CURRENT_YEAR)), col)
+    return canonical, lookup
+
+
+CANONICAL_COLUMNS, COLUMN_LOOKUP = _canonical_columns()
+
+
+def reconcile_columns(df):
+    # เปลี่ยนชื่อคอลัมน์ที่ต่างแค่ช่องว่าง/ตัวพิมพ์/เลขปี ให้เป็นชื่อมาตรฐาน; ชื่อซ้ำหลังเปลี่ยนรวมเป็นคอลัมน์เดียว
+    renamed = {}
+    columns = []
+    for col in df.columns:
+        target = COLUMN_LOOKUP.get(_column_key(col), str(col).strip())
+        if target != col:
+            renamed[col] = target
+        columns.append(target)
+    df = df.set_axis(columns, axis=1)
+    if df.columns.has_duplicates:
+        merged = {}
+        for col in dict.fromkeys(columns):
+            block = df.loc[:, df.columns == col]
+            values = block.iloc[:, 0]
+            for i in range(1, block.shape[1]):
+                values = values.where(values != "", block.iloc[:, i])
+            merged[col] = values
+        df = pd.DataFrame(merged)
+    return df, renamed
+
+
+def merge_worksheets(frames, key="HN"):
+    # รวมทุกแผ่น: คอลัมน์ = schema ตามลำดับ + คอลัมน์อื่นตามลำดับที่พบ, ผู้ป่วยคนเดียวกัน (HN) หลายแผ่น
+    # → แถวเดียว ค่าที่ไม่ว่างของแผ่นหลังทับแผ่นก่อน; คืน (DataFrame, รายงานการปรับ schema)
+    report = {"worksheets": {}, "conflicts": 0}
+    reconciled = {}
+    for title, df in frames.items():
+        df, renamed = reconcile_columns(df)
+        unknown = [col for col in df.columns if col not in CANONICAL_COLUMNS]
+        report["worksheets"][title] = {"rows": len(df), "renamed": renamed, "unknown": unknown}
+        reconciled[title] = df
+    if len(reconciled) == 1:
+        return next(iter(reconciled.values())), report
+
+    extra = [col for df in reconciled.values() for col in df.columns if col not in CANONICAL_COLUMNS]
+    present = {col for df in reconciled.values() for col in df.columns}
+    columns = [col for col in CANONICAL_COLUMNS if col in present] + list(dict.fromkeys(extra)) + [SOURCE_COLUMN]
+
+    # ตำแหน่งแถวผลลัพธ์ของทุกแถวในแต่ละแผ่น: HN เดียวกัน = แถวเดียวกัน, HN ว่าง = แถวใหม่เสมอ
+    keys = {}
+    for title, df in reconciled.items():
+        key_values = df[key].astype(str).str.strip() if key in df.columns else pd.Series("", index=df.index)
+        blank = (key_values == "").to_numpy()
+        keys[title] = key_values.where(~blank, [f"\x00{title}\x00{i}" for i in range(len(df))])
+    universe = pd.Index(pd.concat(list(keys.values()), ignore_index=True)).unique()
+
+    # เติมทีละคอลัมน์ด้วย numpy: ไม่ต้องขยายทุกแผ่นให้ครบทุกคอลัมน์ก่อนรวม
+    out = {col: np.full(len(universe), "", dtype=object) for col in columns}
+    for title, df in reconciled.items():
+        positions = universe.get_indexer(keys[title])
+        for col in df.columns:
+            values = df[col].to_numpy(dtype=object)
+            filled = values != ""
+            current = out[col][positions]
+            report["conflicts"] += int(((current != "") & filled & (current != values)).sum())
+            out[col][positions[filled]] = values[filled]
+        sources = out[SOURCE_COLUMN][positions]
+        out[SOURCE_COLUMN][positions] = np.where(sources == "", title, sources + ", " + title)
+
+    merged = pd.DataFrame(out).astype(str)
+    report["rows"] = len(merged)
+    return merged, report
+
+
+# ==================== COLUMN PROJECTION ====================
+class ProjectedSheet:
+    # โหลดเฉพาะคอลัมน์ของปีที่ใช้ (ระบุตัวตน + ผลตรวจปีนั้น) แล้วเติมปีอื่นเมื่อถูกขอ
+    # แถวของคอลัมน์ที่เติมทีหลังจับคู่ตามตำแหน่ง โดยเช็ก revision และ HN ว่ายังเป็นชีตเดิม
+    def __init__(self, source):
+        self.source = source
+        self.frame = None
+        self.years = set()
+        self.revision = None
+
+    def load(self, years):
+        self.revision = self.source.revision()
+        self.frame = self.source.fetch(columns=projected_columns(years))
+        self.years = set(years)
+        return self.frame
+
+    def require(self, years):
+        missing = set(years) - self.years
+        if self.frame is None:
+            return self.load(missing)
+        if not missing:
+            return self.frame
+        revision = self.source.revision()
+        if revision is None or revision != self.revision:
+            return self.load(self.years | missing)
+        wanted = [col for col in projected_columns(missing) if col not in self.frame.columns]
+        extra = self.source.fetch(columns=["HN"] + wanted)
+        if len(extra) != len(self.frame) or not (extra["HN"].to_numpy() == self.frame["HN"].to_numpy()).all():
+            # ชีตเปลี่ยนระหว่างสองครั้งที่ดึง → โหลดใหม่ทุกปีที่ใช้
+            return self.load(self.years | missing)
+        added = extra.drop(columns=["HN"]).set_axis(self.frame.index)
+        self.frame = pd.concat([self.frame, added[[col for col in added.columns if col not in self.frame.columns]]], axis=1)
+        self.years |= missing
+        return self.frame
+
+
+def source_from_config(secrets=None, env=os.environ):
+    # HEALTH_SHEET_FILE=path/to/sheet.csv → ใช้ไฟล์ในเครื่องแทน Google Sheet
+    # HEALTH_WORKSHEETS="*" หรือ "รอบ1,รอบ2" (หรือ WORKSHEETS ใน secrets) → ดึงหลายแผ่นแล้วรวม
+    local_path = env.get("HEALTH_SHEET_FILE")
+    worksheets = env.get("HEALTH_WORKSHEETS")
+    if local_path:
+        return LocalFileSource(local_path, worksheets)
+    import json
+
+    if worksheets is None and secrets is not None:
+        worksheets = secrets.get("WORKSHEETS")
+    return GoogleSheetSource(json.loads(secrets["GCP_SERVICE_ACCOUNT"]), worksheets=worksheets)
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import background_span
+from snapshot_diff import append_changelog, diff_snapshots
+
+# ==================== SNAPSHOT CACHE ====================
+# เก็บข้อมูลชีตล่าสุดเป็นไฟล์ Arrow IPC บนดิสก์ อ่านด้วย memory map ตอนเริ่มระบบ
+# แล้วให้ thread เบื้องหลังคอยเช็ก revision ของแหล่งข้อมูลและสลับ snapshot แบบ atomic
+# ทุกครั้งที่สลับ เทียบกับรุ่นก่อน (snapshot_diff) แล้วต่อท้าย changelog.jsonl ในโฟลเดอร์เดียวกัน
+
+DEFAULT_SNAPSHOT_DIR = os.environ.get("HEALTH_SNAPSHOT_DIR", ".snapshot")
+
+
+def row_hashes(df):
+    return pd.util.hash_pandas_object(df, index=False).to_numpy(dtype=np.uint64)
+
+
+def content_version(df, hashes):
+    digest = hashlib.sha1()
+    digest.update("\x1f".join(df.columns).encode("utf-8"))
+    digest.update(hashes.tobytes())
+    return digest.hexdigest()[:16]
+
+
+class SnapshotStore:
+    def __init__(self, directory=DEFAULT_SNAPSHOT_DIR):
+        self.directory = directory
+        self.data_path = os.path.join(directory, "sheet.arrow")
+        self.meta_path = os.path.join(directory, "sheet.json")
+        self.hash_path = os.path.join(directory, "sheet.hashes.npy")
+        self.changelog_path = os.path.join(directory, "changelog.jsonl")
+
+    def exists(self):
+        return all(os.path.exists(p) for p in (self.data_path, self.meta_path, self.hash_path))
+
+    def read(self, columns=None):
+        # columns: แปลงเป็น pandas เฉพาะคอลัมน์ที่ต้องการ (ส่วนอื่นอยู่ใน memory map ไม่ถูกแตะ)
+        import pyarrow as pa
+
+        with pa.memory_map(self.data_path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select([col for col in columns if col in table.column_names])
+        with open(self.meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        return table.to_pandas(), np.load(self.hash_path), meta
+
+    def write(self, df, hashes, meta):
+        import pyarrow as pa
+
+        os.makedirs(self.directory, exist_ok=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        # เขียนไฟล์ชั่วคราวก่อน แล้วค่อย os.replace เพื่อให้ผู้อ่านไม่เจอไฟล์ครึ่งๆ กลางๆ
+        tmp_data = self.data_path + ".tmp"
+        with pa.OSFile(tmp_data, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        tmp_hash = self.hash_path + ".tmp.npy"
+        np.save(tmp_hash, hashes)
+        tmp_meta = self.meta_path + ".tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_data, self.data_path)
+        os.replace(tmp_hash, self.hash_path)
+        os.replace(tmp_meta, self.meta_path)
+
+    def append_changelog(self, record):
+        os.makedirs(self.directory, exist_ok=True)
+        append_changelog(self.changelog_path, record)
+
+
+class SnapshotService:
+    def __init__(self, source, store=None, interval=300):
+        self.source = source
+        self.store = store or SnapshotStore()
+        self.interval = interval
+        self.frame = None
+        self.hashes = None
+        self.meta = {}
+        self.last_diff = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def version(self):
+        return self.meta.get("version")
+
+    def current(self):
+        with self._lock:
+            return self.frame, self.version
+
+    def load(self):
+        if self.store.exists():
+            self._swap(*self.store.read())
+        else:
+            self.refresh()
+        return self.current()
+
+    def refresh(self):
+        revision = self.source.revision()
+        if self.frame is not None and revision is not None and revision == self.meta.get("revision"):
+            return False
+
+        # รีเฟรชเบื้องหลังอยู่นอกรอบการรัน: background_span ให้เวลาโหลดชีตขึ้นแผงผู้ดูแลและ JSONL
+        with background_span("load_google_sheet"):
+            fresh = self.source.fetch()
+        hashes = row_hashes(fresh)
+        version = content_version(fresh, hashes)
+        if version == self.version:
+            # revision เปลี่ยนแต่เนื้อหาไม่เปลี่ยน (เช่น แก้ format) → จำ revision ใหม่อย่างเดียว
+            self.meta = dict(self.meta, revision=revision)
+            return False
+
+        if self.frame is None:
+            # โหลดครั้งแรกโดยไม่มี snapshot เดิม: ไม่มีอะไรให้เทียบ บันทึกแค่จำนวนแถว
+            diff = None
+            changes = {"inserted": len(fresh), "updated": 0, "deleted": 0, "cells": 0}
+            record = {"at": time.time(), "from": None, "to": version, "initial": len(fresh)}
+        else:
+            diff = diff_snapshots(self.frame, self.hashes, fresh, hashes, self.version, version)
+            changes = diff.summary()
+            record = diff.to_record()
+        meta = {
+            "version": version,
+            "revision": revision,
+            "rows": len(fresh),
+            "changed_rows": changes["inserted"] + changes["updated"],
+            "changes": changes,
+            "refreshed_at": time.time(),
+        }
+        self.store.write(fresh, hashes, meta)
+        self.store.append_changelog(record)
+        self._swap(fresh, hashes, meta, diff)
+        return True
+
+    def _swap(self, frame, hashes, meta, diff=None):
+        with self._lock:
+            self.frame, self.hashes, self.meta, self.last_diff = frame, hashes, meta, diff
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sheet-refresh", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.refresh()
+            except Exception:
+                # เก็บ snapshot เดิมไว้ให้บริการต่อ แล้วลองใหม่รอบหน้า
+                pass
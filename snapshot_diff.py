@@ -0,0 +1,153 @@
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+# ==================== SNAPSHOT DIFF ====================
+# เทียบ snapshot สองรุ่นของชีต: จับคู่แถวด้วย HN แล้วใช้ hash ของแถว (row_hashes) คัดเฉพาะแถวที่อาจเปลี่ยน
+# ก่อนเทียบทีละเซลล์ → ได้ผู้ป่วยที่เพิ่ม/แก้/ลบ และเซลล์ที่เปลี่ยน (ค่าเดิม → ค่าใหม่)
+# ทุกขั้นเป็น hash join / เทียบทั้งคอลัมน์ เวลาโตแบบเชิงเส้นตามจำนวนแถว
+# ผลใช้ล้างแคชเฉพาะแถวที่เปลี่ยน และต่อท้าย changelog (JSONL หนึ่งบรรทัดต่อการรีเฟรช) เป็น audit trail
+
+KEY_COLUMN = "HN"
+
+
+def row_keys(df, key=KEY_COLUMN):
+    # HN ซ้ำหรือว่าง: ต่อท้ายครั้งที่พบ (HN#1, HN#2) ให้ทุกแถวมีคีย์ไม่ซ้ำ และจับคู่ตามลำดับเดิม
+    if key in df.columns:
+        values = df[key].astype(str).str.strip().to_numpy(dtype=object)
+    else:
+        values = np.full(len(df), "", dtype=object)
+    occurrence = pd.Series(values).groupby(values).cumcount().to_numpy()
+    keys = values.copy()
+    repeated = np.flatnonzero(occurrence > 0)
+    keys[repeated] = [f"{values[i]}#{occurrence[i]}" for i in repeated]
+    return keys
+
+
+def _column_values(rows, column):
+    if column not in rows.columns:
+        return np.full(len(rows), "", dtype=object)
+    return rows[column].to_numpy(dtype=object)
+
+
+class SnapshotDiff:
+    def __init__(self, from_version, to_version, new_to_old, inserted, updated, deleted,
+                 inserted_keys, updated_keys, deleted_keys, cells, added_columns, removed_columns):
+        self.from_version = from_version
+        self.to_version = to_version
+        self.new_to_old = new_to_old  # ตำแหน่งแถวใหม่ -> ตำแหน่งในรุ่นก่อน (-1 = แถวที่เพิ่มเข้ามา)
+        self.inserted = inserted  # ตำแหน่งในรุ่นใหม่
+        self.updated = updated  # ตำแหน่งในรุ่นใหม่
+        self.deleted = deleted  # ตำแหน่งในรุ่นก่อน
+        self.inserted_keys = inserted_keys
+        self.updated_keys = updated_keys
+        self.deleted_keys = deleted_keys
+        self.cells = cells  # DataFrame: key, column, old, new
+        self.added_columns = added_columns
+        self.removed_columns = removed_columns
+
+    @property
+    def changed_rows(self):
+        return len(self.inserted) + len(self.updated)
+
+    def unchanged_mapping(self):
+        # ตำแหน่งรุ่นก่อน -> ตำแหน่งรุ่นใหม่ ของแถวที่เนื้อหาเหมือนเดิม (-1 = แถวถูกแก้หรือลบ)
+        same = self.new_to_old >= 0
+        # คีย์ไม่ซ้ำ: แถวรุ่นก่อนทั้งหมด = แถวที่จับคู่ได้ + แถวที่ถูกลบ
+        old_to_new = np.full(int(same.sum()) + len(self.deleted), -1, dtype=np.int64)
+        same[self.updated] = False
+        old_to_new[self.new_to_old[same]] = np.flatnonzero(same)
+        return old_to_new
+
+    def summary(self):
+        return {
+            "inserted": len(self.inserted),
+            "updated": len(self.updated),
+            "deleted": len(self.deleted),
+            "cells": len(self.cells),
+        }
+
+    def to_record(self):
+        # บันทึกแบบกะทัดรัด: คีย์ของแถวที่เพิ่ม/ลบ และเฉพาะเซลล์ที่เปลี่ยนของแถวที่แก้ {HN: {คอลัมน์: [เดิม, ใหม่]}}
+        updated = {}
+        for key, column, old, new in self.cells.itertuples(index=False):
+            updated.setdefault(key, {})[column] = [old, new]
+        record = {
+            "at": time.time(),
+            "from": self.from_version,
+            "to": self.to_version,
+            "inserted": self.inserted_keys.tolist(),
+            "deleted": self.deleted_keys.tolist(),
+            "updated": updated,
+        }
+        if self.added_columns:
+            record["columns_added"] = self.added_columns
+        if self.removed_columns:
+            record["columns_removed"] = self.removed_columns
+        return record
+
+
+def diff_snapshots(old_df, old_hashes, new_df, new_hashes, from_version=None, to_version=None, key=KEY_COLUMN):
+    old_keys, new_keys = row_keys(old_df, key), row_keys(new_df, key)
+    new_to_old = pd.Index(old_keys).get_indexer(new_keys)
+    matched = new_to_old >= 0
+
+    inserted = np.flatnonzero(~matched)
+    kept = np.zeros(len(old_df), dtype=bool)
+    kept[new_to_old[matched]] = True
+    deleted = np.flatnonzero(~kept)
+
+    # hash เท่ากัน = ทั้งแถวเหมือนเดิม ไม่ต้องเทียบเซลล์ (เทียบเฉพาะแถวที่ hash ต่าง)
+    candidates = np.flatnonzero(matched)
+    candidates = candidates[np.asarray(old_hashes)[new_to_old[candidates]] != np.asarray(new_hashes)[candidates]]
+    # ตัดเฉพาะแถวที่ต้องเทียบก่อน แล้วค่อยไล่ทีละคอลัมน์ (ไม่แปลงทั้งคอลัมน์ของชีต)
+    old_rows, new_rows = old_df.take(new_to_old[candidates]), new_df.take(candidates)
+
+    columns = list(new_df.columns) + [c for c in old_df.columns if c not in new_df.columns]
+    changed_rows, changed_columns, old_values, new_values = [], [], [], []
+    for column in columns:
+        before = _column_values(old_rows, column)
+        after = _column_values(new_rows, column)
+        differs = np.flatnonzero((before != after) & ~(pd.isna(before) & pd.isna(after)))
+        if differs.size:
+            changed_rows.append(differs)
+            changed_columns.append(np.full(differs.size, column, dtype=object))
+            old_values.append(before[differs])
+            new_values.append(after[differs])
+
+    if changed_rows:
+        rows = np.concatenate(changed_rows)
+        order = np.argsort(rows, kind="stable")  # เรียงตามแถว แล้วตามลำดับคอลัมน์
+        rows = rows[order]
+        cells = pd.DataFrame({
+            "key": new_keys[candidates[rows]],
+            "column": np.concatenate(changed_columns)[order],
+            "old": np.concatenate(old_values)[order],
+            "new": np.concatenate(new_values)[order],
+        })
+        updated = candidates[np.unique(rows)]
+    else:
+        cells = pd.DataFrame({"key": [], "column": [], "old": [], "new": []}, dtype=object)
+        updated = np.zeros(0, dtype=np.int64)
+
+    return SnapshotDiff(
+        from_version, to_version, new_to_old, inserted, updated, deleted,
+        new_keys[inserted], new_keys[updated], old_keys[deleted], cells,
+        [c for c in new_df.columns if c not in old_df.columns],
+        [c for c in old_df.columns if c not in new_df.columns],
+    )
+
+
+def append_changelog(path, record):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+
+def read_changelog(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+from schema import YEARS, column_for
+
+# ==================== LONGITUDINAL TRENDS ====================
+# ดึงค่าทุกปีของผู้ป่วยหนึ่งคนจาก numeric cache ด้วย slice เดียว (แถวเดียว, ตำแหน่งคอลัมน์ที่คำนวณไว้)
+# แล้วคำนวณ delta / slope ของทุกตัวชี้วัดพร้อมกันเป็น array (ตัวชี้วัด x ปี)
+
+# ตัวชี้วัด: (ชื่อที่แสดง, หน่วย, ทิศที่แย่ลง +1 = ค่ายิ่งสูงยิ่งแย่, -1 = ค่ายิ่งต่ำยิ่งแย่)
+TREND_METRICS = {
+    "fbs": ("FBS", "mg/dl", 1),
+    "ldl": ("LDL", "mg/dl", 1),
+    "gfr": ("GFR", "mL/min", -1),
+    "bmi": ("BMI", "kg/m²", 1),
+    "sbp": ("SBP", "mmHg", 1),
+    "dbp": ("DBP", "mmHg", 1),
+}
+_SLICED_TESTS = ["fbs", "ldl", "gfr", "sbp", "dbp", "weight", "height"]
+MIN_POINTS = 3
+
+
+class TrendIndex:
+    def __init__(self, numeric_cache):
+        self.numeric_cache = numeric_cache
+        cols = [column_for(test, year) for test in _SLICED_TESTS for year in YEARS]
+        # ตำแหน่งคอลัมน์ของ (test, ปี) ทั้งหมด ใน matrix ของ numeric cache
+        self.positions = numeric_cache.column_index(cols).reshape(len(_SLICED_TESTS), len(YEARS))
+
+    def patient_matrix(self, pos):
+        row = self.numeric_cache.matrix[pos]
+        safe = np.where(self.positions >= 0, self.positions, 0)
+        values = np.where(self.positions >= 0, row[safe], np.nan).astype(np.float64)
+        sliced = dict(zip(_SLICED_TESTS, values))
+        with np.errstate(all="ignore"):
+            bmi = sliced["weight"] / (sliced["height"] / 100) ** 2
+        return np.vstack([sliced[m] if m != "bmi" else bmi for m in TREND_METRICS])
+
+
+def summarize_trends(matrix, years=YEARS):
+    x = np.asarray(years, dtype=np.float64)
+    present = ~np.isnan(matrix)
+    n = present.sum(axis=1)
+
+    # slope ต่อปีด้วย least squares แบบมีช่องว่าง: cov(x, y) / var(x) เฉพาะปีที่มีค่า
+    with np.errstate(all="ignore"):
+        x_mean = np.where(present, x, 0).sum(axis=1) / n
+        y_mean = np.nansum(matrix, axis=1) / n
+        dx = np.where(present, x - x_mean[:, None], 0)
+        dy = np.where(present, matrix - y_mean[:, None], 0)
+        slope = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+
+    # ค่าล่าสุด / ก่อนหน้า / แรก ของแต่ละตัวชี้วัด
+    order = np.where(present, np.arange(len(years)), -1)
+    last_idx = order.max(axis=1)
+    prev_idx = np.where(present & (order < last_idx[:, None]), order, -1).max(axis=1)
+    first_idx = np.where(present, np.arange(len(years)), len(years)).min(axis=1)
+    rows = np.arange(matrix.shape[0])
+    take = lambda idx: np.where((idx >= 0) & (idx < len(years)), matrix[rows, np.clip(idx, 0, len(years) - 1)], np.nan)
+    last, previous, first = take(last_idx), take(prev_idx), take(first_idx)
+
+    direction = np.array([TREND_METRICS[m][2] for m in TREND_METRICS], dtype=np.float64)
+    worsening = (n >= MIN_POINTS) & (slope * direction > 0) & ((last - first) * direction > 0)
+
+    return pd.DataFrame({
+        "metric": [TREND_METRICS[m][0] for m in TREND_METRICS],
+        "unit": [TREND_METRICS[m][1] for m in TREND_METRICS],
+        "points": n,
+        "latest": last,
+        "delta": last - previous,
+        "slope_per_year": slope,
+        "worsening": worsening,
+    }, index=list(TREND_METRICS))
+
+
+def trend_chart(matrix, years=YEARS):
+    # สร้าง Figure ตรงๆ ไม่ผ่าน pyplot: ไม่มี state กลางของ pyplot ให้ session ที่รันพร้อมกันชนกัน และไม่ต้องปิดรูปเอง
+    from matplotlib.figure import Figure
+
+    labels = [2500 + y for y in years]
+    fig = Figure(figsize=(10, 5))
+    axes = fig.subplots(2, 3, sharex=True)
+    for ax, metric, values in zip(axes.flat, TREND_METRICS, matrix):
+        name, unit, _ = TREND_METRICS[metric]
+        mask = ~np.isnan(values)
+        ax.plot(np.array(labels)[mask], values[mask], marker="o", linewidth=1.5)
+        ax.set_title(f"{name} ({unit})", fontsize=10)
+        ax.grid(alpha=0.3)
+        ax.tick_params(labelsize=8)
+    fig.tight_layout()
+    return fig
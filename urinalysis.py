@@ -0,0 +1,45 @@
+import numpy as np
+
+from reference_ranges import MISSING, SECTIONS
+from schema import CURRENT_YEAR, column_for
+
+# ==================== URINALYSIS CODES ====================
+# ผลปัสสาวะปี 68 (สี น้ำตาล โปรตีน pH Sp.gr เซลล์) แปลงเป็นรหัสลำดับ int8 ครั้งเดียวต่อการโหลดชีต
+# ธงผิดปกติ คำแนะนำ และสถิติทั้ง cohort จึงเป็นการเทียบจำนวนเต็ม ไม่ต้อง parse ข้อความซ้ำ
+
+URINE_RULES = [rule for rule in SECTIONS["urine"] if rule.kind != "text"]
+
+
+class UrineCodes:
+    def __init__(self, codes):
+        self.codes = codes  # dict: test -> np.int8 array ยาวเท่าจำนวนแถว
+
+    def row(self, pos):
+        return {key: int(values[pos]) for key, values in self.codes.items()}
+
+    def distribution(self, key, positions=None):
+        # จำนวนคนต่อรหัส (ไม่มีผล/อ่านไม่ได้/แต่ละระดับ) ใน cohort หรือเฉพาะแถวที่เลือก
+        import pandas as pd
+
+        rule = next(rule for rule in URINE_RULES if rule.key == key)
+        values = self.codes[key] if positions is None else self.codes[key][positions]
+        found, counts = np.unique(values, return_counts=True)
+        return pd.Series(counts, index=[rule.decode(int(code)) for code in found], name=rule.label)
+
+
+def build_urine_codes(df, year=CURRENT_YEAR):
+    codes = {}
+    for rule in URINE_RULES:
+        col = column_for(rule.key, year)
+        if col is None or col not in df.columns:
+            codes[rule.key] = np.full(len(df), MISSING, dtype=np.int8)
+        else:
+            codes[rule.key] = rule.encode_many(df[col].astype(str).to_numpy(dtype=object))
+    return UrineCodes(codes)
+
+
+def person_urine_codes(person, year=CURRENT_YEAR, codes=None):
+    # ใช้รหัสที่แปลงไว้แล้วถ้ามี ไม่งั้นแปลงจากข้อความของคนนี้
+    if codes is not None:
+        return codes
+    return {rule.key: rule.encode(person.get(column_for(rule.key, year), "")) for rule in URINE_RULES}